@@ -1,13 +1,28 @@
 # Necessary Libraries
-from dataclasses import dataclass, field  # For defining a data model using dataclasses
+import json  # For encoding the article as JSON
+from dataclasses import dataclass, field, fields  # For defining a data model using dataclasses
 from typing import List, Optional  # For hinting,help with code clarity, readability
 
+try:
+    import orjson  # For encoding the article as JSON straight from its fields (optional)
+except ImportError:
+    orjson = None
 
-@dataclass
+try:
+    import bson  # For encoding the article as a BSON document (optional, comes with pymongo)
+except ImportError:
+    bson = None
+
+
+@dataclass(slots=True)
 class Article:
     """
     This dataclass represents the structure of an article.
     Each field corresponds to a piece of metadata or content from the article.
+
+    The class is slotted: an article has no per-instance __dict__, which makes it smaller when hundreds of thousands
+    of them are in flight. Use to_dict, to_json and to_bson instead of dataclasses.asdict, which deep-copies every
+    article (its keywords and classes included) before it is encoded.
     """
 
     # URL of the article (this will be the link to the article on the website)
@@ -27,3 +42,40 @@ class Article:
     author: Optional[str] = None  # The author of the article
     classes: List[dict] = field(default_factory=list)  # A list to store any additional tags or classes
     full_text: Optional[str] = None  # The full text of the article's content
+
+    def to_dict(self) -> dict:
+        """
+        Returns the fields of the article as a dictionary, without copying them (unlike dataclasses.asdict, the lists
+        are shared with the article, so the dictionary must not be modified in place).
+
+        :return: A dictionary mapping the field names to their values.
+        """
+        return {name: getattr(self, name) for name in FIELD_NAMES}
+
+    def to_json(self) -> str:
+        """
+        Encodes the article as one line of JSON (non-ASCII characters are kept as they are).
+        With orjson installed, the fields are encoded directly, without an intermediate dictionary.
+
+        :return: The JSON text.
+        """
+        if orjson is not None:
+            try:
+                return orjson.dumps(self).decode('utf-8')
+            except orjson.JSONEncodeError:
+                pass  # e.g. a lone surrogate in the scraped text, the json module accepts it
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    def to_bson(self) -> bytes:
+        """
+        Encodes the article as a BSON document, as MongoDB stores it.
+
+        :return: The BSON bytes.
+        """
+        if bson is None:
+            raise ImportError("BSON encoding requires the 'pymongo' package (pip install pymongo).")
+        return bson.encode(self.to_dict())
+
+
+# The names of the fields, in declaration order
+FIELD_NAMES = tuple(article_field.name for article_field in fields(Article))
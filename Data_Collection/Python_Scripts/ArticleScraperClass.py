@@ -1,18 +1,79 @@
-import requests  # For sending requests to the web
 from bs4 import BeautifulSoup  # For parsing and manipulating HTML and XML documents
+from lxml import etree  # For the fast XPath extraction engine
 import json  # For working with JSON data
+import logging  # For reporting the articles that could not be retrieved
+import threading  # For giving every worker thread its own lxml parser
+from typing import List, Optional  # For hinting,help with code clarity, readability
 from requests import RequestException
 
 import Article  # Import the Article class from the Article module
+from HtmlArchiveClass import HtmlArchive
+from HttpClientClass import HttpClient
+
+logger = logging.getLogger(__name__)
+
+
+def class_xpath(tag: str, class_name: str) -> str:
+    """
+    Builds an XPath expression matching elements by class the same way BeautifulSoup's class_ filter does.
+
+    A single class name matches any element that has this class, a value with spaces must match the whole class
+    attribute.
+
+    :param tag: The tag name of the elements.
+    :param class_name: The class name (or the full class attribute value).
+    :return: The XPath expression.
+    """
+    if ' ' in class_name:
+        return f"//{tag}[normalize-space(@class)='{class_name}']"
+    return f"//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
 
 
 class ArticleScraper:
     """
     This class handles the scraping of individual articles from their URLs.
+
+    Two extraction engines are available: 'lxml' (the default) runs a handful of XPath queries that pull only the
+    nodes we need, 'bs4' builds a full BeautifulSoup tree. Both return the same Article.
     """
 
-    @staticmethod
-    def scrape_article(article_url: str) -> 'Article':
+    # Define target classes for full text
+    TARGET_CLASSES = ["lg_para summary", "p-content", "lg_para"]
+
+    # Supported extraction engines
+    ENGINES = ('lxml', 'bs4')
+
+    # Every thread reuses its own HTML parser (lxml parsers must not be shared between threads)
+    _parser_local = threading.local()
+
+    # XPath queries for the nodes the lxml engine extracts
+    _METADATA_XPATH = etree.XPath("(//script[@id='tawsiyat-metadata' and @type='text/tawsiyat'])[1]")
+    _POSTID_XPATH = etree.XPath("(//meta[@name='postid'])[1]")
+    _PARAGRAPH_XPATHS = [
+        (class_name, etree.XPath(f"({class_xpath('div', class_name)})[1]/p" if class_name == "p-content"
+                                 else class_xpath('p', class_name)))
+        for class_name in TARGET_CLASSES
+    ]
+
+    # Text inside these elements is not part of the visible paragraph text (BeautifulSoup skips it as well)
+    _SKIPPED_TEXT_TAGS = frozenset(['script', 'style', 'template'])
+
+    def __init__(self, http_client: Optional[HttpClient] = None, engine: str = 'lxml',
+                 archive: Optional[HtmlArchive] = None):
+        """
+        Initializes the scraper with the HTTP client used to download the articles.
+
+        :param http_client: The shared HttpClient used to send requests (a new one is created if not given).
+        :param engine: The extraction engine, 'lxml' (fast XPath extraction) or 'bs4' (BeautifulSoup).
+        :param archive: The optional HtmlArchive where the raw HTML of every downloaded page is kept.
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown extraction engine {engine!r}, choose from {', '.join(self.ENGINES)}.")
+        self.http_client = http_client if http_client is not None else HttpClient()
+        self.engine = engine
+        self.archive = archive
+
+    def scrape_article(self, article_url: str) -> 'Article':
         """
         Scrapes an article from the given URL and returns an Article object with extracted metadata and content.
 
@@ -21,81 +82,175 @@ class ArticleScraper:
         """
 
         # Send an HTTP GET request to retrieve the article HTML
+        metrics = self.http_client.metrics
         try:
-            response = requests.get(article_url)
+            with metrics.time_stage('article_fetch'):
+                response, not_modified = self.http_client.conditional_get(article_url, 'article')
+            if not_modified:
+                # The article did not change since it was cached, rebuild it without parsing the page
+                return Article.Article(**self.http_client.cache.get_data(article_url))
             if response.status_code == 200:
-                # Parse the HTML content using BeautifulSoup
-                soup = BeautifulSoup(response.content, 'lxml')
-
-                # Extract metadata from the <script> tag with type="text/tawsiyat"
-                script_tag = soup.find('script', {'id': 'tawsiyat-metadata', 'type': 'text/tawsiyat'})
-                # Extract the content of the script tag as a string (or an empty string if the tag is not found)
-                metadata = script_tag.string if script_tag is not None else '{}'
-                # Convert metadata from JSON string to dictionary to better access the data
-                metadata_dict = json.loads(metadata)
-
-                # Extract post ID from <meta> tag
-                postid_meta = soup.find('meta', {'name': 'postid'})
-                # Extract the content attribute of the meta tag (or None if the tag is not found)
-                postid = postid_meta['content'] if postid_meta else None
-
-                # Extract title and other metadata from metadata_dict if available
-                title = metadata_dict.get('title')
-                keywords = metadata_dict.get('keywords', [])
-                thumbnail = metadata_dict.get('thumbnail')
-                video_duration = metadata_dict.get('video_duration')
-                word_count = metadata_dict.get('word_count')
-                lang = metadata_dict.get('lang')
-                published_time = metadata_dict.get('published_time')
-                last_updated = metadata_dict.get('last_updated')
-                description = metadata_dict.get('description')
-                author = metadata_dict.get('author')
-                classes = metadata_dict.get('classes', [])
-
-                # Initialize an empty list to store paragraphs of full text
-                paragraphs = []
-                # Define target classes for full text
-                target_classes = ["lg_para summary", "p-content", "lg_para"]
-
-                # Loop through the target classes to find paragraphs with the specified classes
-                for class_name in target_classes:
-                    if class_name == "p-content":
-                        content_div = soup.find('div', class_=class_name)
-                        found_paragraphs = content_div.find_all('p', recursive=False) if content_div else []
-                    else:
-                        found_paragraphs = soup.find_all('p', class_=class_name)
-
-                    for p in found_paragraphs:
-                        # Extract the text directly, stripping whitespace
-                        text = p.get_text(strip=True)
-                        if text:
-                            paragraphs.append(text)
-
-                # Join the paragraphs into a single string with newlines
-                full_text = '\n'.join(paragraphs)
-
-                # Create and return an Article object
-                article = Article.Article(
-                    url=article_url,
-                    postId=postid,
-                    title=title,
-                    keywords=keywords,
-                    thumbnail=thumbnail,
-                    video_duration=video_duration,
-                    word_count=word_count,
-                    lang=lang,
-                    published_time=published_time,
-                    last_updated=last_updated,
-                    description=description,
-                    author=author,
-                    classes=classes,
-                    full_text=full_text
-                )
+                if self.archive is not None:
+                    # Keep the raw page so it can be extracted again later without fetching it
+                    self.archive.store(article_url, response.content)
+                with metrics.time_stage('parse'):
+                    article = self.parse_article(article_url, response.content)
+                if self.http_client.cache is not None:
+                    # Remember the validators and the extracted fields for the next conditional request
+                    self.http_client.cache.store(article_url, response.headers, article.to_dict())
                 return article
             else:
-                # If the request fails, print an error message and return None
-                print(f"Failed to retrieve article. Status code: {response.status_code}")
+                # If the request fails, log an error message and return None
+                logger.warning("Failed to retrieve article %s. Status code: %s", article_url, response.status_code)
                 return None
         except RequestException as e:
-            print(f"Failed to retrieve sitemap. Error: {e}")
+            logger.warning("Failed to retrieve article %s. Error: %s", article_url, e)
             return []
+
+    def parse_article(self, article_url: str, html: bytes) -> 'Article':
+        """
+        Extracts the metadata and content of an article page with the configured engine.
+
+        :param article_url: The URL of the article.
+        :param html: The HTML content of the article page.
+        :return: An Article object containing the extracted data.
+        """
+        if self.engine == 'lxml':
+            return self.parse_article_lxml(article_url, html)
+        return self.parse_article_bs4(article_url, html)
+
+    @staticmethod
+    def parse_article_bs4(article_url: str, html: bytes) -> 'Article':
+        """
+        Extracts the metadata and content of an article page by building a full BeautifulSoup tree.
+
+        :param article_url: The URL of the article.
+        :param html: The HTML content of the article page.
+        :return: An Article object containing the extracted data.
+        """
+        # Parse the HTML content using BeautifulSoup
+        soup = BeautifulSoup(html, 'lxml')
+
+        # Extract metadata from the <script> tag with type="text/tawsiyat"
+        script_tag = soup.find('script', {'id': 'tawsiyat-metadata', 'type': 'text/tawsiyat'})
+        # Extract the content of the script tag as a string (or an empty string if the tag is not found)
+        metadata = script_tag.string if script_tag is not None else '{}'
+
+        # Extract post ID from <meta> tag
+        postid_meta = soup.find('meta', {'name': 'postid'})
+        # Extract the content attribute of the meta tag (or None if the tag is not found)
+        postid = postid_meta['content'] if postid_meta else None
+
+        # Initialize an empty list to store paragraphs of full text
+        paragraphs = []
+
+        # Loop through the target classes to find paragraphs with the specified classes
+        for class_name in ArticleScraper.TARGET_CLASSES:
+            if class_name == "p-content":
+                content_div = soup.find('div', class_=class_name)
+                found_paragraphs = content_div.find_all('p', recursive=False) if content_div else []
+            else:
+                found_paragraphs = soup.find_all('p', class_=class_name)
+
+            for p in found_paragraphs:
+                # Extract the text directly, stripping whitespace
+                text = p.get_text(strip=True)
+                if text:
+                    paragraphs.append(text)
+
+        return ArticleScraper._build_article(article_url, metadata, postid, paragraphs)
+
+    @staticmethod
+    def _element_text(element) -> str:
+        """
+        Returns the text of an element with every text fragment stripped, like BeautifulSoup's get_text(strip=True).
+
+        :param element: The lxml element.
+        :return: The concatenated text.
+        """
+        fragments = []
+
+        def collect(node):
+            # The text of comments, scripts and styles is skipped, but the text that follows them is kept
+            if not isinstance(node.tag, str) or node.tag in ArticleScraper._SKIPPED_TEXT_TAGS:
+                return
+            if node.text:
+                fragments.append(node.text)
+            for child in node:
+                collect(child)
+                if child.tail:
+                    fragments.append(child.tail)
+
+        collect(element)
+        return ''.join(fragment.strip() for fragment in fragments)
+
+    @staticmethod
+    def parse_article_lxml(article_url: str, html: bytes) -> 'Article':
+        """
+        Extracts the metadata and content of an article page with targeted lxml XPath queries.
+
+        :param article_url: The URL of the article.
+        :param html: The HTML content of the article page.
+        :return: An Article object containing the extracted data.
+        """
+        parser = getattr(ArticleScraper._parser_local, 'parser', None)
+        if parser is None:
+            # The site serves UTF-8 pages
+            parser = ArticleScraper._parser_local.parser = etree.HTMLParser(encoding='utf-8')
+
+        root = etree.fromstring(html, parser)
+        if root is None:
+            # An empty page has no tree at all
+            return ArticleScraper._build_article(article_url, '{}', None, [])
+
+        # Extract metadata from the <script> tag with type="text/tawsiyat"
+        script_tags = ArticleScraper._METADATA_XPATH(root)
+        metadata = script_tags[0].text if script_tags else '{}'
+
+        # Extract post ID from <meta> tag
+        postid_metas = ArticleScraper._POSTID_XPATH(root)
+        postid = postid_metas[0].attrib['content'] if postid_metas else None
+
+        # Collect the paragraphs of each target class, in the same order as the BeautifulSoup engine
+        # (for p-content only the direct <p> children of the first matching <div> are taken)
+        paragraphs = []
+        for _, paragraph_xpath in ArticleScraper._PARAGRAPH_XPATHS:
+            for p in paragraph_xpath(root):
+                text = ArticleScraper._element_text(p)
+                if text:
+                    paragraphs.append(text)
+
+        return ArticleScraper._build_article(article_url, metadata, postid, paragraphs)
+
+    @staticmethod
+    def _build_article(article_url: str, metadata: str, postid: Optional[str], paragraphs: List[str]) -> 'Article':
+        """
+        Creates the Article object from the extracted metadata, post ID and paragraphs.
+
+        :param article_url: The URL of the article.
+        :param metadata: The JSON metadata of the tawsiyat script tag.
+        :param postid: The post ID of the article.
+        :param paragraphs: The paragraphs of the full text.
+        :return: The Article object.
+        """
+        # Convert metadata from JSON string to dictionary to better access the data
+        metadata_dict = json.loads(metadata)
+
+        # Create and return an Article object, with the metadata fields if available
+        return Article.Article(
+            url=article_url,
+            postId=postid,
+            title=metadata_dict.get('title'),
+            keywords=metadata_dict.get('keywords', []),
+            thumbnail=metadata_dict.get('thumbnail'),
+            video_duration=metadata_dict.get('video_duration'),
+            word_count=metadata_dict.get('word_count'),
+            lang=metadata_dict.get('lang'),
+            published_time=metadata_dict.get('published_time'),
+            last_updated=metadata_dict.get('last_updated'),
+            description=metadata_dict.get('description'),
+            author=metadata_dict.get('author'),
+            classes=metadata_dict.get('classes', []),
+            # Join the paragraphs into a single string with newlines
+            full_text='\n'.join(paragraphs)
+        )
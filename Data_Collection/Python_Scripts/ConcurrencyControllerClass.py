@@ -0,0 +1,174 @@
+import logging  # For logging every change of the concurrency limit
+import threading  # For the resizable per-host semaphores
+import time  # For the cooldown between two decreases
+from typing import Dict, List, Optional  # For hinting,help with code clarity, readability
+from urllib.parse import urlsplit  # For extracting the host name from a URL
+
+from CrawlMetricsClass import CrawlMetrics
+
+logger = logging.getLogger(__name__)
+
+
+class _HostLimit:
+    """
+    This class is the resizable semaphore and the latency window of one host.
+    """
+
+    def __init__(self, limit: float):
+        self.limit = limit  # Fractional, so additive increases and multiplicative decreases compose smoothly
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        self.samples: List[float] = []  # Latencies of the successful requests of the current window
+        self.peak_in_flight = 0  # The most requests in flight during the current window
+        self.baseline_p95: Optional[float] = None  # The p95 latency the host showed when it was not loaded
+        self.cooldown_until = 0.0  # No new decrease before this time, the requests in flight still see the old load
+
+
+class AdaptiveConcurrencyController:
+    """
+    This class adapts the number of concurrent requests sent to each host with AIMD (additive increase, multiplicative
+    decrease), like TCP congestion control.
+
+    The limit grows by one after every window of successful requests whose p95 latency stays close to the baseline of
+    the host, provided the window actually used the whole limit (otherwise a larger limit proves nothing). It is cut
+    by a factor on 429/503 responses (including the ones retried by the HTTP client), server errors, timeouts and
+    connection errors, and when the p95 latency of a window rises above the baseline. After a decrease, further
+    decreases wait for a cooldown so the requests already in flight do not collapse the limit.
+    Every change is logged, so the behaviour can be tuned offline against the replay server of benchmark_crawler.py.
+    """
+
+    # Status codes that mean the host is overloaded or throttling us
+    OVERLOAD_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, initial_limit: int = 2, min_limit: int = 1, max_limit: int = 16, decrease_factor: float = 0.5,
+                 latency_tolerance: float = 1.5, min_window: int = 10, cooldown: float = 2.0,
+                 metrics: Optional[CrawlMetrics] = None):
+        """
+        Initializes the controller.
+
+        :param initial_limit: The number of concurrent requests per host to start with.
+        :param min_limit: The lowest limit per host.
+        :param max_limit: The highest limit per host (the number of worker threads).
+        :param decrease_factor: The factor applied to the limit when the host is overloaded.
+        :param latency_tolerance: The p95 latency of a window may reach baseline * tolerance before it is a signal.
+        :param min_window: The minimum number of successful requests between two increases.
+        :param cooldown: The number of seconds after a decrease during which no other decrease happens.
+        :param metrics: The CrawlMetrics where the limits and their changes are recorded.
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.initial_limit = min(max(initial_limit, self.min_limit), self.max_limit)
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.min_window = min_window
+        self.cooldown = cooldown
+        self.metrics = metrics if metrics is not None else CrawlMetrics()
+        self._hosts: Dict[str, _HostLimit] = {}
+        self._lock = threading.Lock()
+
+    def _host_limit(self, host: str) -> _HostLimit:
+        with self._lock:
+            host_limit = self._hosts.get(host)
+            if host_limit is None:
+                host_limit = self._hosts[host] = _HostLimit(self.initial_limit)
+                logger.info("Concurrency for %s starts at %d (min %d, max %d).", host, self.initial_limit,
+                            self.min_limit, self.max_limit)
+                self.metrics.set_gauge('host_concurrency_limit', self.initial_limit, host=host)
+            return host_limit
+
+    def acquire(self, url: str):
+        """
+        Blocks until one more request to the host of the URL is allowed.
+
+        :param url: The URL that is about to be requested.
+        """
+        host_limit = self._host_limit(urlsplit(url).netloc)
+        with host_limit.condition:
+            while host_limit.in_flight >= int(host_limit.limit):
+                host_limit.condition.wait()
+            host_limit.in_flight += 1
+            host_limit.peak_in_flight = max(host_limit.peak_in_flight, host_limit.in_flight)
+
+    def release(self, url: str, latency: float, status: Optional[int] = None, throttled: bool = False,
+                error: Optional[str] = None):
+        """
+        Frees the slot of a finished request and adapts the limit of its host.
+
+        :param url: The requested URL.
+        :param latency: The latency of the request, in seconds.
+        :param status: The final status code (None when the request failed).
+        :param throttled: True when a 429/503 response was retried before the final response.
+        :param error: The name of the error when the request failed (e.g. ReadTimeout).
+        """
+        host = urlsplit(url).netloc
+        host_limit = self._host_limit(host)
+        with host_limit.condition:
+            host_limit.in_flight -= 1
+            old_limit = int(host_limit.limit)
+
+            if error is not None or throttled or status in self.OVERLOAD_STATUS_CODES:
+                reason = error or (f"status {status}" if status in self.OVERLOAD_STATUS_CODES else "retried 429/503")
+                self._decrease(host, host_limit, reason)
+            else:
+                host_limit.samples.append(latency)
+                if len(host_limit.samples) >= max(self.min_window, old_limit):
+                    self._end_window(host, host_limit)
+
+            host_limit.condition.notify_all()
+
+    def _end_window(self, host: str, host_limit: _HostLimit):
+        """
+        Compares the p95 latency of a window of successful requests with the baseline and adapts the limit.
+        """
+        samples = sorted(host_limit.samples)
+        host_limit.samples = []
+        saturated = host_limit.peak_in_flight >= int(host_limit.limit)
+        host_limit.peak_in_flight = host_limit.in_flight
+        p95 = samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))]
+
+        if host_limit.baseline_p95 is None:
+            host_limit.baseline_p95 = p95
+        if p95 > host_limit.baseline_p95 * self.latency_tolerance:
+            self._decrease(host, host_limit, f"p95 {p95 * 1000:.0f} ms above baseline "
+                                             f"{host_limit.baseline_p95 * 1000:.0f} ms")
+            return
+
+        # The baseline follows lower latencies at once and higher ones slowly, so a host that becomes slower for good
+        # does not keep the limit down forever
+        host_limit.baseline_p95 = min(p95, host_limit.baseline_p95 * 1.1)
+        if saturated and host_limit.limit < self.max_limit:
+            self._change(host, host_limit, min(self.max_limit, host_limit.limit + 1), 'increase',
+                         f"p95 {p95 * 1000:.0f} ms stable")
+
+    def _decrease(self, host: str, host_limit: _HostLimit, reason: str):
+        """
+        Cuts the limit of a host, unless the previous decrease is still cooling down.
+        """
+        now = time.monotonic()
+        host_limit.samples = []  # The window mixes the old and the new limit
+        host_limit.peak_in_flight = host_limit.in_flight
+        if now < host_limit.cooldown_until:
+            return
+        host_limit.cooldown_until = now + self.cooldown
+        self._change(host, host_limit, max(self.min_limit, host_limit.limit * self.decrease_factor), 'decrease',
+                     reason)
+
+    def _change(self, host: str, host_limit: _HostLimit, new_limit: float, direction: str, reason: str):
+        """
+        Applies a new limit and records the change.
+        """
+        old_limit = int(host_limit.limit)
+        host_limit.limit = new_limit
+        if int(new_limit) != old_limit:
+            logger.info("Concurrency for %s: %d -> %d (%s).", host, old_limit, int(new_limit), reason)
+            self.metrics.inc('concurrency_changes_total', direction=direction)
+            self.metrics.set_gauge('host_concurrency_limit', int(new_limit), host=host)
+
+    def limits(self) -> Dict[str, int]:
+        """
+        Returns the current limit of every host.
+
+        :return: A dictionary mapping host names to their concurrency limit.
+        """
+        with self._lock:
+            return {host: int(host_limit.limit) for host, host_limit in self._hosts.items()}
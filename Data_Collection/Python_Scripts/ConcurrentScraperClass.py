@@ -0,0 +1,165 @@
+import logging  # For reporting the articles that could not be scraped
+import threading  # For locks shared between the worker threads
+import time  # For measuring throughput and pacing requests
+from collections import deque  # For keeping the in-flight futures in submission order
+from concurrent.futures import ThreadPoolExecutor  # For running article downloads in parallel
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple  # For hinting,help with code clarity, readability
+from urllib.parse import urlsplit  # For extracting the host name from a URL
+
+from ArticleScraperClass import ArticleScraper
+
+logger = logging.getLogger(__name__)
+
+
+class HostRateLimiter:
+    """
+    This class caps the number of requests per second sent to each host.
+    Every caller reserves the next free time slot for the host of its URL and sleeps until that slot arrives.
+    """
+
+    def __init__(self, requests_per_second: Optional[float] = None):
+        """
+        Initializes the rate limiter.
+
+        :param requests_per_second: The maximum number of requests per second per host (None or 0 means unlimited).
+        """
+        self.requests_per_second = requests_per_second
+        self._next_slot: Dict[str, float] = {}  # The next time a request may be sent, per host
+        self._lock = threading.Lock()
+
+    def wait(self, url: str):
+        """
+        Blocks the calling thread until a request to the host of the given URL is allowed.
+
+        :param url: The URL that is about to be requested.
+        """
+        if not self.requests_per_second:
+            return  # No cap configured
+
+        host = urlsplit(url).netloc
+        interval = 1.0 / self.requests_per_second
+        with self._lock:
+            now = time.monotonic()
+            # Reserve the first free slot for this host, then push the next slot one interval further
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + interval
+
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ConcurrentArticleScraper:
+    """
+    This class scrapes articles with a pool of worker threads.
+    Results are handed back in the same order as the input URLs, so the caller sees exactly the articles the
+    sequential loop would have collected, just faster.
+    """
+
+    def __init__(self, workers: int = 8, requests_per_second: Optional[float] = None,
+                 scraper: Optional[ArticleScraper] = None):
+        """
+        Initializes the worker pool.
+
+        :param workers: The number of articles downloaded in parallel.
+        :param requests_per_second: The maximum number of requests per second per host (None means unlimited).
+        :param scraper: The ArticleScraper used to download and parse each article.
+        """
+        self.workers = max(1, workers)
+        self.rate_limiter = HostRateLimiter(requests_per_second)
+        self.scraper = scraper if scraper is not None else ArticleScraper()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='article-fetch')
+
+        # Throughput statistics
+        self.articles_scraped = 0
+        self.started_at = time.monotonic()
+
+    def _fetch(self, article_url: str):
+        """
+        Waits for the host rate limit and then scrapes a single article (runs on a worker thread).
+
+        :param article_url: The URL of the article to be scraped.
+        :return: The Article object, or a falsy value if no article could be scraped.
+        """
+        self.rate_limiter.wait(article_url)
+        return self.scraper.scrape_article(article_url)
+
+    def scrape_in_order(self, article_urls: Iterable[str], limit: int,
+                        on_failure: Optional[Callable[[str], None]] = None) -> Iterator[Tuple[str, object]]:
+        """
+        Scrapes the given URLs concurrently and yields the successful results in input order.
+
+        At most `workers * 2` downloads are in flight at once, and no new downloads are started once `limit`
+        articles have been yielded, so the per-sitemap quota is respected exactly.
+
+        :param article_urls: The URLs of the articles to be scraped.
+        :param limit: The maximum number of articles to yield.
+        :param on_failure: An optional callback called with the URL of every article that could not be scraped.
+        :return: An iterator of (url, Article) tuples.
+        """
+        if limit <= 0:
+            return
+
+        url_iterator = iter(article_urls)
+        in_flight = deque()  # (url, future) pairs in submission order
+        yielded = 0
+
+        def submit_next() -> bool:
+            # Submit the next URL to the pool, returns False when there are no URLs left
+            for next_url in url_iterator:
+                in_flight.append((next_url, self._executor.submit(self._fetch, next_url)))
+                return True
+            return False
+
+        try:
+            # Fill the window
+            while len(in_flight) < self.workers * 2 and submit_next():
+                pass
+
+            while in_flight:
+                article_url, future = in_flight.popleft()
+                try:
+                    article = future.result()
+                except Exception as e:
+                    # Handle errors related to scraping individual articles
+                    logger.error("Error scraping article %s: %s", article_url, e)
+                    article = None
+
+                if article:
+                    yielded += 1
+                    self.articles_scraped += 1
+                    yield article_url, article
+                    if yielded >= limit:
+                        break  # The quota is reached, the remaining downloads are discarded
+                else:
+                    logger.warning("No content found for article %s.", article_url)
+                    if on_failure is not None:
+                        on_failure(article_url)
+
+                # Refill the window with the next URL
+                submit_next()
+        finally:
+            # Drop the downloads that are no longer needed
+            for _, future in in_flight:
+                future.cancel()
+
+    def articles_per_second(self) -> float:
+        """
+        Returns the average scraping throughput since this scraper was created.
+
+        :return: The number of articles scraped per second.
+        """
+        elapsed = time.monotonic() - self.started_at
+        return self.articles_scraped / elapsed if elapsed > 0 else 0.0
+
+    def close(self):
+        """
+        Shuts down the worker pool.
+        """
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
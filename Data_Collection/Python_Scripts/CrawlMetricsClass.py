@@ -0,0 +1,284 @@
+import bisect  # For finding the bucket of an observation
+import logging  # For reporting the metrics endpoint
+import os  # For writing the metrics file atomically
+import threading  # For sharing the metrics between the crawl threads
+import time  # For timing the stages
+from contextlib import contextmanager  # For the stage timer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # For the live metrics endpoint
+from typing import Dict, Optional, Tuple  # For hinting,help with code clarity, readability
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets, in seconds (the last bucket is +Inf)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0)
+
+
+class Histogram:
+    """
+    This class counts observations in fixed buckets, like a Prometheus histogram.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """
+        Initializes the buckets.
+
+        :param buckets: The sorted upper bounds of the buckets.
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # One more bucket for +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        """
+        Adds an observation.
+
+        :param value: The observed value.
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, fraction: float) -> float:
+        """
+        Estimates a quantile by interpolating inside its bucket (the same estimate as PromQL's histogram_quantile).
+
+        :param fraction: The quantile, between 0 and 1.
+        :return: The estimated value.
+        """
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - cumulative) / bucket_count, self.max)
+            cumulative += bucket_count
+        return self.max
+
+
+class CrawlMetrics:
+    """
+    This class collects the metrics of a crawl: counters (articles, failures, bytes, status codes...), gauges (queue
+    depths) and latency histograms per stage (sitemap fetch, article fetch, parse and save).
+    The metrics can be rendered in the Prometheus text format, written to a file or served on a local endpoint, and
+    summarized at the end of the run.
+    """
+
+    def __init__(self, prefix: str = 'crawler'):
+        """
+        Initializes an empty set of metrics.
+
+        :param prefix: The prefix of the metric names.
+        """
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        self._gauges: Dict[str, Dict[Tuple, float]] = {}
+        self._histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._file_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """
+        Increments a counter.
+
+        :param name: The name of the counter.
+        :param value: The increment.
+        :param labels: The labels of the series.
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """
+        Sets a gauge.
+
+        :param name: The name of the gauge.
+        :param value: The current value.
+        :param labels: The labels of the series.
+        """
+        with self._lock:
+            self._gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        Adds an observation to a histogram.
+
+        :param name: The name of the histogram.
+        :param value: The observed value (seconds for latencies).
+        :param labels: The labels of the series.
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    @contextmanager
+    def time_stage(self, stage: str):
+        """
+        Times a block of code and records it in the stage latency histogram.
+
+        :param stage: The name of the stage (e.g. sitemap_fetch, article_fetch, parse or save).
+        """
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - started_at, stage=stage)
+
+    def counter_value(self, name: str, **labels) -> float:
+        """
+        Returns the value of a counter series (0 if it was never incremented).
+        """
+        with self._lock:
+            return self._counters.get(name, {}).get(tuple(sorted(labels.items())), 0)
+
+    def to_prometheus(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+
+        :return: The metrics as text.
+        """
+
+        def series_name(name: str, key: Tuple, extra: Tuple = ()) -> str:
+            labels = ','.join(f'{label}="{value}"' for label, value in key + extra)
+            return f"{self.prefix}_{name}{{{labels}}}" if labels else f"{self.prefix}_{name}"
+
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {self.prefix}_{name} counter")
+                lines += [f"{series_name(name, key)} {value}" for key, value in sorted(series.items())]
+            for name, series in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {self.prefix}_{name} gauge")
+                lines += [f"{series_name(name, key)} {value}" for key, value in sorted(series.items())]
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {self.prefix}_{name} histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                        cumulative += bucket_count
+                        lines.append(f"{series_name(name + '_bucket', key, (('le', bound),))} {cumulative}")
+                    lines.append(f"{series_name(name + '_sum', key)} {histogram.sum}")
+                    lines.append(f"{series_name(name + '_count', key)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> Dict[str, Dict]:
+        """
+        Summarizes the metrics for the end-of-run report.
+
+        :return: A dictionary with the counters, and the count, mean, p50, p95, p99 and max of every histogram.
+        """
+        with self._lock:
+            counters = {name: {self._label_text(key): value for key, value in series.items()}
+                        for name, series in self._counters.items()}
+            histograms = {}
+            for name, series in self._histograms.items():
+                histograms[name] = {
+                    self._label_text(key): {
+                        'count': histogram.count,
+                        'mean': histogram.sum / histogram.count if histogram.count else 0.0,
+                        'p50': histogram.quantile(0.50),
+                        'p95': histogram.quantile(0.95),
+                        'p99': histogram.quantile(0.99),
+                        'max': histogram.max
+                    }
+                    for key, histogram in series.items()
+                }
+        return {'counters': counters, 'histograms': histograms}
+
+    @staticmethod
+    def _label_text(key: Tuple) -> str:
+        return ','.join(f"{label}={value}" for label, value in key) or 'total'
+
+    def log_summary(self):
+        """
+        Logs the end-of-run summary: the latency of every stage and the counters.
+        """
+        summary = self.summary()
+        for name, series in sorted(summary['histograms'].items()):
+            for labels, stats in sorted(series.items()):
+                logger.info("%s{%s}: %d observations, mean %.1f ms, p50 %.1f ms, p95 %.1f ms, p99 %.1f ms, max %.1f ms",
+                            name, labels, stats['count'], stats['mean'] * 1000, stats['p50'] * 1000,
+                            stats['p95'] * 1000, stats['p99'] * 1000, stats['max'] * 1000)
+        for name, series in sorted(summary['counters'].items()):
+            logger.info("%s: %s", name, ', '.join(f"{labels}={value:g}" for labels, value in sorted(series.items())))
+
+    def write_file(self, file_path: str):
+        """
+        Writes the metrics to a file in the Prometheus text format (e.g. for the node exporter textfile collector).
+
+        :param file_path: The path of the metrics file, replaced atomically.
+        """
+        temp_path = file_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(self.to_prometheus())
+        os.replace(temp_path, file_path)
+
+    def start_file_writer(self, file_path: str, interval: float):
+        """
+        Rewrites the metrics file every interval seconds on a background thread.
+
+        :param file_path: The path of the metrics file.
+        :param interval: The number of seconds between two writes.
+        """
+
+        def write_periodically():
+            while not self._stop.wait(interval):
+                try:
+                    self.write_file(file_path)
+                except OSError as e:
+                    logger.warning("Could not write the metrics file %s: %s", file_path, e)
+
+        self._file_thread = threading.Thread(target=write_periodically, name='metrics-file', daemon=True)
+        self._file_thread.start()
+
+    def start_server(self, port: int, host: str = '127.0.0.1'):
+        """
+        Serves the metrics on http://host:port/metrics in the Prometheus text format, on a background thread.
+
+        :param port: The port of the endpoint.
+        :param host: The interface the endpoint listens on (local only by default).
+        """
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes of the endpoint are not crawl events
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics-server', daemon=True).start()
+        logger.info("Serving metrics on http://%s:%d/metrics", host, self._server.server_address[1])
+
+    def close(self):
+        """
+        Stops the metrics endpoint and the file writer.
+        """
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,418 @@
+import logging  # For reporting the progress of the pipeline
+import multiprocessing  # For starting the parse processes
+import os  # For the number of CPU cores
+import queue  # For the bounded queues between the stages
+import threading  # For the discovery, fetch and monitor threads
+import time  # For measuring the throughput of each stage
+from concurrent.futures import ProcessPoolExecutor  # For parsing pages on all CPU cores
+from dataclasses import dataclass, field  # For the work items passed between the stages
+from typing import Callable, Dict, List, Optional, Set, Tuple  # For hinting,help with code clarity, readability
+
+from requests import RequestException
+
+import Article
+from ArticleScraperClass import ArticleScraper
+from ConcurrentScraperClass import HostRateLimiter
+from CrawlStateStoreClass import CrawlStateStore
+from SiteParserClass import SitemapParser
+
+logger = logging.getLogger(__name__)
+
+
+def parse_page(engine: str, article_url: str, html: bytes) -> 'Article.Article':
+    """
+    Parses a downloaded article page (runs in a parse process).
+
+    :param engine: The extraction engine, 'lxml' or 'bs4'.
+    :param article_url: The URL of the article.
+    :param html: The HTML content of the article page.
+    :return: The Article object.
+    """
+    if engine == 'lxml':
+        return ArticleScraper.parse_article_lxml(article_url, html)
+    return ArticleScraper.parse_article_bs4(article_url, html)
+
+
+def parse_page_timed(engine: str, article_url: str, html: bytes) -> Tuple['Article.Article', float]:
+    """
+    Parses a downloaded article page and measures the parse time (runs in a parse process).
+
+    :param engine: The extraction engine, 'lxml' or 'bs4'.
+    :param article_url: The URL of the article.
+    :param html: The HTML content of the article page.
+    :return: The Article object and the number of seconds spent parsing, without the time spent in the queues.
+    """
+    started_at = time.perf_counter()
+    article = parse_page(engine, article_url, html)
+    return article, time.perf_counter() - started_at
+
+
+@dataclass
+class MonthTask:
+    """
+    This dataclass describes one monthly sitemap going through the pipeline.
+    """
+    sitemap_url: str
+    year: int
+    month: int
+    lastmod: Optional[str] = None
+    previous_status: Optional[str] = None  # The status recorded by an earlier run
+    fetched_urls: Set[str] = field(default_factory=set)  # The URLs fetched by earlier runs
+
+    # Filled while the pipeline runs
+    issued: int = 0  # The number of URLs handed to the fetch stage
+    total: Optional[int] = None  # The final number of URLs issued, known once discovery is done with the month
+    closed: bool = False  # Set once the month needs no more articles
+    new_articles: int = 0  # The number of articles scraped for this month in this run
+
+
+@dataclass
+class WorkItem:
+    """
+    This dataclass is a single article URL travelling through the fetch, parse and sink stages.
+    """
+    month_index: int
+    seq: int  # The order of the URL among the URLs issued for its month
+    position: int  # The position of the URL in the sitemap
+    url: str
+    article: Optional['Article.Article'] = None
+    error: Optional[str] = None
+    cache_headers: Optional[Dict[str, str]] = None  # The validators to cache once the page is parsed
+    skipped: bool = False  # True when the month was already closed and the URL was not fetched
+
+
+@dataclass
+class MonthEnd:
+    """
+    This dataclass tells the sink stage how many URLs were issued for a month.
+    """
+    month_index: int
+    total: int
+
+
+class StageStats:
+    """
+    This class counts the items processed by a pipeline stage and reports its throughput.
+    """
+
+    def __init__(self, name: str):
+        """
+        Initializes the counters of a stage.
+
+        :param name: The name of the stage.
+        """
+        self.name = name
+        self.processed = 0
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, count: int = 1):
+        """
+        Counts processed items.
+
+        :param count: The number of items processed.
+        """
+        with self._lock:
+            self.processed += count
+
+    def rate(self) -> float:
+        """
+        Returns the average throughput of the stage.
+
+        :return: The number of items processed per second.
+        """
+        elapsed = time.monotonic() - self.started_at
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+
+class CrawlPipeline:
+    """
+    This class runs the crawl as a staged pipeline:
+
+    discovery (1 thread) -> fetch (I/O threads) -> parse (process pool) -> sink (calling thread)
+
+    Sitemap discovery streams the article URLs of each month into the fetch queue. The fetch threads download the
+    pages and hand them to the parse processes, so HTML parsing is not limited to one core by the GIL. The sink puts
+    the parsed articles back into sitemap order, records them in the crawl state and hands each finished month to the
+    month sink (which writes it through FileUtility). The queues are bounded and the number of URLs in flight is
+    capped, so a slow stage applies backpressure to the stages before it.
+    """
+
+    def __init__(self, sitemap_parser: SitemapParser, scraper: ArticleScraper, state_store: CrawlStateStore,
+                 fetch_workers: int = 8, parse_workers: Optional[int] = None,
+                 rate_limiter: Optional[HostRateLimiter] = None, queue_size: int = 64, stats_interval: float = 10.0):
+        """
+        Initializes the pipeline.
+
+        :param sitemap_parser: The SitemapParser used to stream the monthly sitemaps.
+        :param scraper: The ArticleScraper whose HTTP client and extraction engine are used.
+        :param state_store: The crawl state store where the scraped articles are recorded.
+        :param fetch_workers: The number of download threads.
+        :param parse_workers: The number of parse processes (the number of CPU cores by default).
+        :param rate_limiter: The optional per-host rate limiter applied before every download.
+        :param queue_size: The capacity of each queue between the stages.
+        :param stats_interval: The number of seconds between two progress reports (0 disables them).
+        """
+        self.sitemap_parser = sitemap_parser
+        self.scraper = scraper
+        self.http_client = scraper.http_client
+        self.metrics = self.http_client.metrics
+        self.state_store = state_store
+        self.fetch_workers = max(1, fetch_workers)
+        self.parse_workers = max(1, parse_workers or os.cpu_count() or 1)
+        self.rate_limiter = rate_limiter if rate_limiter is not None else HostRateLimiter()
+        self.queue_size = max(1, queue_size)
+        self.stats_interval = stats_interval
+
+        # Bounded queues between the stages
+        self.fetch_queue: 'queue.Queue' = queue.Queue(maxsize=self.queue_size)
+        self.sink_queue: 'queue.Queue' = queue.Queue(maxsize=self.queue_size)
+        # Parse tasks waiting for or running in the process pool
+        self._parse_slots = threading.BoundedSemaphore(self.queue_size)
+        self._parse_depth = 0
+        # URLs issued by discovery but not yet consumed by the sink, this bounds the reorder buffer of the sink
+        self._in_flight = threading.BoundedSemaphore(self.queue_size * 3 + self.fetch_workers)
+        self._lock = threading.Lock()
+        self._reorder_depth = 0
+
+        self.stats = {name: StageStats(name) for name in ('discovery', 'fetch', 'parse', 'sink')}
+        self._stop = threading.Event()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the depth of the queue in front of each stage and the throughput of each stage.
+
+        :return: A dictionary per stage with its 'depth', 'processed' count and 'rate' (items per second).
+        """
+        depths = {
+            'discovery': 0,
+            'fetch': self.fetch_queue.qsize(),
+            'parse': self._parse_depth,
+            'sink': self.sink_queue.qsize() + self._reorder_depth
+        }
+        return {name: {'depth': depths[name], 'processed': stats.processed, 'rate': stats.rate()}
+                for name, stats in self.stats.items()}
+
+    def _report(self):
+        """
+        Logs the state of every stage on a single line and publishes it as metrics.
+        """
+        snapshot = self.snapshot()
+        for name, stage in snapshot.items():
+            self.metrics.set_gauge('pipeline_queue_depth', stage['depth'], stage=name)
+            self.metrics.set_gauge('pipeline_items_per_second', stage['rate'], stage=name)
+        parts = [f"{name}: depth {stage['depth']}, {stage['processed']} done, {stage['rate']:.1f}/s"
+                 for name, stage in snapshot.items()]
+        logger.info("Pipeline | " + " | ".join(parts))
+
+    def _monitor(self):
+        """
+        Reports the pipeline state every stats_interval seconds (runs on the monitor thread).
+        """
+        while not self._stop.wait(self.stats_interval):
+            self._report()
+
+    def _discover(self, months: List[MonthTask]):
+        """
+        Streams the article URLs of every month into the fetch queue (runs on the discovery thread).
+
+        :param months: The months to crawl, in order.
+        """
+        for month_index, task in enumerate(months):
+            if not task.closed:
+                try:
+                    urls = self.sitemap_parser.iter_article_urls(task.sitemap_url, task.lastmod)
+                    for position, article_url in enumerate(urls):
+                        if article_url in task.fetched_urls:
+                            continue  # Fetched by an earlier run
+                        self._in_flight.acquire()  # Wait until the sink has room for one more URL
+                        if task.closed or self._stop.is_set():
+                            self._in_flight.release()
+                            break  # The month has all the articles it needs
+                        self.fetch_queue.put(WorkItem(month_index, task.issued, position, article_url))
+                        task.issued += 1
+                        self.stats['discovery'].add()
+                except Exception as e:
+                    # Handle errors related to processing each sitemap
+                    logger.error("Error processing sitemap %s: %s", task.sitemap_url, e)
+            task.total = task.issued
+            self.sink_queue.put(MonthEnd(month_index, task.total))
+
+    def _fetch(self, months: List[MonthTask], parse_pool: ProcessPoolExecutor):
+        """
+        Downloads the pages of the URLs in the fetch queue and hands them to the parse stage (runs on a fetch thread).
+
+        :param months: The months to crawl, in order.
+        :param parse_pool: The process pool of the parse stage.
+        """
+        cache = self.http_client.cache
+        while True:
+            item = self.fetch_queue.get()
+            if item is None:
+                return  # The pipeline is shutting down
+
+            if months[item.month_index].closed:
+                # The month is complete, the page is not needed anymore
+                item.skipped = True
+                self.sink_queue.put(item)
+                continue
+
+            try:
+                self.rate_limiter.wait(item.url)
+                with self.metrics.time_stage('article_fetch'):
+                    response, not_modified = self.http_client.conditional_get(item.url, 'article')
+                self.stats['fetch'].add()
+                if not_modified:
+                    # The article did not change since it was cached, it does not need to be parsed
+                    item.article = Article.Article(**cache.get_data(item.url))
+                    self.sink_queue.put(item)
+                elif response.status_code == 200:
+                    if self.scraper.archive is not None:
+                        # Keep the raw page so it can be extracted again later without fetching it
+                        self.scraper.archive.store(item.url, response.content)
+                    if cache is not None:
+                        item.cache_headers = {name: response.headers[name] for name in ('ETag', 'Last-Modified')
+                                              if name in response.headers}
+                    self._submit_parse(parse_pool, item, response.content)
+                else:
+                    item.error = f"Failed to retrieve article {item.url}. Status code: {response.status_code}"
+                    self.sink_queue.put(item)
+            except RequestException as e:
+                item.error = f"Failed to retrieve article {item.url}. Error: {e}"
+                self.sink_queue.put(item)
+            except Exception as e:
+                item.error = f"Error scraping article {item.url}: {e}"
+                self.sink_queue.put(item)
+
+    def _submit_parse(self, parse_pool: ProcessPoolExecutor, item: WorkItem, html: bytes):
+        """
+        Submits a downloaded page to the parse processes, waiting while the parse stage is full.
+
+        :param parse_pool: The process pool of the parse stage.
+        :param item: The work item of the page.
+        :param html: The HTML content of the page.
+        """
+        self._parse_slots.acquire()
+        with self._lock:
+            self._parse_depth += 1
+        future = parse_pool.submit(parse_page_timed, self.scraper.engine, item.url, html)
+
+        def parsed(done_future):
+            # Called when the parse process is done, the result moves on to the sink stage
+            with self._lock:
+                self._parse_depth -= 1
+            self._parse_slots.release()
+            try:
+                item.article, parse_seconds = done_future.result()
+                self.metrics.observe('stage_seconds', parse_seconds, stage='parse')
+                self.stats['parse'].add()
+            except Exception as e:
+                item.error = f"Error parsing article {item.url}: {e}"
+            self.sink_queue.put(item)
+
+        future.add_done_callback(parsed)
+
+    def run(self, months: List[MonthTask], articles_per_sitemap: int, overall_article_limit: int,
+            total_article_counter: int, month_sink: Callable[[MonthTask], None],
+            article_sink: Optional[Callable[[MonthTask, 'Article.Article'], None]] = None) -> int:
+        """
+        Runs the pipeline over the given months, in the calling thread (which runs the sink stage).
+
+        :param months: The months to crawl, in order.
+        :param articles_per_sitemap: The maximum number of articles per monthly sitemap.
+        :param overall_article_limit: The overall article limit across all months.
+        :param total_article_counter: The number of articles fetched by earlier runs.
+        :param month_sink: Called with each MonthTask once the month is complete, to write it out.
+        :param article_sink: Optionally called with the MonthTask and each article, in sitemap order, before the
+                             article is recorded (e.g. to stream it to a JSON Lines file).
+        :return: The total number of articles, including the ones fetched by earlier runs.
+        """
+        # Spawned (not forked) parse processes, forking a process that already runs threads is unsafe
+        parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers,
+                                         mp_context=multiprocessing.get_context('spawn'))
+        threads = [threading.Thread(target=self._discover, args=(months,), name='discovery', daemon=True)]
+        threads += [threading.Thread(target=self._fetch, args=(months, parse_pool), name=f'fetch-{number}',
+                                     daemon=True) for number in range(self.fetch_workers)]
+        if self.stats_interval > 0:
+            threads.append(threading.Thread(target=self._monitor, name='monitor', daemon=True))
+        for thread in threads:
+            thread.start()
+
+        pending: Dict[int, Dict[int, WorkItem]] = {}  # Reorder buffer: results per month, by seq
+        completed = False
+        try:
+            for month_index, task in enumerate(months):
+                # Months after the overall limit is reached are only drained, they are not written out
+                limit_reached = total_article_counter >= overall_article_limit
+
+                # Never ask for more than what is left of the monthly quota or of the overall limit
+                month_limit = min(articles_per_sitemap - len(task.fetched_urls),
+                                  overall_article_limit - total_article_counter)
+                if month_limit <= 0:
+                    task.closed = True
+
+                next_seq = 0
+                buffered = pending.setdefault(month_index, {})
+                while task.total is None or next_seq < task.total:
+                    if next_seq not in buffered:
+                        # Wait for the next result of any month
+                        message = self.sink_queue.get()
+                        if isinstance(message, MonthEnd):
+                            continue  # discovery already set the total of the month
+                        pending.setdefault(message.month_index, {})[message.seq] = message
+                        with self._lock:
+                            self._reorder_depth += 1
+                        continue
+
+                    item = buffered.pop(next_seq)
+                    next_seq += 1
+                    with self._lock:
+                        self._reorder_depth -= 1
+                    self._in_flight.release()
+                    self.stats['sink'].add()
+
+                    if task.closed or item.skipped:
+                        continue  # The month already has all its articles
+                    if item.article:
+                        with self.metrics.time_stage('save'):
+                            if article_sink is not None:
+                                article_sink(task, item.article)
+                            # Persist the article right away so a crash does not lose the month
+                            self.state_store.record_article(task.sitemap_url, item.position, item.article)
+                            if item.cache_headers is not None:
+                                # Remember the validators and the extracted fields for the next conditional request
+                                self.http_client.cache.store(item.url, item.cache_headers, item.article.to_dict())
+                        self.metrics.inc('articles_total', outcome='scraped')
+                        task.new_articles += 1
+                        total_article_counter += 1
+                        logger.debug("Total articles scraped so far: %d", total_article_counter)
+                        if task.new_articles >= month_limit:
+                            task.closed = True  # The quota is reached, the remaining URLs are dropped
+                    else:
+                        logger.warning(item.error or f"No content found for article {item.url}.")
+                        self.metrics.inc('articles_total', outcome='failed')
+                        self.state_store.record_failure(task.sitemap_url, item.position, item.url)
+
+                task.closed = True
+                if limit_reached:
+                    continue
+                if total_article_counter >= overall_article_limit:
+                    # Stop if the overall article limit has been reached, the later months are not needed
+                    for later_task in months[month_index + 1:]:
+                        later_task.closed = True
+
+                month_sink(task)
+            completed = True
+        finally:
+            # Stop the stages, after an error the threads are left behind (they are daemon threads)
+            self._stop.set()
+            for _ in range(self.fetch_workers):
+                try:
+                    self.fetch_queue.put_nowait(None)
+                except queue.Full:
+                    break
+            parse_pool.shutdown(wait=completed, cancel_futures=True)
+            if self.stats_interval > 0:
+                self._report()
+
+        return total_article_counter
@@ -0,0 +1,230 @@
+import sqlite3  # For the durable queue shared by the coordinator and the workers
+import threading  # For sharing the connection between the worker and its lease renewal thread
+import time  # For the lease deadlines
+from contextlib import contextmanager  # For the write transactions
+from typing import Dict, List, NamedTuple, Optional, Tuple  # For hinting,help with code clarity, readability
+
+
+class QueueTask(NamedTuple):
+    """
+    A monthly sitemap leased by a worker.
+    """
+    task_id: int
+    sitemap_url: str
+    year: int
+    month: int
+    lastmod: Optional[str]
+    attempts: int  # 1 for the first lease, more when earlier workers died or gave the month back
+
+
+class CrawlQueue:
+    """
+    This class is a durable work queue of monthly sitemaps in a SQLite file, shared by a coordinator and any number of
+    worker processes, so a crawl can be split between them.
+
+    The coordinator enqueues the months and the crawl limits. Every worker leases one month at a time, keeps its lease
+    alive while it crawls it, and acknowledges it once its file is written. The lease of a worker that dies expires,
+    and the month is leased again by another worker, which resumes it from the shared crawl state.
+
+    The overall article limit is enforced across all the workers: before crawling a month, a worker reserves its share
+    of the limit in a single write transaction, so two workers can never reserve the same articles. The limit counts
+    the articles already fetched for every month plus the reservations of the months being crawled.
+
+    The coordinator and the workers must run on one host. The queue is in WAL mode, whose shared memory index does not
+    work across machines (e.g. over a network file system). The lease deadlines are also read on the clock of the
+    worker that took the lease and compared with the clocks of the others: across machines, a clock running ahead
+    would take the months of live workers, and one running behind would leave the months of dead workers waiting.
+    """
+
+    # Task statuses
+    STATUS_PENDING = 'pending'
+    STATUS_LEASED = 'leased'
+    STATUS_DONE = 'done'
+
+    def __init__(self, db_path: str = 'crawl_queue.sqlite3'):
+        """
+        Opens (or creates) the queue.
+
+        :param db_path: The path of the SQLite database file, on a local disk of the host of all the workers.
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # Transactions are explicit (BEGIN IMMEDIATE), so a lease is read and taken under the same write lock
+        self._connection = sqlite3.connect(db_path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        with self._transaction() as connection:
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY,
+                    sitemap_url TEXT UNIQUE NOT NULL,
+                    year INTEGER,
+                    month INTEGER,
+                    lastmod TEXT,
+                    status TEXT NOT NULL,
+                    worker TEXT,
+                    lease_until REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    fetched INTEGER NOT NULL DEFAULT 0,
+                    reserved INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL
+                )''')
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS settings (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER
+                )''')
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Runs a block in a write transaction, committed at its end or rolled back on an error.
+        """
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._connection
+            except BaseException:
+                self._connection.execute('ROLLBACK')
+                raise
+            self._connection.execute('COMMIT')
+
+    def enqueue_months(self, months: List[Tuple[str, int, int, Optional[str], int]], overall_article_limit: int,
+                       articles_per_sitemap: int):
+        """
+        Starts a new round of the crawl: every month becomes pending again, with the limits of the round.
+
+        :param months: The (sitemap URL, year, month, lastmod, articles already fetched) of every month, in crawl order.
+        :param overall_article_limit: The maximum number of articles over all the months and workers.
+        :param articles_per_sitemap: The maximum number of articles of each month.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM tasks')
+            connection.executemany('''
+                INSERT INTO tasks (id, sitemap_url, year, month, lastmod, status, fetched, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                                   [(position, sitemap_url, year, month, lastmod, self.STATUS_PENDING, fetched, now)
+                                    for position, (sitemap_url, year, month, lastmod, fetched) in enumerate(months)])
+            connection.executemany('INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?)',
+                                   [('overall_article_limit', overall_article_limit),
+                                    ('articles_per_sitemap', articles_per_sitemap)])
+
+    def settings(self) -> Dict[str, int]:
+        """
+        Returns the limits set by the coordinator.
+
+        :return: A dictionary with overall_article_limit and articles_per_sitemap.
+        """
+        with self._lock:
+            return dict(self._connection.execute('SELECT name, value FROM settings').fetchall())
+
+    def lease(self, worker: str, lease_seconds: float) -> Optional[QueueTask]:
+        """
+        Leases the next pending month, or a month whose lease expired (its worker died).
+
+        :param worker: The identifier of the worker.
+        :param lease_seconds: The number of seconds the lease lasts unless it is renewed.
+        :return: The leased month, or None if no month is available right now.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            row = connection.execute('''
+                SELECT id, sitemap_url, year, month, lastmod, attempts + 1 FROM tasks
+                WHERE status = ? OR (status = ? AND lease_until < ?)
+                ORDER BY id LIMIT 1''', (self.STATUS_PENDING, self.STATUS_LEASED, now)).fetchone()
+            if row is None:
+                return None
+            connection.execute('''
+                UPDATE tasks SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, updated_at = ?
+                WHERE id = ?''', (self.STATUS_LEASED, worker, now + lease_seconds, now, row[0]))
+        return QueueTask(*row)
+
+    def renew(self, task: QueueTask, worker: str, lease_seconds: float) -> bool:
+        """
+        Extends the lease of a month that is still being crawled.
+
+        :return: False if the lease was lost (it expired and another worker took the month).
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute('''
+                UPDATE tasks SET lease_until = ?, updated_at = ? WHERE id = ? AND status = ? AND worker = ?''',
+                                        (now + lease_seconds, now, task.task_id, self.STATUS_LEASED, worker))
+        return cursor.rowcount == 1
+
+    def reserve_articles(self, task: QueueTask, worker: str, fetched: int, wanted: int) -> int:
+        """
+        Reserves articles of the overall limit for a leased month.
+
+        The reservation of the month replaces the previous one (from a worker that died), and its count of fetched
+        articles is refreshed from the crawl state, so the limit is checked against up-to-date numbers.
+
+        :param task: The leased month.
+        :param worker: The identifier of the worker.
+        :param fetched: The number of articles of the month already fetched.
+        :param wanted: The number of articles the worker would like to scrape for the month.
+        :return: The number of articles granted (0 once the overall limit is reached).
+        """
+        with self._transaction() as connection:
+            limit = connection.execute(
+                "SELECT value FROM settings WHERE name = 'overall_article_limit'").fetchone()[0]
+            others = connection.execute('SELECT COALESCE(SUM(fetched + reserved), 0) FROM tasks WHERE id != ?',
+                                        (task.task_id,)).fetchone()[0]
+            granted = max(0, min(wanted, limit - others - fetched))
+            cursor = connection.execute('''
+                UPDATE tasks SET fetched = ?, reserved = ?, updated_at = ? WHERE id = ? AND worker = ?''',
+                                        (fetched, granted, time.time(), task.task_id, worker))
+        return granted if cursor.rowcount == 1 else 0
+
+    def ack(self, task: QueueTask, worker: str, fetched: int) -> bool:
+        """
+        Marks a leased month as done and turns its reservation into its final count of fetched articles.
+
+        :param task: The leased month.
+        :param worker: The identifier of the worker.
+        :param fetched: The number of articles of the month fetched so far (by every run).
+        :return: False if the lease was lost before the month was done.
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute('''
+                UPDATE tasks SET status = ?, fetched = ?, reserved = 0, lease_until = NULL, updated_at = ?
+                WHERE id = ? AND status = ? AND worker = ?''',
+                                        (self.STATUS_DONE, fetched, time.time(), task.task_id, self.STATUS_LEASED,
+                                         worker))
+        return cursor.rowcount == 1
+
+    def release(self, task: QueueTask, worker: str, fetched: int):
+        """
+        Gives a leased month back to the queue (e.g. the worker is stopping), so another worker takes it at once.
+
+        :param task: The leased month.
+        :param worker: The identifier of the worker.
+        :param fetched: The number of articles of the month fetched so far.
+        """
+        with self._transaction() as connection:
+            connection.execute('''
+                UPDATE tasks SET status = ?, fetched = ?, reserved = 0, worker = NULL, lease_until = NULL,
+                    updated_at = ?
+                WHERE id = ? AND status = ? AND worker = ?''',
+                               (self.STATUS_PENDING, fetched, time.time(), task.task_id, self.STATUS_LEASED, worker))
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Returns the progress of the crawl.
+
+        :return: The number of months per status, and the articles fetched and reserved over all the months.
+        """
+        with self._lock:
+            counts = dict(self._connection.execute('SELECT status, COUNT(*) FROM tasks GROUP BY status').fetchall())
+            fetched, reserved = self._connection.execute(
+                'SELECT COALESCE(SUM(fetched), 0), COALESCE(SUM(reserved), 0) FROM tasks').fetchone()
+        counts.update(fetched=fetched, reserved=reserved)
+        return counts
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,217 @@
+import json  # For working with JSON data
+import sqlite3  # For the local database that keeps the crawl state
+import threading  # For sharing the connection between threads safely
+import time  # For timestamping the records
+from typing import Iterator, List, Optional, Set, Tuple  # For hinting,help with code clarity, readability
+
+import Article
+
+
+class CrawlStateStore:
+    """
+    This class keeps the state of the crawl in a local SQLite database.
+    It records every monthly sitemap and every article URL already fetched (with its postId, status and data), so an
+    interrupted crawl resumes where it stopped and a re-run only fetches the URLs that are new in each sitemap.
+    """
+
+    # Article statuses
+    STATUS_DONE = 'done'  # The article was scraped and its data is stored
+    STATUS_FAILED = 'failed'  # The article could not be scraped, it is retried on the next run
+
+    # Sitemap statuses
+    SITEMAP_IN_PROGRESS = 'in_progress'
+    SITEMAP_DONE = 'done'
+
+    def __init__(self, db_path: str = 'crawl_state.sqlite3'):
+        """
+        Opens (or creates) the crawl state database.
+
+        :param db_path: The path of the SQLite database file.
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        # WAL keeps writes cheap while still surviving a crash of the scraper
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._create_tables()
+
+    def _create_tables(self):
+        """
+        Creates the tables of the crawl state if they do not exist yet.
+        """
+        with self._lock, self._connection:
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS sitemaps (
+                    url TEXT PRIMARY KEY,
+                    year INTEGER,
+                    month INTEGER,
+                    status TEXT,
+                    updated_at REAL
+                )''')
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS articles (
+                    url TEXT PRIMARY KEY,
+                    sitemap_url TEXT NOT NULL,
+                    position INTEGER,
+                    post_id TEXT,
+                    status TEXT NOT NULL,
+                    data TEXT,
+                    updated_at REAL
+                )''')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS articles_by_sitemap ON articles (sitemap_url, status, position)')
+
+    def record_sitemap(self, sitemap_url: str, year: int, month: int, status: str):
+        """
+        Records the processing status of a monthly sitemap.
+
+        :param sitemap_url: The URL of the monthly sitemap.
+        :param year: The year of the sitemap.
+        :param month: The month of the sitemap.
+        :param status: The status of the sitemap (in_progress or done).
+        """
+        with self._lock, self._connection:
+            self._connection.execute('''
+                INSERT INTO sitemaps (url, year, month, status, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at''',
+                                     (sitemap_url, year, month, status, time.time()))
+
+    def sitemap_status(self, sitemap_url: str) -> Optional[str]:
+        """
+        Returns the recorded status of a monthly sitemap.
+
+        :param sitemap_url: The URL of the monthly sitemap.
+        :return: The status, or None if the sitemap was never processed.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT status FROM sitemaps WHERE url = ?', (sitemap_url,)).fetchone()
+        return row[0] if row else None
+
+    def record_article(self, sitemap_url: str, position: int, article: 'Article.Article'):
+        """
+        Stores a scraped article and marks its URL as done.
+
+        :param sitemap_url: The URL of the monthly sitemap the article belongs to.
+        :param position: The position of the article URL in the sitemap.
+        :param article: The scraped Article object.
+        """
+        data = article.to_json()
+        with self._lock, self._connection:
+            self._connection.execute('''
+                INSERT INTO articles (url, sitemap_url, position, post_id, status, data, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET sitemap_url = excluded.sitemap_url, position = excluded.position,
+                    post_id = excluded.post_id, status = excluded.status, data = excluded.data,
+                    updated_at = excluded.updated_at''',
+                                     (article.url, sitemap_url, position, article.postId, self.STATUS_DONE, data,
+                                      time.time()))
+
+    def record_failure(self, sitemap_url: str, position: int, article_url: str):
+        """
+        Marks an article URL as failed, unless it was already fetched successfully.
+
+        :param sitemap_url: The URL of the monthly sitemap the article belongs to.
+        :param position: The position of the article URL in the sitemap.
+        :param article_url: The URL of the article that could not be scraped.
+        """
+        with self._lock, self._connection:
+            self._connection.execute('''
+                INSERT INTO articles (url, sitemap_url, position, status, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at
+                WHERE articles.status != ?''',
+                                     (article_url, sitemap_url, position, self.STATUS_FAILED, time.time(),
+                                      self.STATUS_DONE))
+
+    def fetched_urls(self, sitemap_url: str) -> Set[str]:
+        """
+        Returns the article URLs of a sitemap that were already fetched successfully.
+
+        :param sitemap_url: The URL of the monthly sitemap.
+        :return: A set of article URLs.
+        """
+        with self._lock:
+            rows = self._connection.execute('SELECT url FROM articles WHERE sitemap_url = ? AND status = ?',
+                                            (sitemap_url, self.STATUS_DONE)).fetchall()
+        return {row[0] for row in rows}
+
+    def count_fetched(self, sitemap_urls: Optional[List[str]] = None) -> int:
+        """
+        Counts the articles fetched successfully, optionally restricted to some sitemaps.
+
+        :param sitemap_urls: The URLs of the sitemaps to count (all sitemaps if None).
+        :return: The number of articles.
+        """
+        with self._lock:
+            if sitemap_urls is None:
+                row = self._connection.execute('SELECT COUNT(*) FROM articles WHERE status = ?',
+                                               (self.STATUS_DONE,)).fetchone()
+            else:
+                placeholders = ','.join('?' * len(sitemap_urls))
+                row = self._connection.execute(
+                    f'SELECT COUNT(*) FROM articles WHERE status = ? AND sitemap_url IN ({placeholders})',
+                    (self.STATUS_DONE, *sitemap_urls)).fetchone()
+        return row[0]
+
+    def sitemaps(self) -> List[Tuple[str, int, int]]:
+        """
+        Returns every monthly sitemap recorded so far, the most recent month first.
+
+        :return: A list of (sitemap URL, year, month) tuples.
+        """
+        with self._lock:
+            return self._connection.execute(
+                'SELECT url, year, month FROM sitemaps ORDER BY year DESC, month DESC').fetchall()
+
+    def article_positions(self, sitemap_url: str) -> List[Tuple[int, str]]:
+        """
+        Returns the article URLs of a sitemap that were fetched successfully, with their position in the sitemap.
+
+        :param sitemap_url: The URL of the monthly sitemap.
+        :return: A list of (position, article URL) tuples, in sitemap order.
+        """
+        with self._lock:
+            return self._connection.execute(
+                'SELECT position, url FROM articles WHERE sitemap_url = ? AND status = ? ORDER BY position',
+                (sitemap_url, self.STATUS_DONE)).fetchall()
+
+    def load_articles(self, sitemap_url: str) -> List['Article.Article']:
+        """
+        Loads the stored articles of a sitemap, in the order they appear in the sitemap.
+
+        :param sitemap_url: The URL of the monthly sitemap.
+        :return: A list of Article objects.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT data FROM articles WHERE sitemap_url = ? AND status = ? ORDER BY position',
+                (sitemap_url, self.STATUS_DONE)).fetchall()
+        return [Article.Article(**json.loads(row[0])) for row in rows]
+
+    def iter_articles(self, sitemap_url: str, batch_size: int = 500) -> Iterator['Article.Article']:
+        """
+        Streams the stored articles of a sitemap in sitemap order, without loading the whole month in memory.
+
+        :param sitemap_url: The URL of the monthly sitemap.
+        :param batch_size: The number of articles read from the database at a time.
+        :return: An iterator of Article objects.
+        """
+        last_position = -1
+        while True:
+            with self._lock:
+                rows = self._connection.execute(
+                    'SELECT position, data FROM articles WHERE sitemap_url = ? AND status = ? AND position > ? '
+                    'ORDER BY position LIMIT ?',
+                    (sitemap_url, self.STATUS_DONE, last_position, batch_size)).fetchall()
+            if not rows:
+                return
+            for position, data in rows:
+                yield Article.Article(**json.loads(data))
+            last_position = rows[-1][0]
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        with self._lock:
+            self._connection.close()
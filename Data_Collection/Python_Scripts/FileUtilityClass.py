@@ -1,8 +1,14 @@
-from dataclasses import asdict  # For defining a data model using dataclasses
-from typing import List  # For hinting,help with code clarity, readability
+from typing import List, Optional, Tuple  # For hinting,help with code clarity, readability
+import gzip  # For the gzip compressed JSON Lines files
+import io  # For writing text through the compressed streams
 import os  # For interacting with the operating system
 import json  # For working with JSON data
 
+try:
+    import zstandard  # For the zstd compressed JSON Lines files (optional)
+except ImportError:
+    zstandard = None
+
 import Article
 
 
@@ -11,6 +17,12 @@ class FileUtility:
     This class handles saving the extracted data to JSON files.
     """
 
+    # Define the directory where files will be saved (adjust as needed, or use --output-dir)
+    directory = r"C:\Users\Voldemort\PycharmProjects\AlmayadeenScraping\data_articles"
+
+    # Supported compressions of the JSON Lines files, with their file extension
+    COMPRESSIONS = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+
     @staticmethod
     def save_articles_to_json(articles: List['Article'], year: int, month: int):
         """
@@ -27,7 +39,7 @@ class FileUtility:
         # Loop through each article in the articles list
         for article in articles:
             # Convert the article object to a dictionary
-            article_dict = asdict(article)
+            article_dict = article.to_dict()
             # Add the dictionary to the list
             articles_dict.append(article_dict)
 
@@ -42,19 +54,168 @@ class FileUtility:
             json.dump(articles_dict, file, ensure_ascii=False, indent=4)
 
     @staticmethod
-    def get_file_path(year: int, month: int) -> str:
+    def get_file_path(year: int, month: int, extension: str = 'json') -> str:
         """
         Generates the file path for saving articles based on the year and month.
 
         :param year: The year of the articles.
         :param month: The month of the articles.
+        :param extension: The file extension (e.g. json, jsonl or jsonl.gz).
         :return: The file path as a string.
         """
         # Format the month to two digits (e.g., 08 for August)
         month_str = f"{month:02d}"
         # Generate file name based on year and month
-        file_name = f"articles_{year}_{month_str}.json"
-        # Define the directory where files will be saved (adjust as needed)
-        directory = r"C:\Users\Voldemort\PycharmProjects\AlmayadeenScraping\data_articles"
+        file_name = f"articles_{year}_{month_str}.{extension}"
         # Return the full file path
-        return os.path.join(directory, file_name)
+        return os.path.join(FileUtility.directory, file_name)
+
+    @staticmethod
+    def open_text_stream(raw_file, mode: str, compression: str = 'none'):
+        """
+        Wraps a binary file in a (possibly compressed) UTF-8 text stream. Closing the stream leaves raw_file open.
+
+        :param raw_file: The binary file object.
+        :param mode: 'r' to read or 'w' to write.
+        :param compression: 'none', 'gzip' or 'zstd'.
+        :return: The text stream.
+        """
+        if compression == 'gzip':
+            binary = gzip.GzipFile(fileobj=raw_file, mode=mode + 'b')
+        elif compression == 'zstd':
+            if zstandard is None:
+                raise ImportError("zstd compression requires the 'zstandard' package (pip install zstandard).")
+            if mode == 'w':
+                binary = zstandard.ZstdCompressor().stream_writer(raw_file, closefd=False)
+            else:
+                binary = zstandard.ZstdDecompressor().stream_reader(raw_file, closefd=False)
+        else:
+            binary = _UnclosedFile(raw_file)
+        return io.TextIOWrapper(binary, encoding='utf-8', newline='\n')
+
+
+class _UnclosedFile(io.RawIOBase):
+    """
+    This class passes reads and writes through to a binary file, without closing it when the text stream is closed.
+    """
+
+    def __init__(self, raw_file):
+        self._raw_file = raw_file
+
+    def readable(self) -> bool:
+        return self._raw_file.readable()
+
+    def writable(self) -> bool:
+        return self._raw_file.writable()
+
+    def readinto(self, buffer) -> int:
+        return self._raw_file.readinto(buffer)
+
+    def write(self, data) -> int:
+        return self._raw_file.write(data)
+
+
+class JsonLinesWriter:
+    """
+    This class writes articles to monthly JSON Lines files (articles_YYYY_MM.jsonl, optionally .gz or .zst).
+    Each article is appended as one line as soon as it is scraped, so a month is never held in memory. The lines go
+    to a temporary .part file which is renamed to its final name once the month is complete, so a crash never leaves
+    a half-written month file behind and readers only ever see complete files.
+    """
+
+    def __init__(self, compression: str = 'none'):
+        """
+        Initializes the writer.
+
+        :param compression: The compression of the files, 'none', 'gzip' or 'zstd'.
+        """
+        if compression not in FileUtility.COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError("zstd compression requires the 'zstandard' package (pip install zstandard).")
+        self.compression = compression
+        self.month: Optional[Tuple[int, int]] = None  # The (year, month) of the open file
+        self.count = 0  # The number of articles written to the open file
+        self._raw_file = None
+        self._stream = None
+        self._file_path = None
+
+    def is_open(self, year: int, month: int) -> bool:
+        """
+        Tells whether the file of a month is currently open.
+
+        :param year: The year of the articles.
+        :param month: The month of the articles.
+        :return: True if the month file is open.
+        """
+        return self.month == (year, month)
+
+    def open_month(self, year: int, month: int):
+        """
+        Starts the file of a month, discarding any month that was left open.
+
+        :param year: The year of the articles.
+        :param month: The month of the articles.
+        """
+        self.abort()
+        self._file_path = FileUtility.get_file_path(
+            year, month, 'jsonl' + FileUtility.COMPRESSIONS[self.compression])
+
+        # Ensure directory exists
+        os.makedirs(os.path.dirname(self._file_path), exist_ok=True)
+
+        self._raw_file = open(self._file_path + '.part', 'wb')
+        self._stream = FileUtility.open_text_stream(self._raw_file, 'w', self.compression)
+        self.month = (year, month)
+        self.count = 0
+
+    def write(self, article: 'Article.Article'):
+        """
+        Appends an article to the open month file.
+
+        :param article: The Article object to be written.
+        """
+        self._stream.write(article.to_json())
+        self._stream.write('\n')
+        self.count += 1
+
+    def close_month(self) -> str:
+        """
+        Completes the open month file and atomically moves it to its final name.
+
+        :return: The path of the month file.
+        """
+        file_path = self._file_path
+        self._close_stream()
+        # The data is on disk before the rename, so the final file is always complete
+        os.replace(file_path + '.part', file_path)
+        return file_path
+
+    def abort(self):
+        """
+        Discards the open month file, if any (the previous file of the month is kept).
+        """
+        if self._raw_file is None:
+            return
+        file_path = self._file_path
+        self._close_stream()
+        os.remove(file_path + '.part')
+
+    def _close_stream(self):
+        """
+        Flushes the open file to disk and closes it.
+        """
+        self._stream.close()  # Writes the end of the compressed stream
+        self._raw_file.flush()
+        os.fsync(self._raw_file.fileno())
+        self._raw_file.close()
+        self._raw_file = None
+        self._stream = None
+        self._file_path = None
+        self.month = None
+
+    def close(self):
+        """
+        Closes the writer, discarding a month that was not completed.
+        """
+        self.abort()
@@ -0,0 +1,137 @@
+import gzip  # For compressing the archived pages
+import hashlib  # For the content hash that names every archived page
+import os  # For interacting with the operating system
+import sqlite3  # For the index from article URL to content hash
+import threading  # For sharing the connection between threads safely
+import time  # For timestamping the records
+from typing import Dict, Optional  # For hinting,help with code clarity, readability
+
+
+class HtmlArchive:
+    """
+    This class archives the raw HTML of the downloaded article pages, so the articles can be extracted again after the
+    extraction logic changed, without fetching the site again.
+
+    Every page is stored once, gzip compressed, under the SHA-256 hash of its content (objects/ab/abcdef....html.gz),
+    so identical pages share one file. A SQLite index maps each article URL to the hash of its latest page.
+    """
+
+    def __init__(self, directory: str = 'html_archive'):
+        """
+        Opens (or creates) the archive.
+
+        :param directory: The directory of the archive (the pages and the index database).
+        """
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(os.path.join(directory, 'index.sqlite3'), check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        with self._connection:
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER,
+                    archived_at REAL
+                )''')
+
+        # Per-run statistics
+        self._stats = {'stored': 0, 'deduplicated': 0, 'bytes': 0, 'compressed_bytes': 0}
+
+    @staticmethod
+    def object_path(directory: str, sha256: str) -> str:
+        """
+        Returns the path of an archived page.
+
+        :param directory: The directory of the archive.
+        :param sha256: The content hash of the page.
+        :return: The path of the compressed page.
+        """
+        return os.path.join(directory, 'objects', sha256[:2], sha256 + '.html.gz')
+
+    @staticmethod
+    def read_object(directory: str, sha256: str) -> bytes:
+        """
+        Reads an archived page (a static method so parse processes can read pages without opening the index).
+
+        :param directory: The directory of the archive.
+        :param sha256: The content hash of the page.
+        :return: The raw HTML of the page.
+        """
+        with open(HtmlArchive.object_path(directory, sha256), 'rb') as file:
+            return gzip.decompress(file.read())
+
+    def store(self, url: str, html: bytes) -> str:
+        """
+        Archives the HTML of a page and points the URL to it.
+
+        :param url: The URL of the article.
+        :param html: The raw HTML of the page.
+        :return: The content hash of the page.
+        """
+        sha256 = hashlib.sha256(html).hexdigest()
+        file_path = self.object_path(self.directory, sha256)
+
+        compressed_size = 0
+        if not os.path.exists(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            compressed = gzip.compress(html)
+            compressed_size = len(compressed)
+            # Write to a temporary file first, so a crash never leaves a truncated page under its final name
+            temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as file:
+                file.write(compressed)
+            os.replace(temp_path, file_path)
+
+        with self._lock, self._connection:
+            self._connection.execute('''
+                INSERT INTO pages (url, sha256, size, archived_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET sha256 = excluded.sha256, size = excluded.size,
+                    archived_at = excluded.archived_at''',
+                                     (url, sha256, len(html), time.time()))
+            if compressed_size:
+                self._stats['stored'] += 1
+                self._stats['bytes'] += len(html)
+                self._stats['compressed_bytes'] += compressed_size
+            else:
+                self._stats['deduplicated'] += 1
+        return sha256
+
+    def lookup(self, url: str) -> Optional[str]:
+        """
+        Returns the content hash of the latest archived page of a URL.
+
+        :param url: The URL of the article.
+        :return: The content hash, or None if the URL was never archived.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT sha256 FROM pages WHERE url = ?', (url,)).fetchone()
+        return row[0] if row else None
+
+    def load(self, url: str) -> Optional[bytes]:
+        """
+        Returns the latest archived HTML of a URL.
+
+        :param url: The URL of the article.
+        :return: The raw HTML, or None if the URL was never archived.
+        """
+        sha256 = self.lookup(url)
+        return self.read_object(self.directory, sha256) if sha256 else None
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the archive statistics of this run.
+
+        :return: A dictionary with the number of pages stored and deduplicated, and their raw and compressed bytes.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        """
+        Closes the index database.
+        """
+        with self._lock:
+            self._connection.close()
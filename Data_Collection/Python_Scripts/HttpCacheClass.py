@@ -0,0 +1,127 @@
+import json  # For working with JSON data
+import sqlite3  # For the local database that holds the cache entries
+import threading  # For sharing the connection between threads safely
+import time  # For timestamping the records
+from typing import Dict  # For hinting,help with code clarity, readability
+
+
+class HttpCache:
+    """
+    This class is an on-disk cache for conditional HTTP requests.
+    For every URL it stores the ETag and Last-Modified validators together with the data extracted from the response
+    (the list of URLs of a sitemap, or the fields of an article). When the server answers 304 Not Modified, the stored
+    data is reused and the response does not need to be downloaded or parsed again.
+    """
+
+    def __init__(self, db_path: str = 'http_cache.sqlite3'):
+        """
+        Opens (or creates) the cache database.
+
+        :param db_path: The path of the SQLite database file.
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        with self._connection:
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    data TEXT,
+                    updated_at REAL
+                )''')
+
+        # Per-run statistics, per kind of resource (e.g. sitemap or article)
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """
+        Builds the conditional request headers for a URL from its stored validators.
+
+        :param url: The URL about to be requested.
+        :return: A dictionary with the If-None-Match / If-Modified-Since headers (empty if nothing is cached).
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT etag, last_modified FROM entries WHERE url = ? AND data IS NOT NULL', (url,)).fetchone()
+        headers = {}
+        if row:
+            etag, last_modified = row
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def get_data(self, url: str):
+        """
+        Returns the data stored for a URL.
+
+        :param url: The cached URL.
+        :return: The stored data, or None if the URL is not cached.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT data FROM entries WHERE url = ?', (url,)).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def store(self, url: str, headers, data):
+        """
+        Stores the validators of a response together with the data extracted from it.
+
+        :param url: The requested URL.
+        :param headers: The headers of the response (ETag and Last-Modified are kept).
+        :param data: The JSON-serializable data extracted from the response.
+        """
+        with self._lock, self._connection:
+            self._connection.execute('''
+                INSERT INTO entries (url, etag, last_modified, data, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified,
+                    data = excluded.data, updated_at = excluded.updated_at''',
+                                     (url, headers.get('ETag'), headers.get('Last-Modified'),
+                                      json.dumps(data, ensure_ascii=False), time.time()))
+
+    def update_data(self, url: str, data):
+        """
+        Replaces the data stored for a URL, keeping its validators.
+
+        :param url: The cached URL.
+        :param data: The new JSON-serializable data.
+        """
+        with self._lock, self._connection:
+            self._connection.execute('UPDATE entries SET data = ?, updated_at = ? WHERE url = ?',
+                                     (json.dumps(data, ensure_ascii=False), time.time(), url))
+
+    def record(self, kind: str, outcome: str):
+        """
+        Counts the outcome of a cache lookup.
+
+        :param kind: The kind of resource (e.g. sitemap or article).
+        :param outcome: 'hit' for a 304 response, 'skipped' when no request was needed, 'miss' for a full download.
+        """
+        with self._lock:
+            kind_stats = self._stats.setdefault(kind, {'hit': 0, 'skipped': 0, 'miss': 0})
+            kind_stats[outcome] += 1
+
+    def hit_rates(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summarizes the cache statistics of this run.
+
+        :return: A dictionary per kind of resource with the outcome counts and the hit rate.
+        """
+        with self._lock:
+            summary = {}
+            for kind, kind_stats in self._stats.items():
+                total = sum(kind_stats.values())
+                summary[kind] = dict(kind_stats)
+                summary[kind]['hit_rate'] = (kind_stats['hit'] + kind_stats['skipped']) / total if total else 0.0
+            return summary
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,194 @@
+import threading  # For protecting the latency histogram shared between threads
+import time  # For measuring the latency of each request
+from typing import Dict, Optional, Tuple  # For hinting,help with code clarity, readability
+
+import requests  # For sending requests to the web
+from requests.adapters import HTTPAdapter  # For configuring the connection pool of the session
+from urllib3.util.retry import Retry  # For retrying failed requests with exponential backoff
+
+from ConcurrencyControllerClass import AdaptiveConcurrencyController
+from CrawlMetricsClass import CrawlMetrics, Histogram
+from HttpCacheClass import HttpCache
+
+
+class HttpClient:
+    """
+    This class is the single HTTP layer shared by the SitemapParser and the ArticleScraper.
+    It keeps connections alive in a pool, applies timeouts to every request, retries throttled or failed requests
+    with exponential backoff (honouring the Retry-After header), and records the latency of every request.
+    When an HttpCache is given, conditional requests are sent so unchanged resources are not downloaded again.
+    Latencies, status codes and downloaded bytes are also recorded in the CrawlMetrics shared by the whole crawl.
+    With an AdaptiveConcurrencyController, the number of requests in flight per host follows how the host responds.
+    """
+
+    # Status codes that are worth retrying: throttling and temporary server errors
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, pool_size: int = 10, connect_timeout: float = 5.0, read_timeout: float = 30.0,
+                 max_retries: int = 3, backoff_factor: float = 0.5, cache: Optional[HttpCache] = None,
+                 metrics: Optional[CrawlMetrics] = None,
+                 concurrency_controller: Optional[AdaptiveConcurrencyController] = None):
+        """
+        Initializes the HTTP session and its connection pool.
+
+        :param pool_size: The number of keep-alive connections kept per host (match it to the crawl concurrency).
+        :param connect_timeout: The number of seconds to wait for a connection to be established.
+        :param read_timeout: The number of seconds to wait for the server to send data.
+        :param max_retries: The number of times a failed request is retried.
+        :param backoff_factor: The base delay of the exponential backoff between retries, in seconds.
+        :param cache: The optional HttpCache used for conditional requests.
+        :param metrics: The CrawlMetrics where requests are recorded (a new one is created if not given).
+        :param concurrency_controller: The optional AdaptiveConcurrencyController that limits the requests in flight
+                                       per host.
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.cache = cache
+        self.metrics = metrics if metrics is not None else CrawlMetrics()
+        self.concurrency_controller = concurrency_controller
+
+        # Retry on connection errors and on the retryable status codes, waiting backoff_factor * 2^n between tries
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=self.RETRY_STATUS_CODES,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            respect_retry_after_header=True,
+            raise_on_status=False  # Hand the last response back instead of raising when retries run out
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # The latency of the requests, in seconds, counted in fixed buckets: its memory does not grow with the crawl
+        self._latencies = Histogram()
+        self._status_counts: Dict[int, int] = {}  # The number of responses per status code
+        self._lock = threading.Lock()
+
+    def get(self, url: str, kind: str = 'other', **kwargs) -> requests.Response:
+        """
+        Sends an HTTP GET request through the pooled session.
+
+        :param url: The URL to be requested.
+        :param kind: The kind of resource, used for the metrics (e.g. sitemap or article).
+        :param kwargs: Extra arguments passed on to requests (e.g. headers or stream).
+        :return: The HTTP response.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        controller = self.concurrency_controller
+        if controller is not None:
+            controller.acquire(url)  # Wait for a free slot on the host
+        started_at = time.monotonic()
+        try:
+            response = self.session.get(url, **kwargs)
+        except requests.RequestException as e:
+            # The latency includes the time spent in retries and backoff
+            latency = time.monotonic() - started_at
+            self._record_latency(kind, latency)
+            self.metrics.inc('http_errors_total', kind=kind, error=type(e).__name__)
+            if controller is not None:
+                controller.release(url, latency, error=type(e).__name__)
+            raise
+        latency = time.monotonic() - started_at
+        self._record_latency(kind, latency)
+
+        # The 429/503 responses retried by urllib3 before this one are kept in the retry history
+        retries = getattr(response.raw, 'retries', None)
+        retried_statuses = [attempt.status for attempt in retries.history if attempt.status] if retries else []
+        for retried_status in retried_statuses:
+            self.metrics.inc('http_retries_total', kind=kind, status=retried_status)
+        if controller is not None:
+            controller.release(url, latency, status=response.status_code,
+                               throttled=any(code in (429, 503) for code in retried_statuses))
+
+        with self._lock:
+            self._status_counts[response.status_code] = self._status_counts.get(response.status_code, 0) + 1
+        self.metrics.inc('http_responses_total', kind=kind, status=response.status_code)
+        if not kwargs.get('stream'):
+            # Streamed bodies are counted by the reader, with count_bytes
+            self.count_bytes(kind, len(response.content))
+        return response
+
+    def _record_latency(self, kind: str, latency: float):
+        """
+        Records the latency of a request, including the time spent in retries and backoff.
+
+        :param kind: The kind of resource (e.g. sitemap or article).
+        :param latency: The latency in seconds.
+        """
+        with self._lock:
+            self._latencies.observe(latency)
+        self.metrics.observe('http_request_seconds', latency, kind=kind)
+
+    def count_bytes(self, kind: str, size: int):
+        """
+        Counts downloaded bytes.
+
+        :param kind: The kind of resource (e.g. sitemap or article).
+        :param size: The number of bytes.
+        """
+        self.metrics.inc('bytes_downloaded_total', size, kind=kind)
+
+    def record_cache(self, kind: str, outcome: str):
+        """
+        Counts the outcome of a cache lookup in the cache statistics and in the metrics.
+
+        :param kind: The kind of resource (e.g. sitemap or article).
+        :param outcome: 'hit' for a 304 response, 'skipped' when no request was needed, 'miss' for a full download.
+        """
+        self.cache.record(kind, outcome)
+        self.metrics.inc('http_cache_total', kind=kind, outcome=outcome)
+
+    def conditional_get(self, url: str, kind: str, **kwargs) -> Tuple[requests.Response, bool]:
+        """
+        Sends a conditional HTTP GET request using the validators stored in the cache.
+
+        :param url: The URL to be requested.
+        :param kind: The kind of resource, used for the cache statistics (e.g. sitemap or article).
+        :param kwargs: Extra arguments passed on to requests (e.g. stream).
+        :return: A tuple of the HTTP response and whether the server answered 304 Not Modified.
+        """
+        if self.cache is None:
+            return self.get(url, kind, **kwargs), False
+
+        response = self.get(url, kind, headers=self.cache.conditional_headers(url), **kwargs)
+        if response.status_code == 304:
+            self.record_cache(kind, 'hit')
+            return response, True
+
+        self.record_cache(kind, 'miss')
+        return response, False
+
+    def latency_stats(self) -> Dict[str, float]:
+        """
+        Summarizes the latency of the requests sent so far.
+
+        :return: A dictionary with the request count and the mean, p50, p95, p99 and max latency in seconds (the
+            percentiles are estimated within their histogram bucket).
+        """
+        with self._lock:
+            histogram = self._latencies
+            return {
+                'count': histogram.count,
+                'mean': histogram.sum / histogram.count if histogram.count else 0.0,
+                'p50': histogram.quantile(0.50),
+                'p95': histogram.quantile(0.95),
+                'p99': histogram.quantile(0.99),
+                'max': histogram.max
+            }
+
+    def status_counts(self) -> Dict[int, int]:
+        """
+        Returns the number of responses received per status code.
+
+        :return: A dictionary mapping status codes to counts.
+        """
+        with self._lock:
+            return dict(self._status_counts)
+
+    def close(self):
+        """
+        Closes the pooled connections.
+        """
+        self.session.close()
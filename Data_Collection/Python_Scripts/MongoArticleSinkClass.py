@@ -0,0 +1,242 @@
+import hashlib  # For the hash of the full text, compared by the enrichment jobs
+import logging  # For reporting the bulk writes
+import threading  # For the periodic flush and for sharing the batch between threads
+import time  # For timing the bulk writes
+from datetime import datetime, timezone  # For storing the publication and update times as dates
+from typing import List, Optional  # For hinting,help with code clarity, readability
+
+try:
+    import pymongo  # For writing the articles to MongoDB (optional, only needed by the mongodb sink)
+    from pymongo.errors import PyMongoError
+except ImportError:
+    pymongo = None
+    PyMongoError = Exception
+
+from CrawlMetricsClass import CrawlMetrics
+from NearDuplicateDetectorClass import NearDuplicateDetector
+
+logger = logging.getLogger(__name__)
+
+
+class MongoArticleSink:
+    """
+    This class streams the scraped articles into a MongoDB collection, so they can be queried seconds after they are
+    scraped instead of after a separate import of the month files.
+
+    Articles are buffered and written with unordered bulk upserts keyed on postId (or on the URL when an article has
+    no postId), so scraping an article again updates its document instead of inserting a duplicate. The buffer is
+    written when it holds batch_size articles, every flush_interval seconds, and when the sink is closed. Before each
+    write, the near-duplicates of the batch are detected, so republished stories get their duplicate_of at ingest.
+    """
+
+    def __init__(self, uri: str = "mongodb://localhost:27017/", database: str = "Almayadeen",
+                 collection: str = "articles", batch_size: int = 500, flush_interval: float = 5.0,
+                 near_duplicates: bool = True, metrics: Optional[CrawlMetrics] = None):
+        """
+        Connects to MongoDB and starts the periodic flush.
+
+        :param uri: The MongoDB connection string.
+        :param database: The name of the database.
+        :param collection: The name of the articles collection.
+        :param batch_size: The number of articles written in one bulk write.
+        :param flush_interval: The maximum number of seconds an article waits in the buffer (0 disables the timer).
+        :param near_duplicates: True to detect the near-duplicate articles (see NearDuplicateDetector).
+        :param metrics: The CrawlMetrics where the writes are recorded.
+        """
+        if pymongo is None:
+            raise ImportError("The mongodb sink requires the 'pymongo' package (pip install pymongo).")
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.metrics = metrics if metrics is not None else CrawlMetrics()
+        self._client = pymongo.MongoClient(uri)
+        self._collection = self._client[database][collection]
+        self.namespace = f"{database}.{collection}"
+
+        # Without an index every upsert would scan the whole collection to find its document. The indexes are unique,
+        # as declared in data_storage_analysis/indexes.py, whose ensure_indexes() replaces the plain indexes of older
+        # collections (the sink keeps using them until then)
+        for field in ('postId', 'url'):
+            try:
+                self._collection.create_index(field, unique=True, partialFilterExpression={field: {'$type': 'string'}})
+            except pymongo.errors.OperationFailure as e:
+                if e.code not in (85, 86):  # IndexOptionsConflict, IndexKeySpecsConflict
+                    raise
+        self.detector = NearDuplicateDetector(self._collection) if near_duplicates else None
+
+        self._batch: List[dict] = []  # The documents of the articles waiting to be written
+        self._batch_lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # One bulk write at a time, so the writes of an article stay in order
+        self._stop = threading.Event()
+        self._flush_thread = None
+        if flush_interval > 0:
+            self._flush_thread = threading.Thread(target=self._flush_periodically, name='mongo-flush', daemon=True)
+            self._flush_thread.start()
+
+    @staticmethod
+    def to_document(article) -> dict:
+        """
+        Converts an Article object to the document stored in MongoDB (the same document data_storage.py inserts).
+
+        :param article: The Article object.
+        :return: The document.
+        """
+        document = article.to_dict()
+        # The keywords are scraped as one comma-separated string, they are stored as a list of cleaned keywords
+        if isinstance(document.get('keywords'), str):
+            document['keywords'] = [keyword.strip() for keyword in document['keywords'].split(',')]
+        MongoArticleSink.add_date_fields(document)
+        document['text_hash'] = MongoArticleSink.text_hash(document.get('full_text'))
+        return document
+
+    @staticmethod
+    def text_hash(text: Optional[str]) -> str:
+        """
+        Returns the hash of the full text of an article. The enrichment jobs record the hash of the text they
+        processed, and process an article again when its text_hash differs.
+
+        :param text: The full text.
+        :return: The hexadecimal BLAKE2b hash (16 bytes).
+        """
+        return hashlib.blake2b((text or '').encode('utf-8'), digest_size=16).hexdigest()
+
+    @staticmethod
+    def parse_date(value) -> Optional[datetime]:
+        """
+        Parses a scraped ISO 8601 date and time (e.g. '2023-01-30T23:00:00+02:00') into a UTC datetime, the way
+        MongoDB's $dateFromString reads it (a time without an offset is taken as UTC).
+
+        :param value: The scraped string.
+        :return: The naive UTC datetime, or None if the value is missing or is not a date.
+        """
+        if not isinstance(value, str) or not value:
+            return None
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+
+    @staticmethod
+    def add_date_fields(document: dict) -> dict:
+        """
+        Adds the typed dates of an article document (in place): published_at and updated_at, the BSON dates of its
+        published_time and last_updated strings, and the year, month and day (UTC) of its publication. Date filters
+        are range matches on the indexed published_at instead of a $dateFromString of every document.
+
+        :param document: The article document.
+        :return: The document.
+        """
+        published_at = MongoArticleSink.parse_date(document.get('published_time'))
+        document['published_at'] = published_at
+        document['updated_at'] = MongoArticleSink.parse_date(document.get('last_updated'))
+        document['year'] = published_at.year if published_at else None
+        document['month'] = published_at.month if published_at else None
+        document['day'] = published_at.day if published_at else None
+        return document
+
+    @staticmethod
+    def set_operation(query: dict, fields: dict, upsert: bool = False, text_derived: tuple = ()):
+        """
+        Returns the update setting fields on an article, and modified_at only if one of them changes.
+
+        modified_at (the time of the server) tells the Parquet export which articles changed. The update is a pipeline
+        that compares the stored fields with the new ones, so writing the same values again (a forced reload, a page
+        scraped again, a rebuild) does not make the next export rewrite their months.
+
+        :param query: The filter of the article.
+        :param fields: The fields to set.
+        :param upsert: True to insert the article if it is not stored yet.
+        :param text_derived: The stored fields computed from the text (e.g. the near-duplicate signature), removed when
+            the text_hash of the fields differs from the stored one, so they are computed again.
+        :return: The pymongo UpdateOne.
+        """
+        # $literal, so the values (e.g. a title starting with '$') are never read as expressions
+        values = {field: {'$literal': value} for field, value in fields.items() if field != '_id'}
+        changed = {'$or': [{'$ne': [f'${field}', value]} for field, value in values.items()]}
+        stale = {}
+        if text_derived and 'text_hash' in values:
+            # The expressions of a $set stage all read the stored document, so '$text_hash' is the previous hash
+            stale = {field: {'$cond': [{'$ne': ['$text_hash', values['text_hash']]}, '$$REMOVE', f'${field}']}
+                     for field in text_derived if field not in values}
+        return pymongo.UpdateOne(query, [{'$set': {**values, **stale,
+                                                    'modified_at': {'$cond': [changed, '$$NOW', '$modified_at']}}}],
+                                 upsert=upsert)
+
+    @staticmethod
+    def upsert_operation(document: dict, text_derived: tuple = ()):
+        """
+        Returns the upsert of an article document, keyed on its postId (or on its URL without a postId).
+
+        :param document: The article document.
+        :param text_derived: The stored fields to remove if the text of the article changed (see set_operation).
+        :return: The pymongo UpdateOne.
+        """
+        return MongoArticleSink.set_operation({'postId': document['postId']} if document.get('postId')
+                                              else {'url': document['url']}, document, upsert=True,
+                                              text_derived=text_derived)
+
+    def write(self, article):
+        """
+        Buffers an article, and writes the buffer once it holds batch_size articles.
+
+        :param article: The scraped Article object.
+        """
+        document = self.to_document(article)
+        with self._batch_lock:
+            self._batch.append(document)
+            full = len(self._batch) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered articles with one unordered bulk write.
+
+        :raises IOError: If the bulk write failed, the articles stay in the buffer and are written again by the next
+            flush (the upserts are idempotent).
+        """
+        with self._flush_lock:
+            with self._batch_lock:
+                documents, self._batch = self._batch, []
+            if not documents:
+                return
+
+            started_at = time.perf_counter()
+            try:
+                if self.detector is not None:
+                    self.metrics.inc('near_duplicates_total', self.detector.assign(documents))
+                operations = [self.upsert_operation(document) for document in documents]
+                result = self._collection.bulk_write(operations, ordered=False)
+            except PyMongoError as e:
+                with self._batch_lock:
+                    self._batch = documents + self._batch
+                self.metrics.inc('mongo_write_errors_total')
+                raise IOError(f"Bulk write of {len(documents)} articles to {self.namespace} failed: {e}") from e
+            elapsed = time.perf_counter() - started_at
+
+            self.metrics.observe('stage_seconds', elapsed, stage='mongo_flush')
+            self.metrics.inc('mongo_documents_total', result.upserted_count, outcome='inserted')
+            self.metrics.inc('mongo_documents_total', result.modified_count, outcome='updated')
+            logger.debug("Wrote %d articles to %s in %.1f ms (%d inserted, %d updated).", len(documents),
+                         self.namespace, elapsed * 1000, result.upserted_count, result.modified_count)
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except IOError as e:
+                logger.warning("%s", e)
+
+    def close(self):
+        """
+        Stops the periodic flush, writes the remaining articles and closes the connection.
+        """
+        self._stop.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+        try:
+            self.flush()
+        finally:
+            self._client.close()
@@ -0,0 +1,176 @@
+import hashlib  # For hashing the word shingles and the LSH bands
+import re  # For normalizing and tokenizing the Arabic text
+import struct  # For packing the MinHash signatures
+from typing import Dict, List, Optional, Tuple  # For hinting,help with code clarity, readability
+
+# Arabic diacritics (harakat, tanween, shadda, sukun, superscript alef) and the tatweel, ignored when comparing texts
+ARABIC_MARKS = re.compile('[\u0610-\u061A\u064B-\u065F\u0670\u0640]')
+# Letter variants that are written interchangeably
+ARABIC_VARIANTS = str.maketrans({'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ى': 'ي', 'ة': 'ه'})
+WORD = re.compile(r'\w+')
+
+
+class NearDuplicateDetector:
+    """
+    This class finds near-duplicate articles (republished, lightly edited versions of the same story) with MinHash and
+    LSH buckets.
+
+    Every article gets a MinHash signature of the word shingles of its full_text: the fraction of equal signature
+    values of two articles estimates the Jaccard similarity of their shingles. The signature is computed with one
+    permutation hashing (one hash per shingle, spread over the signature bins, empty bins filled by rotation), so it
+    costs a single pass over the text. Articles whose similarity reaches the threshold are near-duplicates.
+
+    To find them without comparing every pair, the signature is cut into bands, and the hash of each band is an LSH
+    bucket key: similar articles share at least one bucket with a high probability, unrelated ones almost never.
+    The signature (minhash) and the bucket keys (minhash_bands, indexed) are stored on every article in MongoDB, so
+    detection is incremental: each new batch of articles is only compared with the stored articles in its buckets and
+    with the earlier articles of the batch. A near-duplicate gets duplicate_of, the cluster id of the article it
+    duplicates (the postId, or the URL, of the first article of the cluster). Other articles have duplicate_of None.
+    """
+
+    VALUE_BITS = 52  # The bits of a shingle hash kept as its value, the others choose its bin
+
+    def __init__(self, collection, threshold: float = 0.7, bins: int = 64, bands: int = 16, shingle_size: int = 3,
+                 min_words: int = 50):
+        """
+        Initializes the detector.
+
+        :param collection: The pymongo collection of the articles.
+        :param threshold: The minimum estimated Jaccard similarity of the shingles of two near-duplicates.
+        :param bins: The number of values of a signature.
+        :param bands: The number of LSH bands (bins must be a multiple of it); more bands find less similar pairs.
+        :param shingle_size: The number of words of each shingle.
+        :param min_words: Texts with fewer words are too short to be compared reliably and are never duplicates.
+        """
+        if bins % bands:
+            raise ValueError("The number of bins must be a multiple of the number of bands.")
+        self.collection = collection
+        self.threshold = threshold
+        self.bins = bins
+        self.bands = bands
+        self.rows = bins // bands
+        self.shingle_size = shingle_size
+        self.min_words = min_words
+        self._packing = struct.Struct(f'>{bins}Q')
+        # Without an index every batch would scan the collection for its buckets
+        collection.create_index('minhash_bands')
+
+    @staticmethod
+    def normalize(text: str) -> List[str]:
+        """
+        Normalizes an Arabic text and splits it into words.
+
+        :param text: The text.
+        :return: The list of normalized words.
+        """
+        return WORD.findall(ARABIC_MARKS.sub('', text).translate(ARABIC_VARIANTS).lower())
+
+    def signature(self, text: Optional[str]) -> Optional[List[int]]:
+        """
+        Computes the MinHash signature of a text.
+
+        :param text: The full text of an article.
+        :return: The list of bin values, or None if the text is too short.
+        """
+        words = self.normalize(text or '')
+        if len(words) < self.min_words:
+            return None
+
+        empty = 1 << self.VALUE_BITS
+        minimums = [empty] * self.bins
+        for index in range(len(words) - self.shingle_size + 1):
+            shingle = ' '.join(words[index:index + self.shingle_size]).encode('utf-8')
+            shingle_hash = int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), 'big')
+            bin_index = shingle_hash % self.bins
+            value = shingle_hash >> (64 - self.VALUE_BITS)
+            if value < minimums[bin_index]:
+                minimums[bin_index] = value
+
+        # An empty bin takes the value of the next non-empty bin, shifted by the distance, so two texts still agree on
+        # it with a probability equal to their similarity
+        signature = list(minimums)
+        for bin_index in range(self.bins):
+            distance = 0
+            while minimums[(bin_index + distance) % self.bins] == empty:
+                distance += 1
+            if distance:
+                signature[bin_index] = minimums[(bin_index + distance) % self.bins] + (distance << self.VALUE_BITS)
+        return signature
+
+    def band_keys(self, signature: List[int]) -> List[int]:
+        """
+        Returns the LSH bucket keys of a signature, one per band (the band number is part of the key).
+
+        :param signature: The signature.
+        :return: The list of keys, as signed 64-bit integers like MongoDB stores them.
+        """
+        keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(struct.pack(f'>H{self.rows}Q', band, *rows), digest_size=8).digest()
+            keys.append(int.from_bytes(digest, 'big', signed=True))
+        return keys
+
+    def similarity(self, signature: List[int], other_signature: List[int]) -> float:
+        """
+        Estimates the Jaccard similarity of the shingles of two texts from their signatures.
+        """
+        return sum(value == other_value for value, other_value in zip(signature, other_signature)) / self.bins
+
+    @staticmethod
+    def cluster_key(document: dict) -> Optional[str]:
+        """
+        Returns the identifier of an article used as cluster id (its postId, or its URL).
+        """
+        return document.get('postId') or document.get('url')
+
+    def assign(self, documents: List[dict], stored_filter: Optional[dict] = None) -> int:
+        """
+        Sets minhash, minhash_bands and duplicate_of on a batch of article documents (in place), comparing them with
+        the stored articles and with the earlier documents of the batch.
+
+        :param documents: The article documents, in ingest order.
+        :param stored_filter: The filter of the stored articles compared with the batch (all of them by default).
+        :return: The number of near-duplicates in the batch.
+        """
+        signatures = [self.signature(document.get('full_text')) for document in documents]
+        document_keys = [self.band_keys(signature) if signature is not None else [] for signature in signatures]
+        keys = sorted({key for band_keys in document_keys for key in band_keys})
+
+        # The stored articles sharing a bucket with the batch: bucket key -> [(signature, cluster id, article id)]
+        buckets: Dict[int, List[Tuple[List[int], str, str]]] = {}
+        if keys:
+            for stored in self.collection.find({'minhash_bands': {'$in': keys}, **(stored_filter or {})},
+                                               {'minhash': 1, 'minhash_bands': 1, 'duplicate_of': 1, 'postId': 1,
+                                                'url': 1}):
+                entry = (list(self._packing.unpack(stored['minhash'])),
+                         stored.get('duplicate_of') or self.cluster_key(stored), self.cluster_key(stored))
+                for key in stored['minhash_bands']:
+                    buckets.setdefault(key, []).append(entry)
+
+        duplicates = 0
+        for document, signature, band_keys in zip(documents, signatures, document_keys):
+            own_key = self.cluster_key(document)
+            document['duplicate_of'] = None
+            document['minhash'] = self._packing.pack(*signature) if signature is not None else None
+            document['minhash_bands'] = band_keys
+            if signature is None:
+                continue
+
+            best_similarity = self.threshold
+            for key in band_keys:
+                for other_signature, cluster, other_key in buckets.get(key, ()):
+                    # An article scraped again must not become a duplicate of its stored copy, or of its own cluster
+                    if other_key == own_key or cluster == own_key:
+                        continue
+                    similarity = self.similarity(signature, other_signature)
+                    if similarity >= best_similarity:
+                        best_similarity = similarity
+                        document['duplicate_of'] = cluster
+            if document['duplicate_of'] is not None:
+                duplicates += 1
+
+            entry = (signature, document['duplicate_of'] or own_key, own_key)
+            for key in band_keys:
+                buckets.setdefault(key, []).append(entry)
+        return duplicates
@@ -1,24 +1,31 @@
-import requests  # For sending requests to the web
-from bs4 import BeautifulSoup  # For parsing and manipulating HTML and XML documents
-from typing import List  # For hinting,help with code clarity, readability
+import logging  # For reporting the sitemaps that could not be read
+import time  # For timing the sitemap downloads
+from lxml import etree  # For parsing the XML sitemaps incrementally
+from typing import Iterator, List, Optional, Tuple  # For hinting,help with code clarity, readability
 from requests import RequestException
 
+from HttpClientClass import HttpClient
+
+logger = logging.getLogger(__name__)
+
 
 class SitemapParser:
     """
     This class handles the parsing of the sitemap index and the extraction of article URLs.
     """
 
-    def __init__(self, sitemap_index_url: str):  # Serves as a constructor for the class, also here we use the hinting
+    def __init__(self, sitemap_index_url: str, http_client: Optional[HttpClient] = None):  # Serves as a constructor for the class, also here we use the hinting
         """
         Initializes an instance of the SitemapParser class with the URL of the main sitemap index.
 
         :param sitemap_index_url: The URL of the sitemap index that contains links to monthly sitemaps.
+        :param http_client: The shared HttpClient used to send requests (a new one is created if not given).
 
         This URL is stored as an instance variable (self.sitemap_index_url) so that it can be used later in other
         methods.
         """
         self.sitemap_index_url = sitemap_index_url  # Store the sitemap index URL for later use
+        self.http_client = http_client if http_client is not None else HttpClient()
 
     def fetch_sitemap_index(self) -> List[str]:  # -> List[str]: To indicate that the function returns a list of strings
         """
@@ -26,49 +33,175 @@ class SitemapParser:
 
         :return: A list of URLs pointing to the monthly sitemaps.
         """
-        try:
-            response = requests.get(self.sitemap_index_url)  # Send an HTTP GET request to the sitemap index URL
-            if response.status_code == 200:
-                # If the request is successful, parse the XML content
-                soup = BeautifulSoup(response.content, 'lxml')  # Parse the XML response content, using lxml parser
-                urls_loc_tags = soup.find_all('loc')  # Find all <loc> tags in the XML content
-                sitemap_urls = []  # Initialize an empty list to store the sitemap URLs
-                for loc in urls_loc_tags:  # Loop through the <loc> tags to extract the URLs and add them to the list
-                    sitemap_urls.append(loc.text.strip())
-                return sitemap_urls  # Return the list of sitemap URLs
-            else:
-                # If the request fails, print an error message and return an empty list
-                print(f"Failed to retrieve sitemap index. Status code: {response.status_code}")
-                return []
-        except RequestException as e:
-            print(f"Failed to retrieve sitemap. Error: {e}")
-            return []
+        return [sitemap_url for sitemap_url, _ in self.iter_sitemap_index()]
 
-    @staticmethod
-    def fetch_article_urls(monthly_sitemap_url: str) -> List[str]:
+    def fetch_sitemap_index_entries(self) -> List[Tuple[str, Optional[str]]]:
+        """
+        Fetches the sitemap index and retrieves the URLs of the monthly sitemaps with their <lastmod> values.
+
+        :return: A list of (sitemap URL, lastmod) tuples, lastmod is None when the index does not provide it.
+        """
+        return list(self.iter_sitemap_index())
+
+    def fetch_article_urls(self, monthly_sitemap_url: str, lastmod: Optional[str] = None) -> List[str]:
         """
         Fetches a monthly sitemap and extracts the URLs of articles.
 
         :param monthly_sitemap_url: The URL of the monthly sitemap to be parsed.
+        :param lastmod: The <lastmod> value of the sitemap in the sitemap index, if known.
         :return: A list of article URLs extracted from the sitemap.
         """
+        return list(self.iter_article_urls(monthly_sitemap_url, lastmod))
+
+    def iter_sitemap_index(self) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Streams the sitemap index and yields the URLs of the monthly sitemaps with their <lastmod> values.
+
+        :return: An iterator of (sitemap URL, lastmod) tuples, lastmod is None when the index does not provide it.
+        """
+        cache = self.http_client.cache
+        sitemap_entries = []  # The entries seen so far, kept for the cache
+        stream_info = {}  # Filled by the stream: whether the entries came from the cache, and the response headers
+        for sitemap_url, lastmod in self._stream_entries(self.sitemap_index_url, 'entries', stream_info):
+            if cache is not None:
+                sitemap_entries.append((sitemap_url, lastmod))
+            yield sitemap_url, lastmod
+
+        if cache is not None and sitemap_entries and not stream_info['from_cache']:
+            cache.store(self.sitemap_index_url, stream_info['headers'], {'entries': sitemap_entries})
+
+    def iter_article_urls(self, monthly_sitemap_url: str, lastmod: Optional[str] = None) -> Iterator[str]:
+        """
+        Streams a monthly sitemap and yields the URLs of its articles as the bytes arrive, so scraping can start
+        before a large sitemap has finished downloading.
+
+        When the sitemap index reports the same <lastmod> as the cached copy, the sitemap is not requested at all.
+
+        :param monthly_sitemap_url: The URL of the monthly sitemap to be parsed.
+        :param lastmod: The <lastmod> value of the sitemap in the sitemap index, if known.
+        :return: An iterator of article URLs.
+        """
+        cache = self.http_client.cache
+        if cache is not None and lastmod is not None:
+            cached = cache.get_data(monthly_sitemap_url)
+            if cached is not None and cached.get('lastmod') == lastmod:
+                # The sitemap did not change since it was cached, no request is needed
+                self.http_client.record_cache('sitemap', 'skipped')
+                self.http_client.metrics.inc('sitemaps_total', outcome='skipped')
+                yield from cached['urls']
+                return
+
+        article_urls = []  # The URLs seen so far, kept for the cache
+        stream_info = {}  # Filled by the stream: whether the URLs came from the cache, and the response headers
+        for article_url, _ in self._stream_entries(monthly_sitemap_url, 'urls', stream_info):
+            if cache is not None:
+                article_urls.append(article_url)
+            yield article_url
+
+        if cache is None or not article_urls:
+            return
+        if stream_info['from_cache']:
+            # The sitemap did not change, remember its new lastmod so the next run can skip the request
+            if lastmod is not None and cache.get_data(monthly_sitemap_url).get('lastmod') != lastmod:
+                cache.update_data(monthly_sitemap_url, {'lastmod': lastmod, 'urls': article_urls})
+        else:
+            # The whole sitemap was read, cache its URLs for the next conditional request
+            cache.store(monthly_sitemap_url, stream_info['headers'], {'lastmod': lastmod, 'urls': article_urls})
+
+    def _stream_entries(self, sitemap_url: str, cache_key: str,
+                        stream_info: dict) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Downloads a sitemap (or sitemap index) in chunks and parses it incrementally.
+
+        Every <url> or <sitemap> element is yielded as soon as it is complete and then removed from the tree, so the
+        memory used stays flat however large the sitemap is. On a 304 Not Modified response the cached entries are
+        yielded instead.
+
+        :param sitemap_url: The URL of the sitemap.
+        :param cache_key: The key of the cached data that holds the entries ('entries' or 'urls').
+        :param stream_info: A dictionary that receives 'from_cache' and the response 'headers'.
+        :return: An iterator of (loc, lastmod) tuples.
+        """
+        stream_info['from_cache'] = False
+        stream_info['headers'] = {}
+        metrics = self.http_client.metrics
+        # Only the time spent downloading and parsing is measured, not the time the caller spends between entries
+        busy = 0.0
+        started_at = time.perf_counter()
         try:
-            response = requests.get(monthly_sitemap_url)  # Send an HTTP GET request to the monthly sitemap URL
-            if response.status_code == 200:
-                # If the request is successful, parse the XML content
-                soup = BeautifulSoup(response.content, 'lxml')  # Parse the XML response content
-                monthly_url_loc_tags = soup.find_all('loc')  # Find all <loc> tags in the XML content
-                article_urls = []  # Initialize an empty list to store the article URLs
-                for loc in monthly_url_loc_tags:  # Loop through the <loc> tags to extract the URLs and add them to list
-                    article_urls.append(loc.text.strip())
-                return article_urls  # Return the list of article URLs
-            else:
-                # If the request fails, print an error message and return an empty list
-                print(f"Failed to retrieve sitemap. Status code: {response.status_code}")
-                return []
+            # Send a conditional HTTP GET request and read the body as it arrives
+            response, not_modified = self.http_client.conditional_get(sitemap_url, 'sitemap', stream=True)
+            with response:
+                if not_modified:
+                    # The sitemap did not change since the last run, reuse the entries parsed back then
+                    stream_info['from_cache'] = True
+                    metrics.inc('sitemaps_total', outcome='not_modified')
+                    metrics.observe('stage_seconds', time.perf_counter() - started_at, stage='sitemap_fetch')
+                    for entry in self.http_client.cache.get_data(sitemap_url)[cache_key]:
+                        yield (entry, None) if isinstance(entry, str) else tuple(entry)
+                    return
+                if response.status_code != 200:
+                    # If the request fails, log an error message and stop
+                    metrics.inc('sitemaps_total', outcome='failed')
+                    logger.error("Failed to retrieve sitemap %s. Status code: %s", sitemap_url, response.status_code)
+                    return
+
+                stream_info['headers'] = response.headers
+                # recover=True keeps going over small XML errors, like the lenient parser used before
+                parser = etree.XMLPullParser(events=('end',), recover=True)
+                chunks = response.iter_content(chunk_size=64 * 1024)
+                while True:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    self.http_client.count_bytes('sitemap', len(chunk))
+                    parser.feed(chunk)
+                    entries = list(self._read_entries(parser))  # At most one chunk worth of entries
+                    busy += time.perf_counter() - started_at
+                    yield from entries
+                    started_at = time.perf_counter()
+                parser.close()
+                entries = list(self._read_entries(parser))
+                busy += time.perf_counter() - started_at
+                metrics.inc('sitemaps_total', outcome='downloaded')
+                metrics.observe('stage_seconds', busy, stage='sitemap_fetch')
+                yield from entries
         except RequestException as e:
-            print(f"Failed to retrieve sitemap. Error: {e}")
-            return []
+            metrics.inc('sitemaps_total', outcome='failed')
+            logger.error("Failed to retrieve sitemap %s. Error: %s", sitemap_url, e)
+        except etree.XMLSyntaxError as e:
+            metrics.inc('sitemaps_total', outcome='failed')
+            logger.error("Failed to parse sitemap %s. Error: %s", sitemap_url, e)
+
+    @staticmethod
+    def _read_entries(parser) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Yields the <url>/<sitemap> entries completed so far by the pull parser and frees their elements.
+
+        :param parser: The lxml XMLPullParser fed with the sitemap bytes.
+        :return: An iterator of (loc, lastmod) tuples.
+        """
+        for _, element in parser.read_events():
+            if not isinstance(element.tag, str) or etree.QName(element).localname not in ('url', 'sitemap'):
+                continue  # Only complete entries are handled, their <loc>/<lastmod> children are read below
+
+            loc = lastmod = None
+            for child in element:
+                if not isinstance(child.tag, str):
+                    continue  # Skip comments
+                child_name = etree.QName(child).localname
+                if child_name == 'loc':
+                    loc = (child.text or '').strip()
+                elif child_name == 'lastmod':
+                    lastmod = (child.text or '').strip() or None
+
+            # Free the entry and the entries before it, they are not needed anymore
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+            if loc:
+                yield loc, lastmod
 
     @staticmethod
     def extract_year_month_from_url(url: str) -> (int, int):
@@ -0,0 +1,360 @@
+import argparse  # For reading the benchmark settings from the command line
+import hashlib  # For the deterministic content and errors of the synthetic site
+import json  # For the metadata of the synthetic articles and the results file
+import multiprocessing  # For running every crawl in a fresh process
+import os  # For interacting with the operating system
+import queue  # For waiting for the summary of a crawl that may die
+import random  # For the latency jitter and the injected errors
+import sys  # For silencing the output of the crawls
+import tempfile  # For the state, cache and output files of every crawl
+import threading  # For serving the site next to the crawls
+import time  # For the injected latency
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # For the local replay server
+from typing import List, Optional  # For hinting,help with code clarity, readability
+
+import web_scraper_main
+
+try:
+    import resource  # For the peak memory of every crawl (Unix only)
+except ImportError:
+    resource = None
+
+
+class ReplaySite:
+    """
+    This class describes the site served by the replay server: a sitemap index, one sitemap per month, and article
+    pages with the same markup as the real site (the tawsiyat-metadata script, the postid meta and the p-content div).
+    Pages are synthetic by default, or replayed from pages saved by compare_extraction_engines.py.
+    """
+
+    def __init__(self, months: int = 6, articles_per_month: int = 200, paragraphs: int = 12,
+                 recorded_pages: Optional[List[bytes]] = None):
+        """
+        Initializes the site.
+
+        :param months: The number of monthly sitemaps, counting back from 2024-12.
+        :param articles_per_month: The number of articles in each monthly sitemap.
+        :param paragraphs: The number of paragraphs of every synthetic article.
+        :param recorded_pages: Saved article pages served instead of the synthetic ones, in turn.
+        """
+        self.months = [(2024 - index // 12, 12 - index % 12) for index in range(months)]
+        self.articles_per_month = articles_per_month
+        self.paragraphs = paragraphs
+        self.recorded_pages = recorded_pages or []
+
+    def sitemap_index(self, base_url: str) -> bytes:
+        """
+        Builds the sitemap index that lists the monthly sitemaps.
+        """
+        entries = ''.join(f"<sitemap><loc>{base_url}/sitemaps/sitemap-{year}-{month:02d}.xml</loc>"
+                          f"<lastmod>{year}-{month:02d}-28T00:00:00+03:00</lastmod></sitemap>"
+                          for year, month in self.months)
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                f'{entries}</sitemapindex>').encode('utf-8')
+
+    def sitemap(self, base_url: str, year: int, month: int) -> Optional[bytes]:
+        """
+        Builds the sitemap of a month.
+        """
+        if (year, month) not in self.months:
+            return None
+        entries = ''.join(f"<url><loc>{base_url}/news/{year}-{month:02d}-{number}</loc></url>"
+                          for number in range(self.articles_per_month))
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                f'{entries}</urlset>').encode('utf-8')
+
+    def article(self, article_id: str) -> bytes:
+        """
+        Builds (or replays) the page of an article.
+        """
+        if self.recorded_pages:
+            digest = int(hashlib.sha1(article_id.encode('utf-8')).hexdigest(), 16)
+            return self.recorded_pages[digest % len(self.recorded_pages)]
+
+        year, month, _ = article_id.split('-')
+        metadata = {
+            'title': f"عنوان المقال {article_id}",
+            'keywords': "سياسة, اقتصاد, لبنان",
+            'thumbnail': f"https://example.invalid/images/{article_id}.jpg",
+            'video_duration': None,
+            'word_count': self.paragraphs * 40,
+            'lang': 'ar',
+            'published_time': f"{year}-{month}-15T12:00:00+03:00",
+            'last_updated': f"{year}-{month}-15T13:00:00+03:00",
+            'description': f"وصف المقال {article_id}",
+            'author': "الميادين نت",
+            'classes': [{'key': 'category', 'value': 'سياسة'}]
+        }
+        paragraphs = ''.join(f"<p>الفقرة {number} من المقال {article_id} " + "نص تجريبي " * 30 + "</p>"
+                             for number in range(self.paragraphs))
+        return ('<!DOCTYPE html><html lang="ar"><head><meta charset="utf-8">'
+                f'<meta name="postid" content="{article_id}">'
+                '<script id="tawsiyat-metadata" type="text/tawsiyat">'
+                f'{json.dumps(metadata, ensure_ascii=False)}</script>'
+                '<script>var analytics = {};</script></head><body><header><nav><ul>'
+                + '<li><a href="#">قسم</a></li>' * 40 +
+                '</ul></nav></header><main><h1>' + metadata['title'] + '</h1>'
+                f'<p class="lg_para summary">{metadata["description"]}</p>'
+                f'<div class="p-content">{paragraphs}</div></main>'
+                '<footer>' + '<div class="related"><a href="#">مقال ذو صلة</a></div>' * 20 +
+                '</footer></body></html>').encode('utf-8')
+
+
+class ReplayRequestHandler(BaseHTTPRequestHandler):
+    """
+    This class answers the requests of the crawler, with the latency and the errors configured on the server.
+    """
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive connections, like the real site
+    disable_nagle_algorithm = True  # The headers and the body are separate writes, they must not wait for an ACK
+
+    def do_GET(self):
+        server = self.server
+        counted = self.path.startswith('/news/') and server.max_concurrent
+        if counted:
+            with server.active_lock:
+                throttled = server.active >= server.max_concurrent
+                if not throttled:
+                    server.active += 1
+            if throttled:
+                # Like a site protecting itself, article requests above its capacity are throttled
+                self._send(429, b'Too Many Requests', 'text/plain', {'Retry-After': '0'})
+                return
+        try:
+            # Injected latency, uniformly spread around the configured mean
+            delay = server.latency + random.uniform(-server.jitter, server.jitter)
+            if delay > 0:
+                time.sleep(delay)
+            self._answer(f"http://{self.headers.get('Host')}")
+        finally:
+            if counted:
+                with server.active_lock:
+                    server.active -= 1
+
+    def _answer(self, base_url: str):
+        """
+        Sends the sitemap index, a monthly sitemap or an article page.
+
+        :param base_url: The scheme and host the crawler used, for the URLs in the sitemaps.
+        """
+        server = self.server
+        body = None
+        if self.path == '/sitemaps/all.xml':
+            body = server.site.sitemap_index(base_url)
+        elif self.path.startswith('/sitemaps/sitemap-'):
+            try:
+                year, month = self.path[len('/sitemaps/sitemap-'):-len('.xml')].split('-')
+                body = server.site.sitemap(base_url, int(year), int(month))
+            except ValueError:
+                body = None
+        elif self.path.startswith('/news/'):
+            article_id = self.path[len('/news/'):]
+            # Missing articles are always the same ones, so a re-run sees the same site
+            digest = int(hashlib.sha1(article_id.encode('utf-8')).hexdigest(), 16)
+            if (digest % 10000) / 10000 >= server.not_found_rate:
+                # Temporary errors are random, so the retries of the crawler can succeed
+                if random.random() < server.error_rate:
+                    self._send(503, b'Service Unavailable', 'text/plain', {'Retry-After': '0'})
+                    return
+                body = server.site.article(article_id)
+
+        if body is None:
+            self._send(404, b'Not Found', 'text/plain')
+        elif self.path.endswith('.xml'):
+            self._send(200, body, 'application/xml')
+        else:
+            self._send(200, body, 'text/html; charset=utf-8')
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[dict] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep the benchmark output readable
+
+
+def start_replay_server(site: ReplaySite, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                        not_found_rate: float = 0.0, max_concurrent: int = 0, port: int = 0) -> ThreadingHTTPServer:
+    """
+    Starts the replay server on a background thread.
+
+    :param site: The site to serve.
+    :param latency: The mean delay added to every response, in seconds.
+    :param jitter: The maximum deviation from the mean delay, in seconds.
+    :param error_rate: The fraction of article requests answered with 503 Service Unavailable.
+    :param not_found_rate: The fraction of articles answered with 404 Not Found.
+    :param max_concurrent: The number of article requests served at once, the others get 429 (0 means unlimited).
+    :param port: The port of the server (a free port by default).
+    :return: The running server, its address is in server_address.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), ReplayRequestHandler)
+    server.daemon_threads = True
+    server.site = site
+    server.latency = latency
+    server.jitter = min(jitter, latency)
+    server.error_rate = error_rate
+    server.not_found_rate = not_found_rate
+    server.max_concurrent = max_concurrent
+    server.active = 0
+    server.active_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, name='replay-server', daemon=True).start()
+    return server
+
+
+def run_crawl(argv: List[str], verbose: bool, results: 'multiprocessing.Queue'):
+    """
+    Runs one crawl with web_scraper_main and reports its summary and peak memory (runs in a fresh process).
+
+    :param argv: The command line arguments of the crawl.
+    :param verbose: Whether the output of the crawl is shown.
+    :param results: The queue where the summary, or the error of the crawl, is put.
+    """
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+    try:
+        summary = web_scraper_main.main(argv) or {}
+    except (Exception, SystemExit) as e:
+        # The benchmark records the crawl as failed instead of waiting for a summary that never comes
+        results.put({'error': f'{type(e).__name__}: {e}'})
+        return
+    # ru_maxrss is in kilobytes on Linux, the parse processes of the pipeline mode are counted as children; the peak
+    # memory is not measured where the resource module is missing (Windows)
+    summary['peak_rss_mb'] = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                                 resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024 if resource else None
+    results.put(summary)
+
+
+def wait_for_summary(process: 'multiprocessing.Process', results: 'multiprocessing.Queue') -> Optional[dict]:
+    """
+    Waits for the summary of a crawl process, as long as the process is alive.
+
+    :param process: The crawl process.
+    :param results: The queue where the process puts its summary.
+    :return: The summary, or None if the process died without putting one (killed, crashed interpreter).
+    """
+    while True:
+        try:
+            return results.get(timeout=1.0)
+        except queue.Empty:
+            if not process.is_alive():
+                break
+    # The process may have put its summary just before exiting
+    try:
+        return results.get(timeout=1.0)
+    except queue.Empty:
+        return None
+
+
+def benchmark(args):
+    """
+    Crawls the replay site once per mode and concurrency level and prints the results.
+
+    :param args: The parsed command line arguments.
+    """
+    recorded_pages = []
+    if args.recorded_dir:
+        # Pages saved by compare_extraction_engines.py: the article URL on the first line, then the HTML
+        for file_name in sorted(os.listdir(args.recorded_dir)):
+            if file_name.endswith('.html'):
+                with open(os.path.join(args.recorded_dir, file_name), 'rb') as file:
+                    recorded_pages.append(file.read().partition(b'\n')[2])
+
+    site = ReplaySite(months=args.months, articles_per_month=args.articles_per_month, paragraphs=args.paragraphs,
+                      recorded_pages=recorded_pages)
+    server = start_replay_server(site, latency=args.latency / 1000, jitter=args.jitter / 1000,
+                                 error_rate=args.error_rate, not_found_rate=args.not_found_rate,
+                                 max_concurrent=args.max_concurrent)
+    sitemap_index_url = f"http://127.0.0.1:{server.server_address[1]}/sitemaps/all.xml"
+    print(f"Replay server on {sitemap_index_url}: {args.months} months x {args.articles_per_month} articles, "
+          f"latency {args.latency:.0f}±{args.jitter:.0f} ms, {args.error_rate:.1%} errors, "
+          f"{args.not_found_rate:.1%} not found, "
+          f"{'at most ' + str(args.max_concurrent) if args.max_concurrent else 'unlimited'} concurrent articles.")
+
+    context = multiprocessing.get_context('spawn')
+    rows = []
+    for mode in args.modes:
+        for workers in args.concurrency:
+            with tempfile.TemporaryDirectory() as work_directory:
+                argv = ['--sitemap-index', sitemap_index_url, '--mode', mode, '--workers', str(workers),
+                        '--article-limit', str(args.article_limit), '--no-cache', '--stats-interval', '0',
+                        '--state-db', os.path.join(work_directory, 'state.sqlite3'),
+                        '--output-dir', os.path.join(work_directory, 'articles'),
+                        '--output-format', 'jsonl'] + ([] if args.verbose else ['--log-level', 'WARNING'])
+                argv += args.crawler_args
+                results = context.Queue()
+                process = context.Process(target=run_crawl, args=(argv, args.verbose, results))
+                process.start()
+                summary = wait_for_summary(process, results)
+                process.join()
+
+            if summary is None or summary.get('error'):
+                error = summary['error'] if summary else f'the crawl process exited with code {process.exitcode}'
+                rows.append({'mode': mode, 'workers': workers, 'error': error})
+                print(f"{mode:>8} | {workers:>3} workers | FAILED: {error}")
+                continue
+
+            latency = summary.get('latency', {})
+            row = {
+                'mode': mode,
+                'workers': workers,
+                'articles': summary.get('articles', 0),
+                'seconds': summary.get('elapsed', 0.0),
+                'articles_per_second': (summary.get('articles', 0) / summary['elapsed']
+                                        if summary.get('elapsed') else 0.0),
+                'p50_ms': latency.get('p50', 0.0) * 1000,
+                'p99_ms': latency.get('p99', 0.0) * 1000,
+                'peak_rss_mb': summary.get('peak_rss_mb'),
+                'status_counts': {str(code): count for code, count in summary.get('status_counts', {}).items()}
+            }
+            rows.append(row)
+            peak_rss = 'n/a' if row['peak_rss_mb'] is None else f"{row['peak_rss_mb']:.1f} MB"
+            print(f"{mode:>8} | {workers:>3} workers | {row['articles']:>6} articles in {row['seconds']:7.2f}s | "
+                  f"{row['articles_per_second']:8.1f} articles/s | p50 {row['p50_ms']:7.1f} ms | "
+                  f"p99 {row['p99_ms']:7.1f} ms | peak RSS {peak_rss:>9} | {row['status_counts']}")
+
+    server.shutdown()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(rows, file, indent=4)
+        print(f"Results saved to {args.output}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the crawler against a local replay server, without touching almayadeen.net.")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16],
+                        help="Numbers of download workers to benchmark.")
+    parser.add_argument('--modes', nargs='+', choices=('threads', 'pipeline'), default=['threads'],
+                        help="Crawl modes to benchmark.")
+    parser.add_argument('--months', type=int, default=4, help="Number of monthly sitemaps served.")
+    parser.add_argument('--articles-per-month', type=int, default=250, help="Number of articles per sitemap.")
+    parser.add_argument('--paragraphs', type=int, default=12, help="Number of paragraphs per synthetic article.")
+    parser.add_argument('--recorded-dir', default=None,
+                        help="Directory of pages saved by compare_extraction_engines.py, served instead of "
+                             "the synthetic pages.")
+    parser.add_argument('--latency', type=float, default=20.0, help="Mean latency of every response, in ms.")
+    parser.add_argument('--jitter', type=float, default=10.0, help="Maximum deviation from the mean latency, in ms.")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="Fraction of article requests answered with 503 (retried by the crawler).")
+    parser.add_argument('--not-found-rate', type=float, default=0.0,
+                        help="Fraction of articles answered with 404.")
+    parser.add_argument('--max-concurrent', type=int, default=0,
+                        help="Number of article requests the server handles at once, the others get 429 "
+                             "(0 means unlimited).")
+    parser.add_argument('--article-limit', type=int, default=0,
+                        help="Overall article limit of every crawl (0 crawls the whole site).")
+    parser.add_argument('--output', default=None, help="JSON file where the results are saved.")
+    parser.add_argument('--verbose', action='store_true', help="Show the output of the crawls.")
+    parser.add_argument('crawler_args', nargs=argparse.REMAINDER,
+                        help="Extra arguments passed to web_scraper_main after '--' (e.g. -- --engine bs4).")
+    args = parser.parse_args()
+    if args.crawler_args[:1] == ['--']:
+        args.crawler_args = args.crawler_args[1:]
+    benchmark(args)
@@ -0,0 +1,100 @@
+import argparse  # For reading the benchmark settings from the command line
+import dataclasses  # For the plain (unslotted) Article type of the previous versions
+import gc  # For measuring the memory of the articles without collector noise
+import json  # For the previous JSON encoding path
+import time  # For measuring the serialization throughput
+import tracemalloc  # For measuring the memory per article
+
+import Article
+from CrawlPipelineClass import parse_page
+from benchmark_crawler import ReplaySite
+
+try:
+    import bson  # For the BSON encodings (comes with pymongo)
+except ImportError:
+    bson = None
+
+# The Article type of the previous versions: the same fields, without slots
+PlainArticle = dataclasses.make_dataclass(
+    'PlainArticle',
+    [(article_field.name, article_field.type,
+      dataclasses.field(default=article_field.default, default_factory=article_field.default_factory))
+     for article_field in dataclasses.fields(Article.Article)])
+
+
+def build_articles(count: int, paragraphs: int):
+    """
+    Extracts articles from the synthetic pages of the replay site, so they hold realistic text.
+
+    :param count: The number of articles.
+    :param paragraphs: The number of paragraphs of every page.
+    :return: The list of Article objects.
+    """
+    site = ReplaySite(months=1, articles_per_month=count, paragraphs=paragraphs)
+    return [parse_page('lxml', f"https://example.invalid/news/2024-12-{number}",
+                       site.article(f"2024-12-{number}")) for number in range(count)]
+
+
+def memory_per_article(articles, article_type) -> float:
+    """
+    Measures the memory of the article objects themselves (their field values are shared, not copied).
+
+    :return: The number of bytes per article.
+    """
+    values = [[getattr(article, name) for name in Article.FIELD_NAMES] for article in articles]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    copies = [article_type(*article_values) for article_values in values]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(copies)
+
+
+def throughput(encode, articles, repeat: int):
+    """
+    Measures the throughput of an encoding.
+
+    :return: The number of articles per second and the average encoded size.
+    """
+    size = sum(len(encode(article)) for article in articles) / len(articles)
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        for article in articles:
+            encode(article)
+    elapsed = time.perf_counter() - started_at
+    return len(articles) * repeat / elapsed, size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the memory per article and the serialization throughput of the slotted Article with "
+                    "the dataclasses.asdict path.")
+    parser.add_argument('--articles', type=int, default=2000, help="Number of articles.")
+    parser.add_argument('--paragraphs', type=int, default=12, help="Number of paragraphs of every article.")
+    parser.add_argument('--repeat', type=int, default=5, help="Number of times every article is encoded.")
+    args = parser.parse_args()
+
+    articles = build_articles(args.articles, args.paragraphs)
+
+    print(f"Memory per article object ({args.articles} articles, field values shared):")
+    for name, article_type in (('plain dataclass', PlainArticle), ('slotted Article', Article.Article)):
+        print(f"  {name:<16} {memory_per_article(articles, article_type):8.1f} bytes")
+
+    encodings = [
+        ('JSON asdict + json.dumps', lambda article: json.dumps(dataclasses.asdict(article), ensure_ascii=False)),
+        ('JSON to_dict + json.dumps', lambda article: json.dumps(article.to_dict(), ensure_ascii=False)),
+        ('JSON to_json' + (' (orjson)' if Article.orjson is not None else ''), Article.Article.to_json),
+    ]
+    if bson is not None:
+        encodings += [
+            ('BSON asdict + bson.encode', lambda article: bson.encode(dataclasses.asdict(article))),
+            ('BSON to_bson', Article.Article.to_bson),
+        ]
+    else:
+        print("BSON encodings skipped, install pymongo to measure them.")
+
+    print(f"Serialization throughput ({args.repeat} x {args.articles} articles):")
+    for name, encode in encodings:
+        articles_per_second, size = throughput(encode, articles, args.repeat)
+        print(f"  {name:<28} {articles_per_second:10.0f} articles/s | {size:8.0f} bytes/article")
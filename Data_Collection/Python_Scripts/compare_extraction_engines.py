@@ -0,0 +1,92 @@
+import argparse  # For reading the settings from the command line
+import hashlib  # For naming the saved pages
+import os  # For interacting with the operating system
+import sys  # For the exit code
+import time  # For timing both engines
+from dataclasses import fields  # For comparing the Articles field by field
+
+from ArticleScraperClass import ArticleScraper
+from HttpClientClass import HttpClient
+from SiteParserClass import SitemapParser
+
+# The article pages saved in the repository (see tests/test_extraction_engines.py)
+SAVED_PAGES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'tests', 'article_pages')
+
+
+def save_pages(sitemap_url: str, count: int, pages_directory: str):
+    """
+    Downloads the first article pages of a monthly sitemap so they can be compared offline.
+
+    :param sitemap_url: The URL of the monthly sitemap.
+    :param count: The number of article pages to save.
+    :param pages_directory: The directory where the pages are saved.
+    """
+    http_client = HttpClient()
+    os.makedirs(pages_directory, exist_ok=True)
+    article_urls = SitemapParser(sitemap_url, http_client=http_client).fetch_article_urls(sitemap_url)[:count]
+    for article_url in article_urls:
+        response = http_client.get(article_url)
+        if response.status_code != 200:
+            print(f"Skipping {article_url}, status code: {response.status_code}")
+            continue
+        # The file name is derived from the URL, the URL itself is kept on the first line
+        file_name = hashlib.sha1(article_url.encode('utf-8')).hexdigest() + '.html'
+        with open(os.path.join(pages_directory, file_name), 'wb') as file:
+            file.write(article_url.encode('utf-8') + b'\n' + response.content)
+    http_client.close()
+    print(f"Saved {len(article_urls)} pages to {pages_directory}.")
+
+
+def compare_engines(pages_directory: str) -> int:
+    """
+    Parses every saved page with both extraction engines and reports the pages where the Articles differ.
+
+    :param pages_directory: The directory of saved pages (first line: the article URL, then the HTML).
+    :return: The number of pages where the engines disagree.
+    """
+    mismatches = 0
+    timings = {'bs4': 0.0, 'lxml': 0.0}
+    file_names = sorted(name for name in os.listdir(pages_directory) if name.endswith('.html'))
+
+    for file_name in file_names:
+        with open(os.path.join(pages_directory, file_name), 'rb') as file:
+            article_url, _, html = file.read().partition(b'\n')
+        article_url = article_url.decode('utf-8')
+
+        started_at = time.perf_counter()
+        bs4_article = ArticleScraper.parse_article_bs4(article_url, html)
+        timings['bs4'] += time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        lxml_article = ArticleScraper.parse_article_lxml(article_url, html)
+        timings['lxml'] += time.perf_counter() - started_at
+
+        if bs4_article != lxml_article:
+            mismatches += 1
+            print(f"Mismatch for {article_url} ({file_name}):")
+            for article_field in fields(bs4_article):
+                bs4_value = getattr(bs4_article, article_field.name)
+                lxml_value = getattr(lxml_article, article_field.name)
+                if bs4_value != lxml_value:
+                    print(f"  {article_field.name}: bs4={bs4_value!r} lxml={lxml_value!r}")
+
+    print(f"Compared {len(file_names)} pages, {mismatches} mismatches.")
+    for engine, seconds in timings.items():
+        if file_names:
+            print(f"  {engine}: {seconds:.3f}s total, {1000 * seconds / len(file_names):.2f} ms/page")
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that the lxml and BeautifulSoup extraction engines return the same articles.")
+    parser.add_argument('pages_directory', nargs='?', default=SAVED_PAGES_DIRECTORY,
+                        help="Directory of saved article pages (the pages saved in the repository by default).")
+    parser.add_argument('--save-from-sitemap', metavar='SITEMAP_URL',
+                        help="Download article pages from this monthly sitemap into the directory first.")
+    parser.add_argument('--count', type=int, default=50, help="Number of pages to download.")
+    args = parser.parse_args()
+
+    if args.save_from_sitemap:
+        save_pages(args.save_from_sitemap, args.count, args.pages_directory)
+    sys.exit(1 if compare_engines(args.pages_directory) else 0)
@@ -0,0 +1,119 @@
+import argparse  # For reading the settings from the command line
+import logging  # For the messages of the shared crawl modules
+import multiprocessing  # For starting the parse processes
+import os  # For the number of CPU cores
+import time  # For measuring the re-extraction throughput
+from concurrent.futures import ProcessPoolExecutor  # For parsing the archived pages on all CPU cores
+
+from ArticleScraperClass import ArticleScraper
+from CrawlPipelineClass import parse_page
+from CrawlStateStoreClass import CrawlStateStore
+from FileUtilityClass import FileUtility, JsonLinesWriter
+from HtmlArchiveClass import HtmlArchive
+from HttpCacheClass import HttpCache
+from web_scraper_main import write_month_file
+
+
+def extract_archived_page(engine: str, archive_directory: str, article_url: str, sha256: str):
+    """
+    Reads an archived page and extracts its article (runs in a parse process).
+
+    :param engine: The extraction engine, 'lxml' or 'bs4'.
+    :param archive_directory: The directory of the HTML archive.
+    :param article_url: The URL of the article.
+    :param sha256: The content hash of the archived page.
+    :return: The Article object, or the error message if the page could not be extracted.
+    """
+    try:
+        return parse_page(engine, article_url, HtmlArchive.read_object(archive_directory, sha256))
+    except Exception as e:
+        return f"Error extracting article {article_url}: {e}"
+
+
+def reextract(args) -> int:
+    """
+    Extracts again every archived article of the crawl state, updates the stored articles and rewrites the month files.
+
+    :param args: The parsed command line arguments.
+    :return: The number of articles extracted again.
+    """
+    archive = HtmlArchive(args.archive_dir)
+    state_store = CrawlStateStore(args.state_db)
+    # The fields cached for conditional requests are replaced too, or a 304 would bring the old extraction back
+    http_cache = HttpCache(args.cache_db) if os.path.exists(args.cache_db) else None
+    if args.output_dir:
+        FileUtility.directory = args.output_dir
+    writer = JsonLinesWriter(args.compression) if args.output_format == 'jsonl' else None
+
+    # Spawned parse processes, they read the pages from the archive themselves so only hashes are sent to them
+    parse_pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'))
+    extracted = 0
+    missing = 0
+    started_at = time.monotonic()
+    try:
+        for sitemap_url, year, month in state_store.sitemaps():
+            positions = []
+            urls = []
+            hashes = []
+            for position, article_url in state_store.article_positions(sitemap_url):
+                sha256 = archive.lookup(article_url)
+                if sha256 is None:
+                    missing += 1  # Fetched before archiving was enabled, the stored article is kept
+                    continue
+                positions.append(position)
+                urls.append(article_url)
+                hashes.append(sha256)
+
+            # The results come back in sitemap order
+            results = parse_pool.map(extract_archived_page, [args.engine] * len(urls), [args.archive_dir] * len(urls),
+                                     urls, hashes, chunksize=16)
+            month_extracted = 0
+            for position, article_url, article in zip(positions, urls, results):
+                if isinstance(article, str) or not article:
+                    print(article or f"No content found for article {article_url}.")
+                    continue
+                state_store.record_article(sitemap_url, position, article)
+                if http_cache is not None:
+                    http_cache.update_data(article_url, article.to_dict())
+                month_extracted += 1
+
+            extracted += month_extracted
+            print(f"Extracted {month_extracted} archived articles for {year}-{month:02d}.")
+            if month_extracted:
+                write_month_file(state_store, writer, sitemap_url, year, month)
+    finally:
+        parse_pool.shutdown(cancel_futures=True)
+        if writer is not None:
+            writer.close()
+        state_store.close()
+        archive.close()
+        if http_cache is not None:
+            http_cache.close()
+
+    elapsed = time.monotonic() - started_at
+    print(f"Re-extraction completed: {extracted} articles extracted, {missing} not in the archive.")
+    if elapsed > 0:
+        print(f"Average throughput: {extracted / elapsed:.2f} articles/sec with {args.workers} processes.")
+    return extracted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extract the articles again from the HTML archive, without fetching the site.")
+    parser.add_argument('--archive-dir', default='html_archive', help="Directory of the HTML archive.")
+    parser.add_argument('--state-db', default='crawl_state.sqlite3',
+                        help="SQLite file of the crawl state (the months and articles to extract again).")
+    parser.add_argument('--cache-db', default='http_cache.sqlite3',
+                        help="SQLite file of the HTTP cache, its cached articles are updated if it exists.")
+    parser.add_argument('--engine', choices=ArticleScraper.ENGINES, default='lxml',
+                        help="Extraction engine used to parse the archived pages.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Number of parse processes (the number of CPU cores by default).")
+    parser.add_argument('--output-format', choices=('json', 'jsonl'), default='json',
+                        help="Format of the rewritten month files.")
+    parser.add_argument('--compression', choices=tuple(FileUtility.COMPRESSIONS), default='none',
+                        help="Compression of the JSON Lines files (zstd needs the zstandard package).")
+    parser.add_argument('--output-dir', default=None,
+                        help="Directory of the monthly article files (the directory set in FileUtility by default).")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+    reextract(parser.parse_args())
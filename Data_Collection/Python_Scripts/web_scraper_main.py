@@ -1,37 +1,517 @@
+import argparse  # For reading the crawl settings from the command line
+import logging  # For the levelled crawl log
+import os  # For the identifier of a queue worker
+import socket  # For the identifier of a queue worker
+import sys  # For the "no limit" article limit
+import threading  # For renewing the lease of a queue worker
+import time  # For measuring the crawl throughput
+from typing import Optional, Union  # For hinting,help with code clarity, readability
+
 from ArticleScraperClass import ArticleScraper
-from FileUtilityClass import FileUtility
+from ConcurrencyControllerClass import AdaptiveConcurrencyController
+from ConcurrentScraperClass import ConcurrentArticleScraper, HostRateLimiter
+from CrawlMetricsClass import CrawlMetrics
+from CrawlPipelineClass import CrawlPipeline, MonthTask
+from CrawlQueueClass import CrawlQueue
+from CrawlStateStoreClass import CrawlStateStore
+from FileUtilityClass import FileUtility, JsonLinesWriter
+from HtmlArchiveClass import HtmlArchive
+from HttpCacheClass import HttpCache
+from HttpClientClass import HttpClient
+from MongoArticleSinkClass import MongoArticleSink
 from SiteParserClass import SitemapParser
 
+logger = logging.getLogger(__name__)
+
+# Where the scraped articles are streamed: the monthly JSON Lines files or MongoDB
+ArticleWriter = Union[JsonLinesWriter, MongoArticleSink]
+
+
+def parse_arguments(argv=None):
+    """
+    Parses the command line arguments that control the crawl.
+
+    :param argv: The arguments to parse (the command line arguments by default).
+    :return: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Scrape Al Mayadeen articles into monthly JSON files.")
+    parser.add_argument('--sitemap-index', default="https://www.almayadeen.net/sitemaps/all.xml",
+                        help="URL of the sitemap index that lists the monthly sitemaps.")
+    parser.add_argument('--mode', choices=('threads', 'pipeline'), default='threads',
+                        help="'threads' downloads and parses in a thread pool, 'pipeline' runs separate discovery, "
+                             "fetch (threads), parse (processes) and sink stages.")
+    parser.add_argument('--workers', type=int, default=8,
+                        help="Number of articles downloaded in parallel (1 scrapes sequentially).")
+    parser.add_argument('--parse-workers', type=int, default=None,
+                        help="Number of parse processes in pipeline mode (the number of CPU cores by default).")
+    parser.add_argument('--queue-size', type=int, default=64,
+                        help="Capacity of each queue between the pipeline stages.")
+    parser.add_argument('--stats-interval', type=float, default=10.0,
+                        help="Seconds between two pipeline progress reports (0 disables them).")
+    parser.add_argument('--rate', type=float, default=None,
+                        help="Maximum number of requests per second per host (unlimited by default).")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="Adapt the number of concurrent requests per host (AIMD): start at "
+                             "--initial-concurrency, grow while latency is stable, back off on 429/503, timeouts "
+                             "and rising p95 latency. --workers is then the maximum.")
+    parser.add_argument('--initial-concurrency', type=int, default=2,
+                        help="Starting number of concurrent requests per host with --adaptive.")
+    parser.add_argument('--latency-tolerance', type=float, default=1.5,
+                        help="With --adaptive, back off when the p95 latency exceeds its baseline by this factor.")
+    parser.add_argument('--role', choices=('standalone', 'coordinator', 'worker'), default='standalone',
+                        help="'standalone' crawls every month in this process. 'coordinator' puts the months and the "
+                             "article limits on the --queue-db queue and exits, then any number of 'worker' processes "
+                             "lease the months from the queue and crawl them.")
+    parser.add_argument('--queue-db', default='crawl_queue.sqlite3',
+                        help="SQLite file of the work queue shared by the coordinator and the workers.")
+    parser.add_argument('--lease-seconds', type=float, default=120.0,
+                        help="Seconds after which the month of a worker that stopped renewing its lease is handed "
+                             "to another worker.")
+    parser.add_argument('--worker-id', default=None,
+                        help="Identifier of a queue worker (host name and process id by default).")
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help="Read timeout of each request in seconds.")
+    parser.add_argument('--retries', type=int, default=3,
+                        help="Number of retries on connection errors, 429 and 5xx responses.")
+    parser.add_argument('--article-limit', type=int, default=12000,
+                        help="Overall article limit across all months, including articles fetched by earlier runs "
+                             "(0 means no limit).")
+    parser.add_argument('--state-db', default='crawl_state.sqlite3',
+                        help="SQLite file that records the crawl state so later runs resume and skip fetched URLs.")
+    parser.add_argument('--engine', choices=ArticleScraper.ENGINES, default='lxml',
+                        help="Extraction engine used to parse the article pages.")
+    parser.add_argument('--cache-db', default='http_cache.sqlite3',
+                        help="SQLite file of the HTTP cache used for conditional requests.")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Disable the HTTP cache and download every sitemap and article in full.")
+    parser.add_argument('--archive-dir', default=None,
+                        help="Keep the raw HTML of every downloaded article, compressed, in this directory so the "
+                             "articles can be extracted again with reextract_articles.py (disabled by default).")
+    parser.add_argument('--log-level', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'), default='INFO',
+                        help="Level of the crawl log (DEBUG also logs every scraped article).")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Serve live metrics in the Prometheus text format on http://127.0.0.1:PORT/metrics.")
+    parser.add_argument('--metrics-file', default=None,
+                        help="Write the metrics in the Prometheus text format to this file, every --stats-interval "
+                             "seconds and at the end of the run.")
+    parser.add_argument('--output-format', choices=('json', 'jsonl'), default='json',
+                        help="'json' writes each month as one JSON array once it is complete, 'jsonl' streams every "
+                             "article to a JSON Lines file as soon as it is scraped.")
+    parser.add_argument('--compression', choices=tuple(FileUtility.COMPRESSIONS), default='none',
+                        help="Compression of the JSON Lines files (zstd needs the zstandard package).")
+    parser.add_argument('--output-dir', default=None,
+                        help="Directory of the monthly article files (the directory set in FileUtility by default).")
+    parser.add_argument('--sink', choices=('files', 'mongodb'), default='files',
+                        help="'files' writes the monthly article files, 'mongodb' upserts every article into MongoDB "
+                             "as soon as it is scraped (needs pymongo).")
+    parser.add_argument('--mongo-uri', default="mongodb://localhost:27017/", help="MongoDB connection string.")
+    parser.add_argument('--mongo-database', default="Almayadeen", help="MongoDB database of the articles.")
+    parser.add_argument('--mongo-collection', default="articles", help="MongoDB collection of the articles.")
+    parser.add_argument('--mongo-batch-size', type=int, default=500,
+                        help="Number of articles written to MongoDB in one bulk write.")
+    parser.add_argument('--mongo-flush-interval', type=float, default=5.0,
+                        help="Maximum number of seconds an article waits before it is written to MongoDB.")
+    return parser.parse_args(argv)
+
+
+def start_month_file(writer: JsonLinesWriter, state_store: CrawlStateStore, sitemap_url: str, year: int,
+                     month: int):
+    """
+    Opens the JSON Lines file of a month and copies into it the articles fetched by earlier runs.
+
+    :param writer: The JSON Lines writer.
+    :param state_store: The crawl state store holding the articles.
+    :param sitemap_url: The URL of the monthly sitemap.
+    :param year: The year of the articles.
+    :param month: The month of the articles.
+    """
+    writer.open_month(year, month)
+    # The month file also holds the articles of earlier runs, they are streamed from the store in sitemap order
+    for article in state_store.iter_articles(sitemap_url):
+        writer.write(article)
+
+
+def write_article(writer: Optional[ArticleWriter], state_store: CrawlStateStore, sitemap_url: str, year: int,
+                  month: int, article):
+    """
+    Streams a scraped article to the JSON Lines file of its month or to MongoDB (before it is recorded in the crawl
+    state).
+
+    :param writer: The JSON Lines writer, the MongoDB sink, or None when the months are written as JSON arrays.
+    :param state_store: The crawl state store holding the articles.
+    :param sitemap_url: The URL of the monthly sitemap.
+    :param year: The year of the article.
+    :param month: The month of the article.
+    :param article: The scraped Article object.
+    """
+    if writer is None:
+        return
+    if isinstance(writer, MongoArticleSink):
+        writer.write(article)  # Upserted by postId, the articles of earlier runs are already in the collection
+        return
+    if not writer.is_open(year, month):
+        start_month_file(writer, state_store, sitemap_url, year, month)
+    writer.write(article)
+
+
+def write_month_file(state_store: CrawlStateStore, writer: Optional[ArticleWriter], sitemap_url: str, year: int,
+                     month: int) -> bool:
+    """
+    Writes the file of a month from the articles stored in the crawl state (this run's and earlier runs').
+
+    :param state_store: The crawl state store holding the articles.
+    :param writer: The JSON Lines writer, the MongoDB sink, or None to write the month as a JSON array.
+    :param sitemap_url: The URL of the monthly sitemap.
+    :param year: The year of the articles.
+    :param month: The month of the articles.
+    :return: True if the file was written (or there was nothing to write), False on an I/O error.
+    """
+    if isinstance(writer, MongoArticleSink):
+        try:
+            # The month is only done once all its articles are in the collection
+            writer.flush()
+        except IOError as e:
+            logger.error("Error saving articles for %d-%02d: %s", year, month, e)
+            return False
+        return True
+
+    if writer is not None:
+        try:
+            if not writer.is_open(year, month):
+                start_month_file(writer, state_store, sitemap_url, year, month)
+            if writer.count:
+                # The complete month file replaces the previous one in a single step
+                count = writer.count
+                file_path = writer.close_month()
+                logger.info("Saved %d articles for %d-%02d to %s.", count, year, month, file_path)
+            else:
+                writer.abort()
+        except IOError as e:
+            # Handle errors related to file I/O when saving articles
+            logger.error("Error saving articles for %d-%02d: %s", year, month, e)
+            writer.abort()
+            return False
+        return True
+
+    # The month file holds the articles of this run and of earlier runs, in sitemap order
+    articles = state_store.load_articles(sitemap_url)
+
+    # Save the articles for the current month to a JSON file
+    if articles:
+        try:
+            FileUtility.save_articles_to_json(articles, year, month)
+            logger.info("Saved %d articles for %d-%02d.", len(articles), year, month)
+        except IOError as e:
+            # Handle errors related to file I/O when saving articles
+            logger.error("Error saving articles for %d-%02d: %s", year, month, e)
+            return False
+    return True
+
+
+def save_month(state_store: CrawlStateStore, writer: Optional[ArticleWriter], sitemap_url: str, year: int,
+               month: int, previous_status: str, new_articles: int):
+    """
+    Writes the file of a month once all its articles are scraped, and marks its sitemap as done.
+
+    :param state_store: The crawl state store holding the articles.
+    :param writer: The JSON Lines writer, the MongoDB sink, or None to write the month as a JSON array.
+    :param sitemap_url: The URL of the monthly sitemap.
+    :param year: The year of the articles.
+    :param month: The month of the articles.
+    :param previous_status: The status of the sitemap recorded by an earlier run.
+    :param new_articles: The number of articles scraped for this month in this run.
+    """
+    if new_articles == 0 and previous_status == CrawlStateStore.SITEMAP_DONE:
+        # Nothing new this month and its file was already written by an earlier run
+        state_store.record_sitemap(sitemap_url, year, month, CrawlStateStore.SITEMAP_DONE)
+        return
+
+    if not write_month_file(state_store, writer, sitemap_url, year, month):
+        return  # Leave the sitemap in progress so the file is written again on the next run
+
+    state_store.record_sitemap(sitemap_url, year, month, CrawlStateStore.SITEMAP_DONE)
+
+
+def run_threads(args, sitemap_parser: SitemapParser, scraper: ArticleScraper, state_store: CrawlStateStore,
+                writer: Optional[ArticleWriter], sitemap_urls, sitemap_lastmods, articles_per_sitemap: int,
+                overall_article_limit: int, total_article_counter: int) -> int:
+    """
+    Crawls the monthly sitemaps one after the other, scraping the articles of each month with a thread pool.
+
+    :return: The total number of articles, including the ones fetched by earlier runs.
+    """
+    metrics = scraper.http_client.metrics
+
+    # Create the worker pool that scrapes the articles of each month
+    article_scraper = ConcurrentArticleScraper(workers=args.workers, requests_per_second=args.rate,
+                                               scraper=scraper)
+
+    # Process each monthly sitemap URL
+    for monthly_sitemap_url in sitemap_urls:
+        if total_article_counter >= overall_article_limit:
+            break  # Stop if the overall article limit has been reached
+
+        try:
+            # Extract the year and month from the sitemap URL
+            year, month = sitemap_parser.extract_year_month_from_url(monthly_sitemap_url)
+            logger.info("Processing sitemap for %d-%02d...", year, month)
+        except Exception as e:
+            # Handle errors related to processing each sitemap
+            logger.error("Error processing sitemap %s: %s", monthly_sitemap_url, e)
+            continue  # Skip to the next sitemap if there's an error
+
+        previous_status = state_store.sitemap_status(monthly_sitemap_url)
+        state_store.record_sitemap(monthly_sitemap_url, year, month, CrawlStateStore.SITEMAP_IN_PROGRESS)
+
+        # Skip the URLs fetched by earlier runs, only the new ones are scraped
+        fetched_urls = state_store.fetched_urls(monthly_sitemap_url)
+        positions = {}  # The position of each article URL in the sitemap
+        logger.info("%d articles already fetched from %s.", len(fetched_urls), monthly_sitemap_url)
+
+        def stream_new_article_urls():
+            # Article URLs are streamed from the sitemap, so scraping starts before the download is complete
+            for position, streamed_url in enumerate(
+                    sitemap_parser.iter_article_urls(monthly_sitemap_url, sitemap_lastmods.get(monthly_sitemap_url))):
+                positions[streamed_url] = position
+                if streamed_url not in fetched_urls:
+                    yield streamed_url
+
+        monthly_article_counter = 0  # Counter for articles scraped in the current month
+        month_started_at = time.monotonic()
+
+        # Never ask for more than what is left of the monthly quota or of the overall limit
+        month_limit = min(articles_per_sitemap - len(fetched_urls), overall_article_limit - total_article_counter)
 
-def main():
+        def record_failure(failed_url: str):
+            # Failed URLs are recorded so they can be told apart from unseen ones, they are retried on the next run
+            state_store.record_failure(monthly_sitemap_url, positions[failed_url], failed_url)
+            metrics.inc('articles_total', outcome='failed')
+
+        # Scrape the article URLs concurrently, the results come back in sitemap order
+        for article_url, article in article_scraper.scrape_in_order(stream_new_article_urls(), month_limit,
+                                                                    on_failure=record_failure):
+            with metrics.time_stage('save'):
+                write_article(writer, state_store, monthly_sitemap_url, year, month, article)
+                # Persist the article right away so a crash does not lose the month
+                state_store.record_article(monthly_sitemap_url, positions[article_url], article)
+            metrics.inc('articles_total', outcome='scraped')
+            monthly_article_counter += 1
+            total_article_counter += 1
+            logger.debug("Total articles scraped so far: %d", total_article_counter)
+
+        month_elapsed = time.monotonic() - month_started_at
+        if month_elapsed > 0:
+            logger.info("Scraped %d articles for %d-%02d at %.2f articles/sec.", monthly_article_counter, year, month,
+                        monthly_article_counter / month_elapsed)
+
+        with metrics.time_stage('month_save'):
+            save_month(state_store, writer, monthly_sitemap_url, year, month, previous_status,
+                       monthly_article_counter)
+
+    article_scraper.close()
+    logger.info("Average throughput: %.2f articles/sec with %d workers.", article_scraper.articles_per_second(),
+                article_scraper.workers)
+    return total_article_counter
+
+
+def run_pipeline(args, sitemap_parser: SitemapParser, scraper: ArticleScraper, state_store: CrawlStateStore,
+                 writer: Optional[ArticleWriter], sitemap_urls, sitemap_lastmods, articles_per_sitemap: int,
+                 overall_article_limit: int, total_article_counter: int) -> int:
+    """
+    Crawls the monthly sitemaps with the staged pipeline (discovery, fetch threads, parse processes, sink).
+
+    :return: The total number of articles, including the ones fetched by earlier runs.
+    """
+    months = []
+    for sitemap_url in sitemap_urls:
+        try:
+            # Extract the year and month from the sitemap URL
+            year, month = sitemap_parser.extract_year_month_from_url(sitemap_url)
+        except Exception as e:
+            logger.error("Error processing sitemap %s: %s", sitemap_url, e)
+            continue  # Skip to the next sitemap if there's an error
+        months.append(MonthTask(sitemap_url, year, month, lastmod=sitemap_lastmods.get(sitemap_url),
+                                previous_status=state_store.sitemap_status(sitemap_url),
+                                fetched_urls=state_store.fetched_urls(sitemap_url)))
+        state_store.record_sitemap(sitemap_url, year, month, CrawlStateStore.SITEMAP_IN_PROGRESS)
+
+    def month_sink(task: MonthTask):
+        logger.info("Scraped %d articles for %d-%02d.", task.new_articles, task.year, task.month)
+        with scraper.http_client.metrics.time_stage('month_save'):
+            save_month(state_store, writer, task.sitemap_url, task.year, task.month, task.previous_status,
+                       task.new_articles)
+
+    def article_sink(task: MonthTask, article):
+        write_article(writer, state_store, task.sitemap_url, task.year, task.month, article)
+
+    pipeline = CrawlPipeline(sitemap_parser, scraper, state_store, fetch_workers=args.workers,
+                             parse_workers=args.parse_workers, rate_limiter=HostRateLimiter(args.rate),
+                             queue_size=args.queue_size, stats_interval=args.stats_interval)
+    started_at = time.monotonic()
+    new_total = pipeline.run(months, articles_per_sitemap, overall_article_limit, total_article_counter, month_sink,
+                             article_sink)
+    elapsed = time.monotonic() - started_at
+    if elapsed > 0:
+        logger.info("Average throughput: %.2f articles/sec with %d fetch threads and %d parse processes.",
+                    (new_total - total_article_counter) / elapsed, pipeline.fetch_workers, pipeline.parse_workers)
+    return new_total
+
+
+def enqueue_months(queue: CrawlQueue, sitemap_parser: SitemapParser, state_store: CrawlStateStore, sitemap_urls,
+                   sitemap_lastmods, overall_article_limit: int, articles_per_sitemap: int) -> int:
+    """
+    Puts the monthly sitemaps on the work queue, in crawl order, with the limits of the crawl.
+
+    :return: The number of months enqueued.
+    """
+    months = []
+    for sitemap_url in sitemap_urls:
+        try:
+            # Extract the year and month from the sitemap URL
+            year, month = sitemap_parser.extract_year_month_from_url(sitemap_url)
+        except Exception as e:
+            logger.error("Error processing sitemap %s: %s", sitemap_url, e)
+            continue  # Skip to the next sitemap if there's an error
+        # The articles fetched by earlier runs count towards the overall limit
+        months.append((sitemap_url, year, month, sitemap_lastmods.get(sitemap_url),
+                       state_store.count_fetched([sitemap_url])))
+    queue.enqueue_months(months, overall_article_limit, articles_per_sitemap)
+    logger.info("Enqueued %d months on %s (overall limit %d, %d articles per month).", len(months), queue.db_path,
+                overall_article_limit, articles_per_sitemap)
+    return len(months)
+
+
+def run_queue_worker(args, run, sitemap_parser: SitemapParser, scraper: ArticleScraper,
+                     state_store: CrawlStateStore, writer: Optional[ArticleWriter], queue: CrawlQueue) -> int:
+    """
+    Leases the months of the work queue one at a time and crawls them, until every month of the queue is done.
+
+    :param run: The crawl function of the selected mode (run_threads or run_pipeline).
+    :param queue: The work queue filled by the coordinator.
+    :return: The number of articles scraped by this worker.
+    """
+    worker = args.worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    articles_per_sitemap = queue.settings()['articles_per_sitemap']
+    scraped = 0
+    logger.info("Worker %s started on queue %s.", worker, args.queue_db)
+
+    while True:
+        task = queue.lease(worker, args.lease_seconds)
+        if task is None:
+            counts = queue.counts()
+            if not counts.get(CrawlQueue.STATUS_PENDING) and not counts.get(CrawlQueue.STATUS_LEASED):
+                break  # Every month is done
+            # The months leased by other workers are handed over if their lease expires
+            time.sleep(min(5.0, args.lease_seconds / 4))
+            continue
+
+        # The articles of the month fetched by any worker are in the shared crawl state
+        fetched = state_store.count_fetched([task.sitemap_url])
+        wanted = max(0, articles_per_sitemap - fetched)
+        granted = queue.reserve_articles(task, worker, fetched, wanted)
+        if wanted and not granted:
+            logger.info("Overall article limit reached, skipping %d-%02d.", task.year, task.month)
+            queue.ack(task, worker, fetched)
+            continue
+        logger.info("Leased %d-%02d (attempt %d) with %d of its %d remaining articles granted.", task.year,
+                    task.month, task.attempts, granted, wanted)
+
+        # Renew the lease while the month is crawled, so it is only handed over if this worker dies
+        stop_renewing = threading.Event()
+
+        def renew_lease():
+            while not stop_renewing.wait(args.lease_seconds / 3):
+                if not queue.renew(task, worker, args.lease_seconds):
+                    logger.warning("Lost the lease of %d-%02d.", task.year, task.month)
+                    return
+
+        renewer = threading.Thread(target=renew_lease, name='lease-renewal', daemon=True)
+        renewer.start()
+        try:
+            # The grant is the overall limit of this month (a month with nothing left to scrape is still saved)
+            scraped += run(args, sitemap_parser, scraper, state_store, writer, [task.sitemap_url],
+                           {task.sitemap_url: task.lastmod}, articles_per_sitemap, granted if wanted else 1, 0)
+        except BaseException:
+            queue.release(task, worker, state_store.count_fetched([task.sitemap_url]))
+            raise
+        finally:
+            stop_renewing.set()
+            renewer.join()
+
+        if not queue.ack(task, worker, state_store.count_fetched([task.sitemap_url])):
+            logger.warning("The lease of %d-%02d expired before it was done, another worker crawled it too.",
+                           task.year, task.month)
+
+    counts = queue.counts()
+    logger.info("Queue drained: %d months done, %d articles fetched over all the workers.",
+                counts.get(CrawlQueue.STATUS_DONE, 0), counts['fetched'])
+    return scraped
+
+
+def main(argv=None):
     """
     Main function to coordinate the sitemap parsing, article scraping, and file saving processes.
+
+    :param argv: The command line arguments (those of the process by default).
+    :return: A summary of the run (articles, elapsed seconds, HTTP latency and status codes), or None on an error.
     """
+    args = parse_arguments(argv)
+    started_at = time.monotonic()
+    logging.basicConfig(level=getattr(logging, args.log_level),
+                        format='%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    # Metrics of every stage, served live and/or written to a file in the Prometheus text format
+    metrics = CrawlMetrics()
+    if args.metrics_port is not None:
+        metrics.start_server(args.metrics_port)
+    if args.metrics_file:
+        metrics.start_file_writer(args.metrics_file, args.stats_interval or 10.0)
+
     # Initialize the sitemap index URL
-    sitemap_index_url = "https://www.almayadeen.net/sitemaps/all.xml"
+    sitemap_index_url = args.sitemap_index
+
+    # One pooled HTTP client is shared by the sitemap parser and every article download
+    http_cache = None if args.no_cache else HttpCache(args.cache_db)
+    concurrency_controller = None
+    if args.adaptive:
+        # The workers are the ceiling, the controller decides how many of them may hit the site at once
+        concurrency_controller = AdaptiveConcurrencyController(initial_limit=args.initial_concurrency,
+                                                               max_limit=args.workers,
+                                                               latency_tolerance=args.latency_tolerance,
+                                                               metrics=metrics)
+    # In pipeline mode the sitemap discovery thread downloads alongside the workers, so it gets a connection of its
+    # own instead of having one discarded from the pool at every sitemap
+    pool_size = args.workers + 1 if args.mode == 'pipeline' else args.workers
+    http_client = HttpClient(pool_size=pool_size, read_timeout=args.timeout, max_retries=args.retries,
+                             cache=http_cache, metrics=metrics, concurrency_controller=concurrency_controller)
 
     try:
         # Create a SitemapParser object with the index URL
-        print("Initializing SitemapParser...")
-        sitemap_parser = SitemapParser(sitemap_index_url)
-        print("SitemapParser initialized successfully.")
+        logger.info("Initializing SitemapParser...")
+        sitemap_parser = SitemapParser(sitemap_index_url, http_client=http_client)
+        logger.info("SitemapParser initialized successfully.")
     except Exception as e:
         # Handle any errors that occur during initialization
-        print(f"Error initializing SitemapParser: {e}")
+        logger.error("Error initializing SitemapParser: %s", e)
+        metrics.close()
         return  # Exit the function if initialization fails
 
     try:
         # Fetch the list of monthly sitemap URLs from the sitemap index
-        print("Fetching monthly sitemap URLs...")
-        monthly_sitemap_urls = sitemap_parser.fetch_sitemap_index()
-        print(f"Fetched {len(monthly_sitemap_urls)} monthly sitemaps.")
+        logger.info("Fetching monthly sitemap URLs...")
+        sitemap_entries = sitemap_parser.fetch_sitemap_index_entries()
+        monthly_sitemap_urls = [sitemap_url for sitemap_url, _ in sitemap_entries]
+        # The <lastmod> of each monthly sitemap tells whether it needs to be downloaded again
+        sitemap_lastmods = dict(sitemap_entries)
+        logger.info("Fetched %d monthly sitemaps.", len(monthly_sitemap_urls))
     except Exception as e:
         # Handle errors related to fetching the sitemap index
-        print(f"Error fetching monthly sitemap URLs: {e}")
+        logger.error("Error fetching monthly sitemap URLs: %s", e)
+        metrics.close()
         return  # Exit the function if fetching URLs fails
 
-    total_article_counter = 0  # Counter for the total number of articles
-    overall_article_limit = 12000  # Overall article limit across all months
+    # Overall article limit across all months
+    overall_article_limit = args.article_limit if args.article_limit > 0 else sys.maxsize
 
     # Filter the sitemaps to process 2024 first, then 2023, and so on if needed
     monthly_sitemap_urls.sort(reverse=True)  # Sort descending by year and month
@@ -55,63 +535,96 @@ def main():
     else:
         articles_per_sitemap = overall_article_limit  # Fallback if no sitemaps are available
 
-    # Process each monthly sitemap URL
-    for monthly_sitemap_url in filtered_sitemap_urls:
-        if total_article_counter >= overall_article_limit:
-            break  # Stop if the overall article limit has been reached
+    # Open the crawl state, articles fetched by earlier runs count towards the limits and are not fetched again
+    state_store = CrawlStateStore(args.state_db)
+    total_article_counter = state_store.count_fetched(filtered_sitemap_urls)  # Counter for the total number of articles
+    resumed_article_counter = total_article_counter
+    logger.info("Resuming with %d articles already fetched.", total_article_counter)
 
-        try:
-            # Extract the year and month from the sitemap URL
-            year, month = sitemap_parser.extract_year_month_from_url(monthly_sitemap_url)
-            print(f"Processing sitemap for {year}-{month:02d}...")
+    if args.role == 'coordinator':
+        # The workers crawl the months, the coordinator only hands them out with the limits of the crawl
+        queue = CrawlQueue(args.queue_db)
+        months = enqueue_months(queue, sitemap_parser, state_store, filtered_sitemap_urls, sitemap_lastmods,
+                                overall_article_limit, articles_per_sitemap)
+        queue.close()
+        http_client.close()
+        state_store.close()
+        if http_cache is not None:
+            http_cache.close()
+        metrics.close()
+        return {'months': months, 'total_articles': total_article_counter}
 
-            # Fetch all article URLs from this monthly sitemap
-            article_urls = sitemap_parser.fetch_article_urls(monthly_sitemap_url)
-            print(f"Fetched {len(article_urls)} article URLs from {monthly_sitemap_url}.")
+    # JSON Lines files and MongoDB are written article by article, JSON files are written once the month is complete
+    if args.output_dir:
+        FileUtility.directory = args.output_dir
+    writer = JsonLinesWriter(args.compression) if args.output_format == 'jsonl' else None
+    if args.sink == 'mongodb':
+        try:
+            writer = MongoArticleSink(args.mongo_uri, args.mongo_database, args.mongo_collection,
+                                      batch_size=args.mongo_batch_size, flush_interval=args.mongo_flush_interval,
+                                      metrics=metrics)
         except Exception as e:
-            # Handle errors related to processing each sitemap
-            print(f"Error processing sitemap {monthly_sitemap_url}: {e}")
-            continue  # Skip to the next sitemap if there's an error
+            logger.error("Error connecting to MongoDB: %s", e)
+            state_store.close()
+            metrics.close()
+            return
 
-        articles = []  # List to store Article objects for the current month
-        monthly_article_counter = 0  # Counter for articles scraped in the current month
+    # Crawl the months with the selected mode
+    html_archive = HtmlArchive(args.archive_dir) if args.archive_dir else None
+    scraper = ArticleScraper(http_client=http_client, engine=args.engine, archive=html_archive)
+    run = run_pipeline if args.mode == 'pipeline' else run_threads
+    try:
+        if args.role == 'worker':
+            queue = CrawlQueue(args.queue_db)
+            try:
+                total_article_counter += run_queue_worker(args, run, sitemap_parser, scraper, state_store, writer,
+                                                          queue)
+            finally:
+                queue.close()
+        else:
+            total_article_counter = run(args, sitemap_parser, scraper, state_store, writer, filtered_sitemap_urls,
+                                        sitemap_lastmods, articles_per_sitemap, overall_article_limit,
+                                        total_article_counter)
+    finally:
+        if writer is not None:
+            writer.close()  # An unfinished month file is discarded, MongoDB gets its last articles
 
-        # Process each article URL
-        for article_url in article_urls:
-            if monthly_article_counter >= articles_per_sitemap:
-                break  # Stop if the monthly limit is reached
+    http_client.close()
+    state_store.close()
+    if http_cache is not None:
+        http_cache.close()
+    if html_archive is not None:
+        html_archive.close()
 
-            if total_article_counter >= overall_article_limit:
-                break  # Stop if the overall article limit is reached
+    # Log the summary of the run after processing all sitemaps
+    logger.info("Scraping completed. Total articles scraped: %d", total_article_counter)
+    latency = http_client.latency_stats()
+    logger.info("HTTP requests: %d, latency mean %.3fs, p50 %.3fs, p95 %.3fs, p99 %.3fs, max %.3fs.",
+                latency['count'], latency['mean'], latency['p50'], latency['p95'], latency['p99'], latency['max'])
+    logger.info("HTTP status codes: %s", http_client.status_counts())
+    if concurrency_controller is not None:
+        logger.info("Final concurrency per host: %s", concurrency_controller.limits())
+    if http_cache is not None:
+        for kind, stats in http_cache.hit_rates().items():
+            logger.info("HTTP cache (%s): %d not modified, %d skipped by lastmod, %d downloaded, hit rate %.1f%%.",
+                        kind, stats['hit'], stats['skipped'], stats['miss'], stats['hit_rate'] * 100)
+    if html_archive is not None:
+        stats = html_archive.stats()
+        logger.info("HTML archive: %d pages stored (%d bytes, %d compressed), %d already archived.",
+                    stats['stored'], stats['bytes'], stats['compressed_bytes'], stats['deduplicated'])
+    metrics.log_summary()
+    if args.metrics_file:
+        metrics.write_file(args.metrics_file)
+    metrics.close()
 
-            try:
-                # Create an ArticleScraper and scrape the article
-                scraper = ArticleScraper()
-                print(f"Scraping article: {article_url}")
-                article = scraper.scrape_article(article_url)
-                if article:
-                    articles.append(article)
-                    monthly_article_counter += 1
-                    total_article_counter += 1
-                    print(f"Total articles scraped so far: {total_article_counter}")
-                    print(f"Article content: {article}")  # Print scraped article data
-                else:
-                    print(f"No content found for article {article_url}.")
-            except Exception as e:
-                # Handle errors related to scraping individual articles
-                print(f"Error scraping article {article_url}: {e}")
-
-        # Save the articles for the current month to a JSON file
-        if articles:
-            try:
-                FileUtility.save_articles_to_json(articles, year, month)
-                print(f"Saved {len(articles)} articles for {year}-{month:02d}.")
-            except IOError as e:
-                # Handle errors related to file I/O when saving articles
-                print(f"Error saving articles for {year}-{month:02d}: {e}")
-
-    # Print the total number of articles scraped after processing all sitemaps
-    print(f"Scraping completed. Total articles scraped: {total_article_counter}")
+    return {
+        'articles': total_article_counter - resumed_article_counter,  # Scraped by this run
+        'total_articles': total_article_counter,
+        'elapsed': time.monotonic() - started_at,
+        'latency': latency,
+        'status_counts': http_client.status_counts(),
+        'metrics': metrics.summary()
+    }
 
 
 if __name__ == "__main__":
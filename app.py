@@ -1,7 +1,9 @@
-from datetime import datetime  # For handling dates and times
+from datetime import datetime, timedelta  # For handling dates and times
 from flask import Flask, jsonify, render_template, request  # For creating the Flask app and returning JSON responses
 from pymongo import MongoClient  # For connecting to MongoDB
 
+from data_storage_analysis.indexes import ensure_indexes  # For creating the indexes the routes rely on
+
 # Initialize Flask app
 app = Flask(__name__, template_folder='data_visualization/templates', static_folder='data_visualization/static')
 
@@ -10,6 +12,19 @@ client = MongoClient('mongodb://localhost:27017/')
 db = client['Almayadeen']
 collection = db['articles']
 
+# Near-duplicates (republished, lightly edited versions of a story) point to their original through 'duplicate_of',
+# they are left out of the counts so a story republished several times is only counted once
+UNIQUE_ARTICLES = {"$match": {"duplicate_of": None}}
+
+
+def month_bounds(year, month):
+    """
+    Returns the first instant (UTC) of a month and of the next month, to range-match the indexed 'published_at' date.
+    """
+    start_date = datetime(year, month, 1)
+    end_date = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start_date, end_date
+
 # Define the routes for the dashboard and the API endpoints
 @app.route('/')
 def dashboard():
@@ -100,22 +115,14 @@ def sentiment_trends():
     """
     # Define the pipeline to aggregate sentiment trends by month
     pipeline = [
-        # Stage 1: Convert the string date (published_time) to a date object
-        {
-            "$addFields": {
-                "published_date": {
-                    "$dateFromString": {
-                        "dateString": "$published_time"
-                    }
-                }
-            }
-        },
-        # Stage 2: Group by month, year, and sentiment (or other fields)
+        # Stage 0: Leave the near-duplicates out of the counts
+        UNIQUE_ARTICLES,
+        # Stage 1: Group by month, year (stored with the article), and sentiment (or other fields)
         {
             "$group": {
                 "_id": {
-                    "month": {"$month": "$published_date"},
-                    "year": {"$year": "$published_date"},
+                    "month": "$month",
+                    "year": "$year",
                     "sentiment": "$sentiment"
                 },
                 "count": {"$sum": 1}
@@ -148,28 +155,21 @@ def keyword_trends():
     year = request.args.get('year', type=int)
     keyword = request.args.get('keyword', None)  # Optional keyword filter
 
+    # Without a valid month and year no article matches
+    if not (year and month and 1 <= month <= 12):
+        result = []
+        if request.args.get('format') == 'json':
+            return jsonify(result)
+        return render_template('visualizations/keyword_trends.html', data=result)
+
+    start_date, end_date = month_bounds(year, month)
+
     # Define the pipeline to aggregate keyword trends
     pipeline = [
-        { "$unwind": "$keywords" },
-        {
-            "$addFields": {
-                "published_date": {
-                    "$dateFromString": {
-                        "dateString": "$published_time"
-                    }
-                }
-            }
-        },
-        {
-            "$match": {
-                "$expr": {
-                    "$and": [
-                        { "$eq": [{ "$month": "$published_date" }, month] },
-                        { "$eq": [{ "$year": "$published_date" }, year] }
-                    ]
-                }
-            }
-        }
+        # Stage 0: Leave the near-duplicates out of the counts
+        UNIQUE_ARTICLES,
+        # Stage 1: Match the articles published in the month (a range on the indexed 'published_at' date)
+        {"$match": {"published_at": {"$gte": start_date, "$lt": end_date}}},
     ]
 
     # Add keyword filter if provided
@@ -180,12 +180,22 @@ def keyword_trends():
             }
         })
 
+    pipeline.append({ "$unwind": "$keywords" })
+
+    # Keep only the matching keyword of the unwound keywords
+    if keyword:
+        pipeline.append({
+            "$match": {
+                "keywords": keyword
+            }
+        })
+
     # Group by keyword and count occurrences
     pipeline.append({
         "$group": {
             "_id": {
-                "month": { "$month": "$published_date" },
-                "year": { "$year": "$published_date" },
+                "month": "$month",
+                "year": "$year",
                 "keyword": "$keywords"
             },
             "count": { "$sum": 1 }
@@ -285,6 +295,8 @@ def top_keywords():
     """
     # Define the aggregation pipeline
     pipeline = [
+        # Stage 0: Leave the near-duplicates out of the counts
+        UNIQUE_ARTICLES,
         # Stage 1: Unwind the 'keywords' array, creating a document for each keyword
         {"$unwind": "$keywords"},
 
@@ -332,6 +344,8 @@ def top_authors():
     """
     # Define the aggregation pipeline
     pipeline = [
+        # Stage 0: Leave the near-duplicates out of the counts
+        UNIQUE_ARTICLES,
         # Stage 1: Group documents by the 'author' field and count the number of articles for each author
         {
             "$group": {
@@ -378,17 +392,15 @@ def articles_by_date():
     """
     # Define the aggregation pipeline
     pipeline = [
-        # Stage 1: Convert the 'published_time' to a date string in the format YYYY-MM-DD
+        # Stage 0: Leave the near-duplicates out of the counts
+        UNIQUE_ARTICLES,
+        # Stage 1: Group by the publication date ('published_at') as a string in the format YYYY-MM-DD
         {
             "$group": {
                 "_id": {
                     "$dateToString": {
                         "format": "%Y-%m-%d",  # Format the date as YYYY-MM-DD
-                        "date": {
-                            "$dateFromString": {
-                                "dateString": "$published_time"  # Convert the 'published_time' string to a date object
-                            }
-                        }
+                        "date": "$published_at"
                     }
                 },
                 "count": {"$sum": 1}  # Count the number of articles for each date
@@ -431,6 +443,8 @@ def articles_by_word_count():
     """
     # Define the aggregation pipeline
     pipeline = [
+        # Stage 0: Leave the near-duplicates out of the counts
+        UNIQUE_ARTICLES,
         # Stage 1: Group by 'word_count' and count the number of articles for each word count
         {
             "$group": {
@@ -475,6 +489,8 @@ def articles_by_language():
     """
     # Define the aggregation pipeline
     pipeline = [
+        # Stage 0: Leave the near-duplicates out of the counts
+        UNIQUE_ARTICLES,
         # Stage 1: Group by the 'lang' field and count the number of articles for each language
         {
             "$group": {
@@ -514,6 +530,8 @@ def articles_by_classes():
     """
     # Define the aggregation pipeline
     pipeline = [
+        # Stage 0: Leave the near-duplicates out of the counts
+        UNIQUE_ARTICLES,
         # Stage 1: Unwind the 'classes' array, creating a document for each class
         {"$unwind": "$classes"},
 
@@ -564,8 +582,8 @@ def recent_articles():
     # Define the aggregation pipeline
     pipeline = [
 
-        # Stage 1: Sort the articles by 'published_time' in descending order
-        {"$sort": {"published_time": -1}},
+        # Stage 1: Sort the articles by publication date ('published_at', indexed) in descending order
+        {"$sort": {"published_at": -1}},
 
         # Stage 2: Limit the result to the top 10 most recent articles
         {"$limit": 10},
@@ -684,6 +702,8 @@ def top_classes():
     """
     # Define the aggregation pipeline
     pipeline = [
+        # Stage 0: Leave the near-duplicates out of the counts
+        UNIQUE_ARTICLES,
         # Stage 1: Unwind the 'classes' array, creating a document for each class
         {"$unwind": "$classes"},
 
@@ -784,8 +804,8 @@ def articles_with_video():
     """
     # Define the aggregation pipeline
     pipeline = [
-        # Stage 1: Match documents where 'video_duration' is not null
-        {"$match": {"video_duration": {"$ne": None}}},
+        # Stage 1: Match documents with a 'video_duration' (a string, so the partial index on it is used)
+        {"$match": {"video_duration": {"$type": "string"}}},
 
         # Stage 2: Project the results to include necessary fields (e.g., title)
         {
@@ -829,11 +849,13 @@ def articles_by_year():
     if year:
         # Define the aggregation pipeline
         pipeline = [
+            # Stage 0: Leave the near-duplicates out of the counts
+            UNIQUE_ARTICLES,
             # Stage 1: Match documents published in the specified year
             {"$match": {
-                "published_time": {
-                    "$gte": f"{year}-01-01T00:00:00Z",
-                    "$lt": f"{year}-12-31T23:59:59Z"
+                "published_at": {
+                    "$gte": datetime(year, 1, 1),
+                    "$lt": datetime(year + 1, 1, 1)
                 }
             }},
 
@@ -937,6 +959,8 @@ def articles_by_keyword_count():
     """
     # Define the aggregation pipeline
     pipeline = [
+        # Stage 0: Leave the near-duplicates out of the counts
+        UNIQUE_ARTICLES,
         # Stage 1: Calculate the number of keywords for each document
         {
             "$addFields": {
@@ -985,8 +1009,8 @@ def articles_with_thumbnail():
     """
     # Define the aggregation pipeline
     pipeline = [
-        # Stage 1: Match documents where 'thumbnail' is not null
-        {"$match": {"thumbnail": {"$ne": None}}},
+        # Stage 1: Match documents with a 'thumbnail' (a string, so the partial index on it is used)
+        {"$match": {"thumbnail": {"$type": "string"}}},
 
         # Stage 2: Project the results to include necessary fields (e.g., title, thumbnail, etc.)
         {
@@ -1019,8 +1043,8 @@ def articles_updated_after_publication():
     """
     # Define the aggregation pipeline
     pipeline = [
-        # Stage 1: Match documents where 'last_updated' is greater than 'published_time'
-        {"$match": {"last_updated": {"$gt": "$published_time"}}},
+        # Stage 1: Match documents where the update date is after the publication date
+        {"$match": {"$expr": {"$gt": ["$updated_at", "$published_at"]}}},
 
         # Stage 2: Project the results to include necessary fields (e.g., title)
         {
@@ -1104,20 +1128,17 @@ def popular_keywords_last_x_days():
         return jsonify({"error": "Invalid number of days. Please provide a valid integer."})
 
     if days:
-        from datetime import datetime, timedelta
+        from datetime import datetime, timedelta, timezone
 
-        # Calculate the date X days ago
-        start_date = datetime.now() - timedelta(days=int(days))
+        # Calculate the date X days ago (the dates are stored in UTC)
+        start_date = datetime.now(timezone.utc) - timedelta(days=int(days))
 
         # Define the aggregation pipeline
         pipeline = [
-            # Stage 1: Convert 'published_time' to a date and match documents published in the last X days
-            {
-                "$match": {
-                    "$expr": {
-                        "$gte": [{"$dateFromString": {"dateString": "$published_time"}}, start_date]}
-                }
-            },
+            # Stage 0: Leave the near-duplicates out of the counts
+            UNIQUE_ARTICLES,
+            # Stage 1: Match documents published in the last X days
+            {"$match": {"published_at": {"$gte": start_date}}},
 
             # Stage 2: Unwind the 'keywords' array, creating a document for each keyword
             {"$unwind": "$keywords"},
@@ -1180,26 +1201,15 @@ def articles_by_month():
         month = int(month)
 
         # Define the start and end dates for the month
-        start_date = datetime(year, month, 1)
-        if month == 12:
-            end_date = datetime(year + 1, 1, 1)
-        else:
-            end_date = datetime(year, month + 1, 1)
+        start_date, end_date = month_bounds(year, month)
 
         # Define the aggregation pipeline
         pipeline = [
-            {
-                '$addFields': {
-                    'published_time_date': {
-                        '$dateFromString': {
-                            'dateString': '$published_time'
-                        }
-                    }
-                }
-            },
+            # Stage 0: Leave the near-duplicates out of the counts
+            UNIQUE_ARTICLES,
             {
                 '$match': {
-                    'published_time_date': {
+                    'published_at': {
                         '$gte': start_date,
                         '$lt': end_date
                     }
@@ -1208,12 +1218,8 @@ def articles_by_month():
             {
                 '$group': {
                     '_id': {
-                        'year': {
-                            '$year': '$published_time_date'
-                        },
-                        'month': {
-                            '$month': '$published_time_date'
-                        }
+                        'year': '$year',
+                        'month': '$month'
                     },
                     'count': {
                         '$sum': 1
@@ -1265,6 +1271,8 @@ def articles_by_word_count_range():
     if min and max:
         # Define the aggregation pipeline
         pipeline = [
+            # Stage 0: Leave the near-duplicates out of the counts
+            UNIQUE_ARTICLES,
             # Stage 1: Convert 'word_count' from string to integer
             {
                 "$addFields": {
@@ -1370,15 +1378,18 @@ def articles_by_specific_date():
 
     # If the date is valid, proceed
     if specific_date:
-        # The date comes as "YYYY-MM-DD", so we match the start of the published_time string
+        # The date comes as "YYYY-MM-DD", the articles published that day (UTC) are matched on 'published_at'
         date_str = specific_date.strftime("%Y-%m-%d")
+        next_date = specific_date + timedelta(days=1)
 
         # Define the aggregation pipeline to match articles by date and count them
         pipeline = [
+            # Stage 0: Leave the near-duplicates out of the counts
+            UNIQUE_ARTICLES,
             {"$match": {
-                "published_time": {
-                    "$gte": f"{date_str}T00:00:00",  # Start of the specific date
-                    "$lt": f"{date_str}T23:59:59"  # End of the specific date
+                "published_at": {
+                    "$gte": specific_date,  # Start of the specific date
+                    "$lt": next_date  # Start of the next date
                 }
             }},
             {"$group": {
@@ -1428,6 +1439,8 @@ def articles_containing_text():
     if text:
         # Define the aggregation pipeline
         pipeline = [
+            # Stage 0: Leave the near-duplicates out of the counts
+            UNIQUE_ARTICLES,
             # Stage 1: Match documents where 'full_text' contains the specified text
             {"$match": {"full_text": {"$regex": text, "$options": "i"}}},
 
@@ -1504,6 +1517,8 @@ def articles_grouped_by_coverage():
     """
     # Define the aggregation pipeline
     pipeline = [
+        # Stage 0: Leave the near-duplicates out of the counts
+        UNIQUE_ARTICLES,
         # Stage 1: Unwind the 'classes' array to create a document for each class
         {"$unwind": "$classes"},
 
@@ -1558,24 +1573,17 @@ def articles_last_x_hours():
     else:
         return "Missing 'hours' parameter.", 400
 
-    from datetime import datetime, timedelta
+    from datetime import datetime, timedelta, timezone
 
-    # Calculate the date X hours ago
-    start_date = datetime.now() - timedelta(hours=hours)
+    # Calculate the date X hours ago (the dates are stored in UTC)
+    start_date = datetime.now(timezone.utc) - timedelta(hours=hours)
 
     # Define the aggregation pipeline
     pipeline = [
-        # Stage 1: Convert 'published_time' to date and match documents within the time range
-        {
-            "$addFields": {
-                "published_time_date": {
-                    "$dateFromString": {"dateString": "$published_time"}
-                }
-            }
-        },
+        # Stage 1: Match documents published within the time range
         {
             "$match": {
-                "published_time_date": {"$gte": start_date}
+                "published_at": {"$gte": start_date}
             }
         },
 
@@ -1608,6 +1616,8 @@ def articles_by_title_length():
     """
     # Define the aggregation pipeline
     pipeline = [
+        # Stage 0: Leave the near-duplicates out of the counts
+        UNIQUE_ARTICLES,
         # Stage 1: Add a field for the length of the title
         {
             "$addFields": {
@@ -1662,11 +1672,11 @@ def most_updated_articles():
             "$addFields": {
                 "update_count": {
                     "$cond": {
-                        "if": {"$ne": ["$last_updated", "$published_time"]},
+                        "if": {"$ne": ["$updated_at", "$published_at"]},
                         "then": {
                             "$ceil": {
                                 "$divide": [
-                                    {"$subtract": [{"$toDate": "$last_updated"}, {"$toDate": "$published_time"}]},
+                                    {"$subtract": ["$updated_at", "$published_at"]},
                                     1000 * 60 * 60  # Divide by milliseconds in an hour
                                 ]
                             }
@@ -1703,4 +1713,6 @@ def most_updated_articles():
     return render_template('visualizations/most_updated_articles.html', data=result)
 
 if __name__ == '__main__':
+    # Create the indexes that are missing (the existing ones are left as they are)
+    ensure_indexes(collection)
     app.run(debug=True)
@@ -1,53 +1,76 @@
+import argparse  # To read the settings from the command line
+
 from pymongo import MongoClient
-from camel_tools.ner import NERecognizer
-from camel_tools.tokenizers.word import simple_word_tokenize
 
-# Connect to MongoDB
-client = MongoClient('mongodb://localhost:27017/')  # Connect to MongoDB
-db = client['Almayadeen']  # Select the 'Almayadeen' database
-collection = db['articles']  # Select the 'articles' collection
+from bulk_writer import BulkWriter  # To write the entities in the background while the model runs
+from enrichment_state import run_stage, stage_fields  # To only process the new and changed articles
+from ner_engine import NEREngine  # To extract the entities of many articles per call to the model
+
+STAGE = 'entities'
 
-# Load the pre-trained Named Entity Recognizer (NER)
-ner = NERecognizer.pretrained()
 
-# Function to extract named entities from Arabic text
-def extract_entities(full_text):
+def store_entities(writer, engine, chunk):
     """
-    Extract named entities from a given Arabic text.
-    Returns a dictionary with recognized entities categorized by type.
+    Extracts the named entities of a chunk of articles and buffers them in the writer.
+
+    :param writer: The BulkWriter of the articles collection.
+    :param engine: The NEREngine.
+    :param chunk: The article documents (with their full_text).
+    :return: The number of articles updated.
     """
-    tokens = simple_word_tokenize(full_text)  # Tokenize the text
-    entity_predictions = ner.predict([tokens])  # Predict expects a list of tokenized sequences
-    entities = entity_predictions[0]  # Flatten the predicted entities list
-
-    # Structure the entities by type dynamically
-    entity_dict = {}
-    for token, tag in zip(tokens, entities):
-        if tag.startswith('B-') or tag.startswith('I-'):  # Only named entities
-            entity_type = tag[2:]  # Extract entity type (e.g., ORG, PERSON, LOCATION)
-            entity_dict.setdefault(entity_type, []).append(token)
-
-    return entity_dict
-
-# Fetch all articles with cursor handling and batch size
-articles = collection.find(no_cursor_timeout=True).batch_size(100)  # Fetch articles with batch size
-
-try:
-    for article in articles:
-        try:
-            content = article.get('full_text', '').strip()  # Get the full text of the article
-            if not content:  # Skip empty articles
-                continue
-
-            local_entities = extract_entities(content)  # Extract entities from the article's text
-
-            if local_entities:  # Only update if entities were found
-                collection.update_one(
-                    {'_id': article['_id']},
-                    {'$set': {'entities': local_entities}}  # Set the 'entities' field
-                )
-                print(f'Updated article {article["_id"]} with entities: {local_entities}')
-        except Exception as e:
-            print(f"Error processing article {article['_id']}: {str(e)}")  # Log the error
-finally:
-    articles.close()  # Ensure cursor is closed even if an error occurs
\ No newline at end of file
+    contents = [(article.get('full_text') or '').strip() for article in chunk]  # Get the full text of the articles
+    try:
+        chunk_entities = engine.extract(contents)  # Extract entities from the articles' texts
+    except Exception as e:
+        # One article the model fails on must not lose the others: extract them one by one
+        print(f"Error processing a chunk of {len(chunk)} articles ({str(e)}), processing them one by one")
+        chunk_entities = []
+        for article, content in zip(chunk, contents):
+            try:
+                chunk_entities.extend(engine.extract([content]))
+            except Exception as e:
+                print(f"Error processing article {article['_id']}: {str(e)}")  # Log the error
+                chunk_entities.append(None)  # Not marked as processed, so the next run tries it again
+
+    updated = 0
+    for article, local_entities in zip(chunk, chunk_entities):
+        if local_entities is None:
+            continue
+        # Articles without entities are stored too (an empty 'entities'), so they are not selected again until their
+        # text changes
+        writer.update(article['_id'], {'entities': local_entities,  # Set the 'entities' field
+                                       **stage_fields(STAGE, engine.version, article)})
+        updated += 1
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add the named entities of the new and changed articles.")
+    parser.add_argument('--mongo-uri', default="mongodb://localhost:27017/", help="MongoDB connection string.")
+    parser.add_argument('--batch-size', type=int, default=32, help="Number of sentence windows predicted at a time.")
+    parser.add_argument('--chunk-size', type=int, default=64,
+                        help="Number of articles whose windows are batched together in one call to the model.")
+    parser.add_argument('--max-window-tokens', type=int, default=200,
+                        help="Maximum number of tokens of a window (longer sentences are split).")
+    parser.add_argument('--write-batch-size', type=int, default=500, help="Number of updates of a bulk write.")
+    parser.add_argument('--restart', action='store_true',
+                        help="Ignore the checkpoint of an interrupted run and start from the first article.")
+    args = parser.parse_args()
+
+    # Connect to MongoDB
+    client = MongoClient(args.mongo_uri)  # Connect to MongoDB
+    db = client['Almayadeen']  # Select the 'Almayadeen' database
+    collection = db['articles']  # Select the 'articles' collection
+
+    # Load the pre-trained Named Entity Recognizer (NER)
+    engine = NEREngine(batch_size=args.batch_size, max_window_tokens=args.max_window_tokens)
+
+    def report(processed, elapsed):
+        print(f'Processed {processed} articles ({processed / elapsed:.1f}/sec, '
+              f'{engine.tokens_per_second:.0f} tokens/sec; {writer.latency_report()})')
+
+    # Only the articles never processed, processed with another model version or whose text changed are fetched
+    with BulkWriter(collection, batch_size=args.write_batch_size) as writer:
+        processed = run_stage(collection, STAGE, engine, store_entities, writer, args.chunk_size, args.restart, report)
+    print(f'Processed {processed} articles, {engine.tokens} tokens at {engine.tokens_per_second:.0f} tokens/sec, '
+          f'{writer.latency_report()}')
@@ -1,50 +1,72 @@
-from transformers import pipeline
+import argparse  # To read the settings from the command line
+import time  # To measure the throughput
+
 from pymongo import MongoClient
 
-# Connect to MongoDB
-client = MongoClient('mongodb://localhost:27017/')
-db = client['Almayadeen']
-collection = db['articles']
-
-# Load the sentiment analysis pipeline using the CAMeLBERT-DA SA model
-sa_pipeline = pipeline('text-classification', model='CAMeL-Lab/bert-base-arabic-camelbert-da-sentiment')
-
-# Function to analyze sentiment using CAMeLBERT-DA and return the sentiment and score
-def analyze_sentiment_camelbert(full_text):
-    try:
-        # Use the pipeline to get the sentiment analysis with truncation
-        results = sa_pipeline(full_text, truncation=True, padding=True, max_length=512)
-
-        # Extract the label and score
-        sentiment_label = results[0]['label']
-        sentiment_score = results[0]['score']
-
-        sentiment_data = {
-            'sentiment': sentiment_label,
-            'sentiment_score': float(sentiment_score)
-        }
-        return sentiment_data
-    except Exception as e:
-        print(f"Error analyzing sentiment: {e}")
-        return None
-
-# Fetch all articles and update sentiment scores
-try:
-    articles = collection.find()
-    for article in articles:
-        content = article.get('full_text', '')  # Get the full text of the article
+from bulk_writer import BulkWriter  # To write the scores in the background while the model runs
+from enrichment_state import run_stage, stage_fields  # To only score the new and changed articles
+from sentiment_engine import SentimentEngine  # To score the sentiment of many articles per batch
+
+STAGE = 'sentiment'
+
+
+def store_sentiments(writer, engine, chunk):
+    """
+    Scores the sentiment of a chunk of articles and buffers the scores in the writer.
+
+    :param writer: The BulkWriter of the articles collection.
+    :param engine: The SentimentEngine.
+    :param chunk: The article documents (with their full_text).
+    :return: The number of articles scored.
+    """
+    scored = []
+    for article in chunk:
+        content = article.get('full_text') or ''  # Get the full text of the article
         if content.strip():  # Check if full_text is not empty
-            sentiment_data = analyze_sentiment_camelbert(content)  # Analyze the sentiment of the article
-            if sentiment_data:
-                # Directly update the document with new sentiment data, overwriting the old value
-                collection.update_one(
-                    {'_id': article['_id']},
-                    {'$set': sentiment_data}
-                )
-                print(f'Updated article {article["_id"]} with sentiment: {sentiment_data}')
-            else:
-                print(f"No sentiment data returned for article {article['_id']}")
+            scored.append(article)
         else:
             print(f"Empty content for article {article['_id']}")
-except Exception as e:
-    print(f"Error processing articles: {e}")
+    sentiments = engine.score([article['full_text'] for article in scored]) if scored else []
+    results = {article['_id']: sentiment_data for article, sentiment_data in zip(scored, sentiments)}
+
+    # Directly update the documents with new sentiment data, overwriting the old values; the empty articles are only
+    # marked as processed, so they are not selected again until their text changes
+    for article in chunk:
+        writer.update(article['_id'], {**results.get(article['_id'], {}),
+                                       **stage_fields(STAGE, engine.version, article)})
+    return len(scored)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add the sentiment and sentiment score of the new and changed "
+                                                 "articles.")
+    parser.add_argument('--mongo-uri', default="mongodb://localhost:27017/", help="MongoDB connection string.")
+    parser.add_argument('--batch-size', type=int, default=16, help="Number of articles scored at a time.")
+    parser.add_argument('--chunk-size', type=int, default=256,
+                        help="Number of articles read from the cursor and grouped by length at a time.")
+    parser.add_argument('--write-batch-size', type=int, default=500, help="Number of updates of a bulk write.")
+    parser.add_argument('--restart', action='store_true',
+                        help="Ignore the checkpoint of an interrupted run and start from the first article.")
+    args = parser.parse_args()
+
+    # Connect to MongoDB
+    client = MongoClient(args.mongo_uri)
+    db = client['Almayadeen']
+    collection = db['articles']
+
+    # Load the CAMeLBERT-DA sentiment analysis model
+    engine = SentimentEngine(batch_size=args.batch_size)
+
+    def report(processed, elapsed):
+        latencies = sorted(engine.batch_seconds)
+        if latencies:
+            print(f'Processed {processed} articles ({processed / elapsed:.1f} docs/sec), '
+                  f'batch latency p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, '
+                  f'max {latencies[-1] * 1000:.0f} ms; {writer.latency_report()}')
+
+    started_at = time.monotonic()
+    with BulkWriter(collection, batch_size=args.write_batch_size) as writer:
+        count = run_stage(collection, STAGE, engine, store_sentiments, writer, args.chunk_size, args.restart, report)
+    elapsed = time.monotonic() - started_at
+    print(f'Processed the sentiment of {count} articles in {elapsed:.1f}s '
+          f'({count / elapsed if elapsed else 0.0:.1f} docs/sec), {writer.latency_report()}')
@@ -0,0 +1,163 @@
+import queue  # For the batches waiting to be written
+import threading  # To write while the model keeps running
+import time  # To measure the latency of every write
+
+from pymongo import UpdateOne
+
+
+class BulkWriter:
+    """
+    Writes the results of an enrichment stage back to the articles collection in the background.
+
+    The updates ($set by _id, with modified_at) are buffered, and the buffer is handed to a writer thread as one
+    unordered bulk_write when it holds batch_size updates or is older than flush_seconds. At most max_pending batches
+    wait for the writer thread: when the database falls behind, update() blocks instead of buffering the whole corpus
+    in memory. The first failed write is raised by the next call of the inference side, and nothing queued after it is
+    written (so a checkpoint never gets ahead of the articles actually stored).
+    """
+
+    def __init__(self, collection, batch_size=500, flush_seconds=2.0, max_pending=4):
+        """
+        :param collection: The articles collection.
+        :param batch_size: The number of updates of a bulk write.
+        :param flush_seconds: The age after which a buffer is written even if it is not full.
+        :param max_pending: The number of batches waiting for the writer thread before update() blocks.
+        """
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.batches = queue.Queue(maxsize=max_pending)
+        self.lock = threading.Lock()  # Guards the buffer, which the writer thread takes when it gets too old
+        self.buffer = []
+        self.buffer_started_at = None
+        self.error = None
+        self.written = 0  # The number of updates written so far
+        self.write_seconds = []  # The latency of every bulk write
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def update(self, article_id, fields):
+        """
+        Buffers the $set of fields on an article.
+
+        :param article_id: The _id of the article.
+        :param fields: The fields to set.
+        """
+        self._raise_error()
+        with self.lock:
+            if not self.buffer:
+                self.buffer_started_at = time.monotonic()
+            self.buffer.append(UpdateOne({'_id': article_id},
+                                         {'$set': fields,
+                                          '$currentDate': {'modified_at': True}}))  # For the Parquet export
+            full = len(self.buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Hands the buffered updates to the writer thread (blocks while max_pending batches are already waiting).
+        """
+        batch = self._take_buffer()
+        if batch:
+            self.batches.put(batch)
+
+    def when_written(self, callback):
+        """
+        Calls a function in the writer thread once all the updates buffered so far are written (not at all if a
+        write fails).
+
+        :param callback: The function, called without arguments.
+        """
+        self.flush()
+        self.batches.put(callback)
+
+    def wait(self):
+        """
+        Blocks until all the updates buffered so far are written, and raises the error of a failed write.
+        """
+        self.flush()
+        self.batches.join()
+        self._raise_error()
+
+    def close(self):
+        """
+        Writes the remaining updates and stops the writer thread.
+        """
+        try:
+            self.wait()
+        finally:
+            self.batches.put(None)
+            self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # The results computed before the error are still written, but a failed write must not hide the error
+            try:
+                self.close()
+            except Exception as e:
+                print(f'Error writing the results: {str(e)}')
+
+    def latency_report(self):
+        """
+        :return: A summary of the writes so far (number of updates and bulk writes, p50 and max latency).
+        """
+        latencies = sorted(self.write_seconds)
+        if not latencies:
+            return 'no writes'
+        return (f'{self.written} updates in {len(latencies)} bulk writes, write latency '
+                f'p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms')
+
+    def _take_buffer(self):
+        with self.lock:
+            batch, self.buffer = self.buffer, []
+            self.buffer_started_at = None
+        return batch
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def _write(self, batch):
+        started_at = time.perf_counter()
+        self.collection.bulk_write(batch, ordered=False)  # Unordered: the server applies the updates in any order
+        self.write_seconds.append(time.perf_counter() - started_at)
+        self.written += len(batch)
+
+    def _run(self):
+        """
+        The loop of the writer thread: writes the batches and calls the callbacks in the order they were queued.
+        """
+        while True:
+            try:
+                item = self.batches.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                # Nothing was queued for a while: write the buffer if it got too old. The lock is held during the
+                # write, so flush() and wait() only return once it is done
+                with self.lock:
+                    if (self.error is None and self.buffer_started_at is not None
+                            and time.monotonic() - self.buffer_started_at >= self.flush_seconds):
+                        batch, self.buffer = self.buffer, []
+                        self.buffer_started_at = None
+                        try:
+                            self._write(batch)
+                        except Exception as e:
+                            self.error = e
+                continue
+            try:
+                if item is None:
+                    return
+                if self.error is None:
+                    if callable(item):
+                        item()
+                    else:
+                        self._write(item)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.batches.task_done()
@@ -0,0 +1,138 @@
+import os  # To locate the scraper modules
+import sys  # To import the text hash shared with the ingest
+import time  # To date the checkpoints
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Data_Collection', 'Python_Scripts'))
+from MongoArticleSinkClass import MongoArticleSink  # To hash the full text the same way as at ingest
+
+# Every enrichment stage (sentiment, entities) records on each article what it processed:
+#   enrichment.<stage> = {'model': the version of the model and settings, 'text_hash': the hash of the full_text}
+# The loader and the scraper's MongoDB sink store the text_hash of every article, so a run only selects the articles
+# the stage never processed, processed with another model version, or whose text changed since. A run also saves a
+# checkpoint (the last _id done) in the 'enrichment_checkpoints' collection, so an interrupted run resumes after it
+# instead of scanning the articles already done again.
+
+
+def stale_query(stage, version):
+    """
+    Returns the filter of the articles a stage has to process.
+
+    :param stage: The name of the stage ('sentiment' or 'entities').
+    :param version: The current model version of the stage.
+    :return: The MongoDB filter.
+    """
+    return {
+        # Near-duplicates (republished versions of a story, see detect_near_duplicates.py) are skipped
+        'duplicate_of': None,
+        '$or': [
+            # Never processed ($ne also matches a missing field), or processed with another model version
+            {f'enrichment.{stage}.model': {'$ne': version}},
+            # Stored before the ingest hashed the texts
+            {'text_hash': {'$exists': False}},
+            # The text changed since it was processed
+            {'$expr': {'$ne': [f'$enrichment.{stage}.text_hash', '$text_hash']}},
+        ],
+    }
+
+
+def stage_fields(stage, version, article):
+    """
+    Returns the fields recording that a stage processed an article (to $set with its results).
+
+    :param stage: The name of the stage.
+    :param version: The model version of the stage.
+    :param article: The article document, with its full_text.
+    :return: The dictionary of fields.
+    """
+    text_hash = MongoArticleSink.text_hash(article.get('full_text'))
+    return {f'enrichment.{stage}': {'model': version, 'text_hash': text_hash}, 'text_hash': text_hash}
+
+
+class Checkpoint:
+    """
+    The progress of a run of a stage: the _id of the last article done, in _id order.
+    """
+
+    def __init__(self, database, stage, version):
+        """
+        :param database: The MongoDB database of the articles.
+        :param stage: The name of the stage.
+        :param version: The model version of the stage (a checkpoint of another version is ignored).
+        """
+        self.collection = database['enrichment_checkpoints']
+        self.stage = stage
+        self.version = version
+
+    def load(self):
+        """
+        :return: The _id of the last article done by an interrupted run, or None to start from the first article.
+        """
+        checkpoint = self.collection.find_one({'_id': self.stage})
+        if checkpoint is None or checkpoint.get('model') != self.version:
+            return None
+        return checkpoint['last_id']
+
+    def save(self, last_id, processed):
+        """
+        Records that the articles up to last_id are done.
+
+        :param last_id: The _id of the last article done.
+        :param processed: The number of articles processed by the run so far.
+        """
+        self.collection.replace_one({'_id': self.stage},
+                                    {'_id': self.stage, 'model': self.version, 'last_id': last_id,
+                                     'processed': processed, 'updated_at': time.time()}, upsert=True)
+
+    def clear(self):
+        """
+        Forgets the checkpoint once the run is complete, so the next run starts from the first article.
+        """
+        self.collection.delete_one({'_id': self.stage})
+
+
+def run_stage(collection, stage, engine, store, writer, chunk_size, restart=False, report=None):
+    """
+    Runs a stage over the articles it has to process, in _id order, a chunk at a time, resuming after the checkpoint
+    of an interrupted run.
+
+    :param collection: The articles collection.
+    :param stage: The name of the stage.
+    :param engine: The engine of the stage (its version attribute is recorded on the articles).
+    :param store: The function that processes a chunk of articles with the engine and buffers the results.
+    :param writer: The BulkWriter of the results.
+    :param chunk_size: The number of articles processed at a time.
+    :param restart: True to ignore the checkpoint and start from the first article.
+    :param report: A function called with the number of articles processed and the elapsed seconds after each chunk.
+    :return: The number of articles processed.
+    """
+    checkpoint = Checkpoint(collection.database, stage, engine.version)
+    last_id = None if restart else checkpoint.load()
+    query = stale_query(stage, engine.version)
+    if last_id is not None:
+        query['_id'] = {'$gt': last_id}
+        print(f'Resuming the {stage} stage after article {last_id}')
+
+    processed = 0
+    started_at = time.monotonic()
+    articles = collection.find(query, {'full_text': 1}, no_cursor_timeout=True).sort('_id', 1).batch_size(chunk_size)
+    try:
+        chunk = []
+        for article in articles:
+            chunk.append(article)
+            if len(chunk) >= chunk_size:
+                store(writer, engine, chunk)
+                processed += len(chunk)
+                # Saved by the writer thread once the results of the chunk are stored, not when they are only buffered
+                writer.when_written(lambda last_id=chunk[-1]['_id'], done=processed: checkpoint.save(last_id, done))
+                chunk = []
+                if report is not None:
+                    report(processed, time.monotonic() - started_at)
+        if chunk:
+            store(writer, engine, chunk)
+            processed += len(chunk)
+        writer.wait()
+    finally:
+        articles.close()
+    # The run is complete, the next one selects the articles to process from the first one
+    checkpoint.clear()
+    return processed
@@ -0,0 +1,247 @@
+import argparse  # To read the settings from the command line
+import multiprocessing  # To run the model in several processes
+import os  # To count the CPU cores
+import queue  # To wait for the results of the workers
+import time  # To measure the throughput
+from collections import deque  # For the shards waiting for a worker
+
+from pymongo import MongoClient
+
+from bulk_writer import BulkWriter  # To write the results in the background while the model runs
+from enrichment_state import stale_query  # To only process the new and changed articles
+
+# Runs an enrichment job (sentiment or entities) over the 'articles' collection in several processes. The articles are
+# cut into shards, ranges of _id, handed to the workers one at a time. Every worker loads its model once, and uses its
+# own share of the CPU cores (torch.set_num_threads), so the workers do not compete for the same cores. A worker that
+# crashes is replaced, and its shard is given to another worker. The updates are $set by _id, so processing a shard
+# again rewrites the same values: a shard is never lost, and running part of it twice does not duplicate anything.
+# Only the articles the job never processed, processed with another model version or whose text changed are sharded
+# (see enrichment_state.py), so running the pool again after an interruption only processes what is left.
+
+# The number of times a shard is started before it is given up (a shard that keeps crashing its worker)
+MAX_ATTEMPTS = 3
+
+
+def shard_ranges(collection, shard_size, query):
+    """
+    Cuts the articles into ranges of _id holding shard_size articles each.
+
+    :param collection: The articles collection.
+    :param shard_size: The number of articles of a shard.
+    :param query: The filter of the articles.
+    :return: The list of (first _id, _id after the last one or None for the last shard).
+    """
+    bounds = []
+    cursor = collection.find(query, {'_id': 1}).sort('_id', 1)
+    for position, article in enumerate(cursor):
+        if position % shard_size == 0:
+            bounds.append(article['_id'])
+    return [(lower, bounds[index + 1] if index + 1 < len(bounds) else None) for index, lower in enumerate(bounds)]
+
+
+def job_version(job, options):
+    """
+    Returns the model version a job records on the articles, without loading its model.
+
+    :param job: 'sentiment' or 'entities'.
+    :param options: The max_window_tokens of the engine.
+    :return: The version (the same as the version attribute of the engine of the workers).
+    """
+    if job == 'sentiment':
+        from sentiment_engine import SentimentEngine
+        return SentimentEngine.version_of()
+    from ner_engine import NEREngine
+    return NEREngine.version_of(options['max_window_tokens'])
+
+
+def load_job(job, options):
+    """
+    Loads the model of a job.
+
+    :param job: 'sentiment' or 'entities'.
+    :param options: The batch_size and max_window_tokens of the engine.
+    :return: The engine and the function that enriches and stores a chunk of articles with it.
+    """
+    if job == 'sentiment':
+        from sentiment_engine import SentimentEngine
+        from add_sentiment_data_field_to_articles import store_sentiments
+        return SentimentEngine(batch_size=options['batch_size']), store_sentiments
+    from ner_engine import NEREngine
+    from add_entities_field_to_articles import store_entities
+    return NEREngine(batch_size=options['batch_size'], max_window_tokens=options['max_window_tokens']), store_entities
+
+
+def process_shard(collection, engine, store, query, lower, upper, chunk_size, write_batch_size):
+    """
+    Enriches the articles of a shard matching the query, a chunk at a time. The shard is only done once all its
+    results are written.
+
+    :return: The number of articles of the shard and the write latency summary.
+    """
+    id_range = {'$gte': lower}
+    if upper is not None:
+        id_range['$lt'] = upper
+    articles = collection.find({**query, '_id': id_range}, {'full_text': 1},
+                               no_cursor_timeout=True).batch_size(chunk_size)
+    count = 0
+    try:
+        with BulkWriter(collection, batch_size=write_batch_size) as writer:
+            chunk = []
+            for article in articles:
+                chunk.append(article)
+                if len(chunk) >= chunk_size:
+                    store(writer, engine, chunk)
+                    count += len(chunk)
+                    chunk = []
+            if chunk:
+                store(writer, engine, chunk)
+                count += len(chunk)
+    finally:
+        articles.close()
+    return count, writer.latency_report()
+
+
+def worker_main(worker_id, job, threads, mongo_uri, options, tasks, results):
+    """
+    The loop of a worker process: loads the model once, then processes the shards it is given until it gets None.
+    """
+    import torch  # Imported in the worker, so its thread settings come first
+
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    engine, store = load_job(job, options)
+    collection = MongoClient(mongo_uri)['Almayadeen']['articles']
+    query = stale_query(job, engine.version)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        shard_index, lower, upper = task
+        started_at = time.monotonic()
+        try:
+            count, writes = process_shard(collection, engine, store, query, lower, upper, options['chunk_size'],
+                                          options['write_batch_size'])
+        except Exception as e:
+            results.put(('error', worker_id, shard_index, str(e)))
+            continue
+        results.put(('done', worker_id, shard_index, count, time.monotonic() - started_at, writes))
+
+
+def run_pool(job, mongo_uri, workers, threads, shard_size, options):
+    """
+    Runs a job over the new and changed articles with a pool of worker processes.
+
+    :param job: 'sentiment' or 'entities'.
+    :param mongo_uri: The MongoDB connection string.
+    :param workers: The number of worker processes.
+    :param threads: The number of torch threads of every worker.
+    :param shard_size: The number of articles of a shard.
+    :param options: The batch_size, chunk_size, max_window_tokens and write_batch_size of the job.
+    :return: The number of articles processed and the list of the shards given up.
+    """
+    collection = MongoClient(mongo_uri)['Almayadeen']['articles']
+    shards = shard_ranges(collection, shard_size, stale_query(job, job_version(job, options)))
+    print(f'{len(shards)} shards of up to {shard_size} articles for {workers} workers of {threads} threads')
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = {}  # worker id -> (process, its task queue)
+    assigned = {}  # worker id -> index of the shard it is processing
+    attempts = [0] * len(shards)
+    pending = deque(range(len(shards)))
+    failed = []
+    next_worker_id = 0
+
+    def start_worker():
+        nonlocal next_worker_id
+        tasks = context.Queue()
+        process = context.Process(target=worker_main, args=(next_worker_id, job, threads, mongo_uri, options, tasks,
+                                                            results), daemon=True)
+        process.start()
+        processes[next_worker_id] = (process, tasks)
+        next_worker_id += 1
+
+    def retry(shard_index, reason):
+        if attempts[shard_index] >= MAX_ATTEMPTS:
+            print(f'Giving up shard {shard_index} after {attempts[shard_index]} attempts: {reason}')
+            failed.append(shards[shard_index])
+        else:
+            print(f'Shard {shard_index} will be processed again: {reason}')
+            pending.appendleft(shard_index)
+
+    for _ in range(min(workers, len(shards))):
+        start_worker()
+
+    processed = 0
+    started_at = time.monotonic()
+    while pending or assigned:
+        # Give a shard to every idle worker
+        for worker_id, (process, tasks) in processes.items():
+            if worker_id not in assigned and pending:
+                shard_index = pending.popleft()
+                attempts[shard_index] += 1
+                assigned[worker_id] = shard_index
+                tasks.put((shard_index, *shards[shard_index]))
+
+        try:
+            message = results.get(timeout=1.0)
+        except queue.Empty:
+            message = None
+        if message is not None:
+            kind, worker_id, shard_index = message[:3]
+            assigned.pop(worker_id, None)
+            if kind == 'done':
+                processed += message[3]
+                elapsed = time.monotonic() - started_at
+                print(f'Shard {shard_index}: {message[3]} articles in {message[4]:.1f}s by worker {worker_id} '
+                      f'({processed} articles, {processed / elapsed:.1f} docs/sec overall; {message[5]})')
+            else:
+                retry(shard_index, message[3])
+
+        # A worker that died (killed, out of memory, crash of the model) is replaced, and its shard handed over
+        for worker_id, (process, tasks) in list(processes.items()):
+            if not process.is_alive():
+                del processes[worker_id]
+                shard_index = assigned.pop(worker_id, None)
+                print(f'Worker {worker_id} died (exit code {process.exitcode})')
+                if shard_index is not None:
+                    retry(shard_index, f'worker {worker_id} died')
+                if pending or assigned:
+                    start_worker()
+
+    for process, tasks in processes.values():
+        tasks.put(None)
+    for process, tasks in processes.values():
+        process.join()
+    return processed, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run an enrichment job over the articles with several processes.")
+    parser.add_argument('job', choices=['sentiment', 'entities'], help="The enrichment job.")
+    parser.add_argument('--mongo-uri', default="mongodb://localhost:27017/", help="MongoDB connection string.")
+    parser.add_argument('--workers', type=int, default=2, help="Number of worker processes (each loads the model).")
+    parser.add_argument('--threads', type=int, default=None,
+                        help="Number of torch threads of every worker (the CPU cores divided by the workers by "
+                             "default).")
+    parser.add_argument('--shard-size', type=int, default=2000, help="Number of articles of a shard.")
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help="Number of articles (sentiment, 16 by default) or windows (entities, 32 by default) "
+                             "predicted at a time.")
+    parser.add_argument('--chunk-size', type=int, default=256, help="Number of articles enriched at a time.")
+    parser.add_argument('--write-batch-size', type=int, default=500, help="Number of updates of a bulk write.")
+    parser.add_argument('--max-window-tokens', type=int, default=200,
+                        help="Maximum number of tokens of a window (entities).")
+    args = parser.parse_args()
+
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+    job_options = {'batch_size': args.batch_size or (16 if args.job == 'sentiment' else 32),
+                   'chunk_size': args.chunk_size, 'max_window_tokens': args.max_window_tokens,
+                   'write_batch_size': args.write_batch_size}
+    run_started = time.monotonic()
+    count, given_up = run_pool(args.job, args.mongo_uri, args.workers, threads, args.shard_size, job_options)
+    run_elapsed = time.monotonic() - run_started
+    print(f'Processed {count} articles in {run_elapsed:.1f}s ({count / run_elapsed if run_elapsed else 0.0:.1f} '
+          f'docs/sec)')
+    if given_up:
+        print(f'{len(given_up)} shards were given up: {given_up}')
@@ -0,0 +1,102 @@
+import re  # To split the articles into sentences
+import time  # To measure the throughput
+from importlib import metadata  # To read the version of camel_tools
+
+from camel_tools.ner import NERecognizer
+from camel_tools.tokenizers.word import simple_word_tokenize
+
+# The end of a sentence: a line break, or whitespace after a full stop, question mark (Latin or Arabic) or ellipsis
+SENTENCE_END = re.compile(r'(?<=[.!?؟…])\s+|\n+')
+
+# Entity types of the tags (B-LOC, I-LOC...), the other tokens are tagged O
+ENTITY_TAG_PREFIXES = ('B-', 'I-')
+
+
+class NEREngine:
+    """
+    Extracts the named entities of many articles at once with the camel_tools NER model.
+
+    Every article is split into sentences, and the sentences longer than max_window_tokens tokens into windows, so the
+    model never gets a whole article as one sequence (it is slow on long sequences and truncates them). The windows of
+    all the articles of a call are sorted by length, so each batch holds windows of about the same length, predicted
+    batch_size windows at a time, and the tags are mapped back to the tokens of their article.
+    """
+
+    def __init__(self, ner=None, batch_size=32, max_window_tokens=200):
+        """
+        :param ner: The NERecognizer (the pretrained camel_tools model by default).
+        :param batch_size: The number of windows predicted at a time.
+        :param max_window_tokens: The maximum number of tokens of a window.
+        """
+        self.ner = ner if ner is not None else NERecognizer.pretrained()
+        self.batch_size = batch_size
+        self.max_window_tokens = max_window_tokens
+        self.version = self.version_of(max_window_tokens)
+        self.tokens = 0  # The number of tokens predicted so far
+        self.seconds = 0.0  # The time spent predicting them
+
+    @staticmethod
+    def version_of(max_window_tokens=200):
+        """
+        Returns the version recorded with the entities (see enrichment_state.py): the articles processed with another
+        camel_tools release or window size are processed again.
+        """
+        try:
+            camel_tools_version = metadata.version('camel-tools')
+        except metadata.PackageNotFoundError:
+            camel_tools_version = 'unknown'
+        return f'camel_tools {camel_tools_version} max_window_tokens={max_window_tokens}'
+
+    def windows(self, text):
+        """
+        Splits a text into windows of tokens, along its sentences.
+
+        :param text: The text of an article.
+        :return: The list of windows, in the order of the text.
+        """
+        windows = []
+        for sentence in SENTENCE_END.split(text):
+            tokens = simple_word_tokenize(sentence)
+            for start in range(0, len(tokens), self.max_window_tokens):
+                windows.append(tokens[start:start + self.max_window_tokens])
+        return windows
+
+    def extract(self, texts):
+        """
+        Extracts the named entities of several articles with one call to the model.
+
+        :param texts: The texts of the articles.
+        :return: For every text, a dictionary mapping each entity type (e.g. LOC, ORG, PERS) to its tokens.
+        """
+        owners = []
+        windows = []
+        for owner, text in enumerate(texts):
+            for window in self.windows(text or ''):
+                owners.append(owner)
+                windows.append(window)
+
+        # Windows of similar lengths are batched together, so little of each batch is padding
+        order = sorted(range(len(windows)), key=lambda index: len(windows[index]))
+        labels = [None] * len(windows)
+        if windows:
+            started_at = time.perf_counter()
+            predictions = self.ner.predict([windows[index] for index in order], batch_size=self.batch_size)
+            self.seconds += time.perf_counter() - started_at
+            self.tokens += sum(len(window) for window in windows)
+            for index, window_labels in zip(order, predictions):
+                labels[index] = window_labels
+
+        # Structure the entities of every article by type, in the order of its text
+        entities = [{} for _ in texts]
+        for owner, window, window_labels in zip(owners, windows, labels):
+            for token, tag in zip(window, window_labels):
+                if tag.startswith(ENTITY_TAG_PREFIXES):  # Only named entities
+                    entities[owner].setdefault(tag[2:], []).append(token)
+        return entities
+
+    @property
+    def tokens_per_second(self):
+        """
+        The number of tokens predicted per second so far.
+        """
+        return self.tokens / self.seconds if self.seconds else 0.0
@@ -0,0 +1,70 @@
+import time  # To measure the latency of every batch
+
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+# The CAMeLBERT-DA sentiment analysis model
+MODEL_NAME = 'CAMeL-Lab/bert-base-arabic-camelbert-da-sentiment'
+
+
+class SentimentEngine:
+    """
+    Scores the sentiment of many articles at once with the CAMeLBERT-DA model (the same labels and scores as the
+    transformers text-classification pipeline, without its one-article-at-a-time calls).
+
+    The articles are tokenized first, then sorted by token length and cut into batches of batch_size, so each batch
+    is padded to the length of its longest article instead of to the longest article of the whole chunk. The model
+    runs under torch.inference_mode (no autograd bookkeeping).
+    """
+
+    def __init__(self, model_name=MODEL_NAME, batch_size=16, max_length=512, device=None):
+        """
+        :param model_name: The name of the model on the Hugging Face hub.
+        :param batch_size: The number of articles scored at a time.
+        :param max_length: The number of tokens an article is truncated to.
+        :param device: The torch device ('cuda' if available, 'cpu' otherwise, by default).
+        """
+        self.device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_name).to(self.device)
+        self.model.eval()
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.version = self.version_of(model_name, max_length)
+        self.batch_seconds = []  # The latency of every batch of the last call to score()
+
+    @staticmethod
+    def version_of(model_name=MODEL_NAME, max_length=512):
+        """
+        Returns the version recorded with the scores (see enrichment_state.py): the articles scored with another model
+        or truncation are scored again.
+        """
+        return f'{model_name} max_length={max_length}'
+
+    def score(self, texts):
+        """
+        Scores the sentiment of several articles.
+
+        :param texts: The texts of the articles.
+        :return: For every text, a dictionary with its 'sentiment' label and its 'sentiment_score'.
+        """
+        encodings = self.tokenizer(texts, truncation=True, max_length=self.max_length)['input_ids']
+        # Articles of similar lengths are batched together, so little of each batch is padding
+        order = sorted(range(len(texts)), key=lambda index: len(encodings[index]))
+        results = [None] * len(texts)
+        self.batch_seconds = []
+        for start in range(0, len(order), self.batch_size):
+            batch_indexes = order[start:start + self.batch_size]
+            started_at = time.perf_counter()
+            batch = self.tokenizer.pad({'input_ids': [encodings[index] for index in batch_indexes]},
+                                       return_tensors='pt').to(self.device)
+            with torch.inference_mode():
+                probabilities = self.model(**batch).logits.softmax(dim=-1)
+            scores, label_ids = probabilities.max(dim=-1)
+            for index, score, label_id in zip(batch_indexes, scores.tolist(), label_ids.tolist()):
+                results[index] = {
+                    'sentiment': self.model.config.id2label[label_id],
+                    'sentiment_score': float(score)
+                }
+            self.batch_seconds.append(time.perf_counter() - started_at)
+        return results
@@ -0,0 +1,60 @@
+import argparse  # To read the settings from the command line
+import os  # To locate the scraper modules
+import sys  # To import the date parsing shared with the scraper
+import time  # To measure the throughput
+
+import pymongo  # To allow us to interact with MongoDB
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Data_Collection', 'Python_Scripts'))
+from MongoArticleSinkClass import MongoArticleSink  # To compute and store the typed dates the same way as at ingest
+
+# Adds the typed dates (published_at, updated_at, year, month and day) to the articles stored before they were added
+# at ingest by data_storage.py and by the scraper's MongoDB sink. The dashboard's date filters only see the articles
+# that have them.
+
+
+def add_date_fields(collection, batch_size, rebuild=False):
+    """
+    Stores the typed dates of every article that has none yet.
+
+    :param collection: The articles collection.
+    :param batch_size: The number of articles updated at a time.
+    :param rebuild: True to compute the dates of every article again.
+    :return: The number of articles updated.
+    """
+    updated = 0
+    started_at = time.monotonic()
+    cursor = collection.find({} if rebuild else {'published_at': {'$exists': False}},
+                             {'published_time': 1, 'last_updated': 1}, no_cursor_timeout=True).batch_size(batch_size)
+    try:
+        batch = []
+        for article in cursor:
+            dates = MongoArticleSink.add_date_fields({'published_time': article.get('published_time'),
+                                                      'last_updated': article.get('last_updated')})
+            del dates['published_time'], dates['last_updated']
+            # A rebuild that computes the same dates leaves modified_at alone
+            batch.append(MongoArticleSink.set_operation({'_id': article['_id']}, dates))
+            if len(batch) >= batch_size:
+                collection.bulk_write(batch, ordered=False)
+                updated += len(batch)
+                batch = []
+                print(f'Updated {updated} articles ({updated / (time.monotonic() - started_at):.0f}/sec)')
+        if batch:
+            collection.bulk_write(batch, ordered=False)
+            updated += len(batch)
+    finally:
+        cursor.close()
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add the typed publication and update dates to the stored articles.")
+    parser.add_argument('--mongo-uri', default="mongodb://localhost:27017/", help="MongoDB connection string.")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Number of articles updated at a time.")
+    parser.add_argument('--rebuild', action='store_true', help="Compute the dates of every article again.")
+    args = parser.parse_args()
+
+    # Connect to the MongoDB
+    client = pymongo.MongoClient(args.mongo_uri)
+    count = add_date_fields(client["Almayadeen"]["articles"], args.batch_size, args.rebuild)
+    print(f'Added the dates of {count} articles Successfully')
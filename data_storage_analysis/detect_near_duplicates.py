@@ -0,0 +1,84 @@
+import argparse  # To read the settings from the command line
+import os  # To locate the scraper modules
+import sys  # To import the near-duplicate detector and the article sink shared with the scraper
+import time  # To measure the throughput
+
+import pymongo  # To allow us to interact with MongoDB
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Data_Collection', 'Python_Scripts'))
+from MongoArticleSinkClass import MongoArticleSink  # To only bump modified_at when the cluster of an article changes
+from NearDuplicateDetectorClass import NearDuplicateDetector  # To mark the republished versions of the same story
+
+# Marks the near-duplicate articles already stored in MongoDB (the new ones are marked when they are inserted by
+# data_storage.py or by the scraper's MongoDB sink).
+
+
+def detect_near_duplicates(collection, batch_size, rebuild=False):
+    """
+    Computes the MinHash signature of every stored article that has none yet, in insertion order, and sets the
+    'duplicate_of' field of the near-duplicates.
+
+    :param collection: The articles collection.
+    :param batch_size: The number of articles compared and updated at a time.
+    :param rebuild: True to compute the signature and cluster of every article again, ignoring the stored ones.
+    :return: The number of articles processed and the number of near-duplicates found.
+    """
+    detector = NearDuplicateDetector(collection)
+
+    processed = 0
+    duplicates = 0
+    started_at = time.monotonic()
+    # The oldest article of a cluster comes first, so it is the one the others point to
+    query = {} if rebuild else {'minhash': {'$exists': False}}
+    cursor = collection.find(query, {'full_text': 1, 'postId': 1, 'url': 1},
+                             no_cursor_timeout=True).sort('_id', 1).batch_size(batch_size)
+    try:
+        batch = []
+        for article in cursor:
+            batch.append(article)
+            if len(batch) >= batch_size:
+                duplicates += store_batch(collection, detector, batch, rebuild)
+                processed += len(batch)
+                batch = []
+                print(f'Processed {processed} articles ({processed / (time.monotonic() - started_at):.0f}/sec), '
+                      f'{duplicates} near-duplicates so far')
+        if batch:
+            duplicates += store_batch(collection, detector, batch, rebuild)
+            processed += len(batch)
+    finally:
+        cursor.close()
+    return processed, duplicates
+
+
+def store_batch(collection, detector, batch, rebuild=False):
+    """
+    Detects the near-duplicates of a batch of articles and stores their signature and cluster. modified_at is only
+    bumped for the articles whose signature or cluster changed, so a rebuild does not make the next Parquet export
+    rewrite every month.
+
+    :param rebuild: True to only compare the batch with the articles before it, whose signatures were computed again
+        by the rebuild (the stored signatures of the later articles may come from other settings).
+    :return: The number of near-duplicates in the batch.
+    """
+    duplicates = detector.assign(batch, {'_id': {'$lt': batch[0]['_id']}} if rebuild else None)
+    collection.bulk_write([
+        MongoArticleSink.set_operation({'_id': article['_id']},
+                                       {'minhash': article['minhash'], 'minhash_bands': article['minhash_bands'],
+                                        'duplicate_of': article['duplicate_of']})
+        for article in batch], ordered=False)
+    return duplicates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mark the near-duplicate articles stored in MongoDB.")
+    parser.add_argument('--mongo-uri', default="mongodb://localhost:27017/", help="MongoDB connection string.")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Number of articles processed at a time.")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="Compute the signatures and clusters of every article again (e.g. after changing the "
+                             "threshold).")
+    args = parser.parse_args()
+
+    # Connect to the MongoDB
+    client = pymongo.MongoClient(args.mongo_uri)
+    count, found = detect_near_duplicates(client["Almayadeen"]["articles"], args.batch_size, args.rebuild)
+    print(f'Marked {found} near-duplicates among {count} articles Successfully')
@@ -0,0 +1,281 @@
+import argparse  # To read the settings from the command line
+import json  # To read and write the state of the last snapshot
+import os  # To create and delete the partition directories
+import time  # To measure the throughput
+from datetime import datetime  # To read the date of the last snapshot
+
+import pymongo  # To allow us to interact with MongoDB
+
+try:
+    import pyarrow as pa  # To build the columnar tables (optional, only needed by the export)
+    import pyarrow.parquet as pq  # To write the Parquet files
+except ImportError:
+    pa = None
+    pq = None
+
+# Exports the 'articles' collection to Parquet files partitioned by year and month of publication, in the Hive layout
+# (articles_parquet/year=2024/month=8/part-0.parquet), so the analyses run on columnar files instead of on the MongoDB
+# that serves the dashboard:
+#   pyarrow.dataset.dataset('articles_parquet', partitioning='hive').to_table(filter=...)
+# Each export only rewrites the months with articles changed (modified_at) since the previous export, and the months
+# whose number of articles changed (an article moved to another month, e.g. when it got its publication date, or was
+# deleted), and deletes the months left without articles. The time of the export and the number of articles of every
+# month are recorded in the _snapshot.json file of the output directory.
+
+# Directory where the Parquet files are saved
+DEFAULT_OUTPUT_DIRECTORY = "articles_parquet"
+
+# Number of articles converted and written at a time
+BATCH_SIZE = 5000
+
+# The name Hive (and pyarrow) give to the partition of the articles without a publication date
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# The state of the last snapshot, in the output directory
+SNAPSHOT_FILE = "_snapshot.json"
+
+ENTITY_TYPES = ['PERS', 'LOC', 'ORG', 'MISC']
+
+# The columns of the files, the same in every file whatever the articles hold (year and month are the partition keys,
+# stored in the directory names)
+SCHEMA = pa.schema([
+    ('_id', pa.string()),
+    ('postId', pa.string()),
+    ('url', pa.string()),
+    ('title', pa.string()),
+    ('description', pa.string()),
+    ('author', pa.string()),
+    ('lang', pa.string()),
+    ('keywords', pa.list_(pa.string())),
+    ('classes', pa.list_(pa.struct([('key', pa.string()), ('mapping', pa.string()), ('value', pa.string())]))),
+    ('thumbnail', pa.string()),
+    ('video_duration', pa.string()),
+    ('word_count', pa.int32()),
+    ('published_time', pa.string()),
+    ('last_updated', pa.string()),
+    ('published_at', pa.timestamp('ms', tz='UTC')),
+    ('updated_at', pa.timestamp('ms', tz='UTC')),
+    ('day', pa.int8()),
+    ('full_text', pa.string()),
+    ('sentiment', pa.string()),
+    ('sentiment_score', pa.float64()),
+    ('entities', pa.struct([(entity_type, pa.list_(pa.string())) for entity_type in ENTITY_TYPES])),
+    ('duplicate_of', pa.string()),
+    ('modified_at', pa.timestamp('ms', tz='UTC')),
+]) if pa is not None else None
+
+
+def text(value):
+    """
+    Returns a value as a string column value (None stays None).
+    """
+    return None if value is None else str(value)
+
+
+def integer(value):
+    """
+    Returns a value (an int, or a string like the scraped word counts) as an integer column value, or None.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_row(document):
+    """
+    Converts an article document to a row of the schema: every column is present, with the type of the schema.
+
+    :param document: The article document.
+    :return: The row dictionary.
+    """
+    keywords = document.get('keywords') or []
+    if isinstance(keywords, str):
+        keywords = [keyword.strip() for keyword in keywords.split(',')]
+    entities = document.get('entities') or {}
+    sentiment_score = document.get('sentiment_score')
+    return {
+        '_id': text(document.get('_id')),
+        'postId': text(document.get('postId')),
+        'url': text(document.get('url')),
+        'title': text(document.get('title')),
+        'description': text(document.get('description')),
+        'author': text(document.get('author')),
+        'lang': text(document.get('lang')),
+        'keywords': [text(keyword) for keyword in keywords],
+        'classes': [{'key': text(item.get('key')), 'mapping': text(item.get('mapping')),
+                     'value': text(item.get('value'))} for item in document.get('classes') or []],
+        'thumbnail': text(document.get('thumbnail')),
+        'video_duration': text(document.get('video_duration')),
+        'word_count': integer(document.get('word_count')),
+        'published_time': text(document.get('published_time')),
+        'last_updated': text(document.get('last_updated')),
+        'published_at': document.get('published_at'),
+        'updated_at': document.get('updated_at'),
+        'day': integer(document.get('day')),
+        'full_text': text(document.get('full_text')),
+        'sentiment': text(document.get('sentiment')),
+        'sentiment_score': None if sentiment_score is None else float(sentiment_score),
+        'entities': {entity_type: [text(entity) for entity in entities.get(entity_type) or []]
+                     for entity_type in ENTITY_TYPES},
+        'duplicate_of': text(document.get('duplicate_of')),
+        'modified_at': document.get('modified_at'),
+    }
+
+
+def partition_name(year, month):
+    """
+    Returns the relative directory of a partition (e.g. year=2024/month=8), its key in the snapshot file.
+    """
+    return (f'year={NULL_PARTITION if year is None else year}/'
+            f'month={NULL_PARTITION if month is None else month}')
+
+
+def partition_path(output_directory, year, month):
+    """
+    Returns the path of the file of a partition.
+    """
+    return os.path.join(output_directory, *partition_name(year, month).split('/'), 'part-0.parquet')
+
+
+def stored_partitions(output_directory):
+    """
+    Lists the partitions of a snapshot that have a file.
+
+    :param output_directory: The directory of the snapshot.
+    :return: The set of partition names.
+    """
+    names = set()
+    for year_directory in os.listdir(output_directory):
+        if not year_directory.startswith('year=') or not os.path.isdir(os.path.join(output_directory, year_directory)):
+            continue
+        for month_directory in os.listdir(os.path.join(output_directory, year_directory)):
+            if os.path.exists(os.path.join(output_directory, year_directory, month_directory, 'part-0.parquet')):
+                names.add(f'{year_directory}/{month_directory}')
+    return names
+
+
+def delete_partition(output_directory, name):
+    """
+    Deletes the file of a partition, and its directories once they are empty.
+    """
+    month_directory = os.path.join(output_directory, *name.split('/'))
+    os.remove(os.path.join(month_directory, 'part-0.parquet'))
+    for directory in (month_directory, os.path.dirname(month_directory)):
+        if not os.listdir(directory):
+            os.rmdir(directory)
+
+
+def write_partition(collection, output_directory, year, month, batch_size=BATCH_SIZE):
+    """
+    Writes all the articles of a month to its Parquet file, replacing the previous file at once when it is complete.
+
+    :param collection: The articles collection.
+    :param output_directory: The directory of the snapshot.
+    :param year: The year of publication of the articles (None for the articles without a publication date).
+    :param month: The month of publication of the articles.
+    :param batch_size: The number of articles converted and written at a time.
+    :return: The number of articles written.
+    """
+    path = partition_path(output_directory, year, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = path + '.part'
+
+    count = 0
+    cursor = collection.find({'year': year, 'month': month}, {'minhash': 0, 'minhash_bands': 0},
+                             no_cursor_timeout=True).sort('_id', 1).batch_size(batch_size)
+    try:
+        with pq.ParquetWriter(temporary_path, SCHEMA, compression='zstd') as writer:
+            rows = []
+            for document in cursor:
+                rows.append(to_row(document))
+                if len(rows) >= batch_size:
+                    writer.write_table(pa.Table.from_pylist(rows, schema=SCHEMA))
+                    count += len(rows)
+                    rows = []
+            if rows:
+                writer.write_table(pa.Table.from_pylist(rows, schema=SCHEMA))
+                count += len(rows)
+    finally:
+        cursor.close()
+    os.replace(temporary_path, path)
+    return count
+
+
+def export_snapshot(collection, output_directory=DEFAULT_OUTPUT_DIRECTORY, full=False, batch_size=BATCH_SIZE):
+    """
+    Exports the articles to Parquet files partitioned by year and month. Only the months with articles changed since
+    the previous export are written again, unless full is True.
+
+    :param collection: The articles collection.
+    :param output_directory: The directory of the snapshot.
+    :param full: True to write every month again.
+    :param batch_size: The number of articles converted and written at a time.
+    :return: The number of months and of articles written.
+    """
+    if pa is None:
+        raise ImportError("The Parquet export requires the 'pyarrow' package (pip install pyarrow).")
+    os.makedirs(output_directory, exist_ok=True)
+    snapshot_path = os.path.join(output_directory, SNAPSHOT_FILE)
+    since = None
+    exported_counts = {}
+    if not full and os.path.exists(snapshot_path):
+        with open(snapshot_path, 'r', encoding='utf-8') as file:
+            snapshot = json.load(file)
+        since = datetime.fromisoformat(snapshot['exported_until'])
+        exported_counts = snapshot.get('partitions', {})
+
+    # The writes set modified_at with the clock of the server, so the snapshot starts at the time of the server
+    started_at = collection.database.command('hello')['localTime']
+    # The number of articles and the last change of every month
+    current = {}
+    for group in collection.aggregate([{'$group': {'_id': {'year': '$year', 'month': '$month'},
+                                                   'articles': {'$sum': 1},
+                                                   'modified_at': {'$max': '$modified_at'}}}]):
+        year, month = group['_id'].get('year'), group['_id'].get('month')
+        current[partition_name(year, month)] = (year, month, group['articles'], group['modified_at'])
+
+    # A month is written again if one of its articles changed, or if it lost or gained articles without a change of
+    # its own (the article moved to another month, or was deleted)
+    partitions = [(year, month) for name, (year, month, count, modified_at) in current.items()
+                  if since is None or (modified_at is not None and modified_at >= since)
+                  or exported_counts.get(name) != count]
+    partitions.sort(key=lambda partition: (partition[0] is None, partition[0] or 0, partition[1] or 0))
+    removed = sorted(stored_partitions(output_directory) - set(current))
+    print(f'{len(partitions)} months to export' + (f' (articles changed since {since})' if since else '')
+          + (f', {len(removed)} months to delete' if removed else ''))
+
+    total_articles = 0
+    export_started = time.monotonic()
+    for year, month in partitions:
+        count = write_partition(collection, output_directory, year, month, batch_size)
+        total_articles += count
+        print(f'Exported {count} articles of {year}-{month}')
+    for name in removed:
+        delete_partition(output_directory, name)
+        print(f'Deleted {name}, which has no articles any more')
+
+    with open(snapshot_path, 'w', encoding='utf-8') as file:
+        json.dump({'exported_until': started_at.isoformat(), 'months': len(partitions), 'articles': total_articles,
+                   'partitions': {name: count for name, (_, _, count, _) in current.items()}}, file)
+    elapsed = time.monotonic() - export_started
+    if total_articles and elapsed > 0:
+        print(f'Exported {total_articles} articles in {elapsed:.1f}s ({total_articles / elapsed:.0f} docs/sec)')
+    return len(partitions), total_articles
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the articles to Parquet files partitioned by year/month.")
+    parser.add_argument('--mongo-uri', default="mongodb://localhost:27017/", help="MongoDB connection string.")
+    parser.add_argument('--database', default="Almayadeen", help="MongoDB database of the articles.")
+    parser.add_argument('--collection', default="articles", help="MongoDB collection of the articles.")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIRECTORY, help="Directory of the Parquet files.")
+    parser.add_argument('--full', action='store_true',
+                        help="Write every month again, not only the months with changed articles.")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help="Number of articles converted and written at a time.")
+    args = parser.parse_args()
+
+    # Connect to the MongoDB
+    client = pymongo.MongoClient(args.mongo_uri)
+    export_snapshot(client[args.database][args.collection], args.output_dir, args.full, args.batch_size)
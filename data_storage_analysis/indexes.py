@@ -0,0 +1,285 @@
+import argparse  # To read the settings from the command line
+import os  # To locate the dashboard app
+import sys  # To import the dashboard app and exit with the result of the check
+
+import pymongo  # To allow us to interact with MongoDB
+from pymongo import ASCENDING, DESCENDING, IndexModel  # To declare the indexes
+
+# The indexes of the 'articles' collection, one per access path of the dashboard routes (app.py). Creating them is
+# idempotent, so ensure_indexes() runs when the dashboard starts, and can be run from the command line:
+#   python indexes.py            creates the missing indexes
+#   python indexes.py --check    also explains the pipeline of every route and fails if one scans the collection
+ARTICLE_INDEXES = [
+    # Upserts of the loader and the scraper's MongoDB sink, /article_details. Unique, so two concurrent upserts of the
+    # same new article (two loader processes, the loader and the sink) cannot both insert it: the server retries the
+    # one that loses as an update. Only the string keys are indexed, since the articles without a postId are keyed on
+    # their URL. A collection holding duplicates (inserted before the upserts) must be deduplicated first, the
+    # creation fails with E11000 otherwise
+    IndexModel([('postId', ASCENDING)], unique=True, partialFilterExpression={'postId': {'$type': 'string'}}),
+    IndexModel([('url', ASCENDING)], unique=True, partialFilterExpression={'url': {'$type': 'string'}}),
+    # /articles_by_keyword (multikey: one entry per keyword of the array)
+    IndexModel([('keywords', ASCENDING)]),
+    # /articles_by_author
+    IndexModel([('author', ASCENDING)]),
+    # /articles_by_sentiment, and the sort of /most_positive_articles and /most_negative_articles
+    IndexModel([('sentiment', ASCENDING), ('sentiment_score', DESCENDING)]),
+    # /articles_by_coverage (multikey on the values of the classes array)
+    IndexModel([('classes.value', ASCENDING)]),
+    # /articles_by_entity, whose $or uses one index per entity type
+    IndexModel([('entities.MISC', ASCENDING)]),
+    IndexModel([('entities.LOC', ASCENDING)]),
+    IndexModel([('entities.PERS', ASCENDING)]),
+    IndexModel([('entities.ORG', ASCENDING)]),
+    # /recent_articles and /articles_last_x_hours
+    IndexModel([('published_at', DESCENDING)]),
+    # The counting routes, which leave out the near-duplicates, filtered by publication date or not
+    IndexModel([('duplicate_of', ASCENDING), ('published_at', ASCENDING)]),
+    # The Parquet export (export_parquet.py): the articles changed since the last export, and the articles of a month
+    IndexModel([('modified_at', ASCENDING)]),
+    IndexModel([('year', ASCENDING), ('month', ASCENDING)]),
+    # The LSH buckets of the near-duplicate detector
+    IndexModel([('minhash_bands', ASCENDING)]),
+    # /articles_with_video and /articles_with_thumbnail: most articles have neither, so only the articles that have
+    # one are indexed (a partial filter cannot use $ne, and null is not a string)
+    IndexModel([('video_duration', ASCENDING)], partialFilterExpression={'video_duration': {'$type': 'string'}}),
+    IndexModel([('thumbnail', ASCENDING)], partialFilterExpression={'thumbnail': {'$type': 'string'}}),
+]
+
+# The query parameters the check passes to the routes that need some to run their pipeline
+ROUTE_SAMPLE_ARGS = {
+    'keyword_trends': {'year': '2024', 'month': '8'},
+    'articles_by_keyword': {'keyword': 'فلسطين'},
+    'articles_by_author': {'author_name': 'الميادين نت'},
+    'article_details': {'postid': '1'},
+    'articles_by_year': {'year': '2024'},
+    'articles_by_coverage': {'coverage': 'news'},
+    'popular_keywords_last_x_days': {'days': '7'},
+    'articles_by_month': {'year': '2024', 'month': '8'},
+    'articles_by_word_count_range': {'min': '100', 'max': '500'},
+    'articles_with_specific_keyword_count': {'count': '5'},
+    'articles_by_specific_date': {'date': '2024-08-01'},
+    'articles_containing_text': {'text': 'غزة'},
+    'articles_with_more_than': {'word_count': '1000'},
+    'articles_last_x_hours': {'hours': '24'},
+}
+
+# The plan stages that read an index
+INDEX_STAGES = {'IXSCAN', 'DISTINCT_SCAN', 'COUNT_SCAN', 'IDHACK', 'EXPRESS_IXSCAN'}
+
+# The routes that read every article by design: the counts and rankings of the whole corpus (their leading
+# {'duplicate_of': None} match selects nearly every article), the filters on a value computed from every article
+# (the string word_count converted with $toInt, the size of the keywords, two dates of the same article) and the
+# unanchored text search. The check only reports their plan, it does not fail on them
+CORPUS_ROUTES = {
+    'articles_by_classes', 'articles_by_date', 'articles_by_keyword_count', 'articles_by_language',
+    'articles_by_title_length', 'articles_by_word_count', 'articles_grouped_by_coverage', 'sentiment_trends',
+    'top_authors', 'top_classes', 'top_keywords', 'longest_articles', 'shortest_articles', 'most_updated_articles',
+    'articles_updated_after_publication', 'articles_with_more_than', 'articles_with_specific_keyword_count',
+    'articles_by_word_count_range', 'articles_containing_text',
+}
+
+# An index scan of a selective route (one of ROUTE_SAMPLE_ARGS) examining at least this fraction of the documents of
+# the collection is a full scan through an index (e.g. the [null, null] bounds of {'duplicate_of': None}), slower than
+# a COLLSCAN: the route does not count as indexed
+FULL_SCAN_FRACTION = 0.5
+
+
+def index_key(index):
+    """
+    Returns what makes two indexes the same: their keys, their partial filter and their uniqueness.
+
+    :param index: The document of an IndexModel, or an index of index_information().
+    """
+    keys = index['key'].items() if hasattr(index['key'], 'items') else index['key']
+    return ([(field, direction if isinstance(direction, str) else int(direction)) for field, direction in keys],
+            index.get('partialFilterExpression'), bool(index.get('unique')))
+
+
+def ensure_indexes(collection, indexes=ARTICLE_INDEXES):
+    """
+    Creates the missing indexes of a collection. An index that exists under the same name with other keys or options
+    is dropped and created again.
+
+    :param collection: The pymongo collection.
+    :param indexes: The list of IndexModel to create.
+    :return: The names of the indexes created.
+    """
+    existing = collection.index_information()
+    missing = []
+    for index in indexes:
+        document = index.document
+        current = existing.get(document['name'])
+        if current is not None and index_key(current) == index_key(document):
+            continue
+        if current is not None:
+            collection.drop_index(document['name'])
+        missing.append(index)
+    if not missing:
+        return []
+    return collection.create_indexes(missing)
+
+
+def plan_stages(plan, stages, index_names):
+    """
+    Collects the stages and the index names of a query plan (a nested tree of stages).
+
+    :param plan: A part of the explain output.
+    :param stages: The set the stage names are added to.
+    :param index_names: The set the index names are added to.
+    """
+    if isinstance(plan, dict):
+        if isinstance(plan.get('stage'), str):
+            stages.add(plan['stage'])
+        if isinstance(plan.get('indexName'), str):
+            index_names.add(plan['indexName'])
+        for value in plan.values():
+            plan_stages(value, stages, index_names)
+    elif isinstance(plan, list):
+        for value in plan:
+            plan_stages(value, stages, index_names)
+
+
+def winning_plans(explain):
+    """
+    Finds the winning plans of the explain output of a pipeline (one per $cursor, $lookup or $unionWith query).
+    """
+    if isinstance(explain, dict):
+        if 'winningPlan' in explain:
+            yield explain['winningPlan']
+        for key, value in explain.items():
+            if key not in ('winningPlan', 'rejectedPlans'):
+                yield from winning_plans(value)
+    elif isinstance(explain, list):
+        for value in explain:
+            yield from winning_plans(value)
+
+
+def keys_examined(explain):
+    """
+    Sums the index keys examined by the queries of the explain output of a pipeline (executionStats verbosity).
+    """
+    total = 0
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == 'executionStats' and isinstance(value, dict):
+                total += value.get('totalKeysExamined', 0)
+            elif key not in ('winningPlan', 'rejectedPlans'):
+                total += keys_examined(value)
+    elif isinstance(explain, list):
+        for value in explain:
+            total += keys_examined(value)
+    return total
+
+
+def explain_pipeline(collection, pipeline):
+    """
+    Explains an aggregation pipeline, running its queries to measure how many index keys they examine.
+
+    :param collection: The pymongo collection.
+    :param pipeline: The aggregation pipeline.
+    :return: The stages of its winning plans, the names of the indexes they read and the number of keys examined.
+    """
+    explain = collection.database.command('explain', {'aggregate': collection.name, 'pipeline': pipeline,
+                                                      'cursor': {}}, verbosity='executionStats')
+    stages, index_names = set(), set()
+    for plan in winning_plans(explain):
+        plan_stages(plan, stages, index_names)
+    return stages, index_names, keys_examined(explain)
+
+
+class PipelineRecorder:
+    """
+    Stands in for the collection of the dashboard app while the check calls its routes, to record their pipelines.
+    """
+
+    def __init__(self):
+        self.pipelines = []
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        self.pipelines.append(pipeline)
+        return iter([])
+
+
+def route_pipelines(dashboard):
+    """
+    Calls every GET route of the dashboard app and records the aggregation pipelines it runs.
+
+    :param dashboard: The app.py module.
+    :return: A list of (route name, list of pipelines), for the routes that run at least one pipeline.
+    """
+    recorder = PipelineRecorder()
+    original_collection = dashboard.collection
+    dashboard.collection = recorder
+    routes = []
+    try:
+        client = dashboard.app.test_client()
+        for rule in sorted(dashboard.app.url_map.iter_rules(), key=lambda rule: rule.rule):
+            if 'GET' not in rule.methods or rule.endpoint == 'static':
+                continue
+            recorder.pipelines = []
+            client.get(rule.rule, query_string={'format': 'json', **ROUTE_SAMPLE_ARGS.get(rule.endpoint, {})})
+            if recorder.pipelines:
+                routes.append((rule.endpoint, recorder.pipelines))
+    finally:
+        dashboard.collection = original_collection
+    return routes
+
+
+def check_routes(collection, dashboard):
+    """
+    Explains the pipeline of every route of the dashboard app and reports the ones that do not read an index, or, for
+    the selective routes of ROUTE_SAMPLE_ARGS, read so much of one that they scan the whole collection through it. The
+    plans of the CORPUS_ROUTES are only reported.
+
+    :param collection: The articles collection the pipelines are explained on.
+    :param dashboard: The app.py module.
+    :return: The names of the routes that scan the whole collection.
+    """
+    documents = collection.estimated_document_count()
+    failed = []
+    for route, pipelines in route_pipelines(dashboard):
+        stages, index_names, keys = set(), set(), 0
+        for pipeline in pipelines:
+            pipeline_stages, pipeline_index_names, pipeline_keys = explain_pipeline(collection, pipeline)
+            stages |= pipeline_stages
+            index_names |= pipeline_index_names
+            keys += pipeline_keys
+        if route in CORPUS_ROUTES:
+            print(f'INFO  {route}: {", ".join(sorted(stages))} ({keys} keys examined, reads the whole corpus)')
+        elif 'COLLSCAN' in stages or not stages & INDEX_STAGES:
+            failed.append(route)
+            print(f'SCAN  {route}: {", ".join(sorted(stages))}')
+        elif route in ROUTE_SAMPLE_ARGS and documents and keys >= FULL_SCAN_FRACTION * documents:
+            failed.append(route)
+            print(f'SCAN  {route}: {keys} keys of {", ".join(sorted(index_names))} examined for {documents} '
+                  f'documents')
+        else:
+            print(f'OK    {route}: {", ".join(sorted(index_names))} ({keys} keys examined)')
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the indexes of the articles collection.")
+    parser.add_argument('--mongo-uri', default="mongodb://localhost:27017/", help="MongoDB connection string.")
+    parser.add_argument('--database', default="Almayadeen", help="MongoDB database of the articles.")
+    parser.add_argument('--collection', default="articles", help="MongoDB collection of the articles.")
+    parser.add_argument('--check', action='store_true',
+                        help="Explain the pipeline of every dashboard route and fail if one does not use an index, or "
+                             "examines most of the keys of one.")
+    args = parser.parse_args()
+
+    # Connect to the MongoDB
+    client = pymongo.MongoClient(args.mongo_uri)
+    articles = client[args.database][args.collection]
+    created = ensure_indexes(articles)
+    print(f'Created {len(created)} indexes: {", ".join(created)}' if created else 'All the indexes exist')
+
+    if args.check:
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+        import app  # The dashboard, whose routes are checked
+
+        scans = check_routes(articles, app)
+        if scans:
+            print(f'{len(scans)} routes scan the whole collection: {", ".join(scans)}')
+            sys.exit(1)
+        print('Every route uses an index')
@@ -0,0 +1,292 @@
+import argparse  # To read the settings from the command line
+import gzip  # To read the gzip compressed JSON Lines files
+import io  # To read the zstd compressed JSON Lines files as text
+import json  # To allow us to work with JSON data
+import multiprocessing  # To start the loader processes
+import os  # To allow us to interact with the operating system
+import sys  # To import the article sink shared with the scraper
+import time  # To measure the loading throughput
+from concurrent.futures import ProcessPoolExecutor, as_completed  # To load several files at once
+
+import pymongo  # To allow us to interact with MongoDB
+
+try:
+    import zstandard  # To read the zstd compressed JSON Lines files (optional)
+except ImportError:
+    zstandard = None
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Data_Collection', 'Python_Scripts'))
+from MongoArticleSinkClass import MongoArticleSink  # To add the typed dates and upsert the articles like the sink
+from detect_near_duplicates import detect_near_duplicates  # To mark the republished versions of the same story
+from indexes import ensure_indexes  # To create the indexes of the articles collection
+
+# Loads the monthly article files (JSON arrays and JSON Lines, optionally compressed) into the 'articles' collection
+# of the 'Almayadeen' database. Files are loaded in parallel and streamed, articles are upserted on their postId, and
+# every loaded file is recorded in the 'loaded_files' collection, so running the loader again only loads the files
+# that are new or changed. The near-duplicates are marked once all the files are loaded, in one pass over the new and
+# changed articles, so the articles of two files loaded at the same time are compared with each other too.
+
+# Directory where the JSON files are saved
+DEFAULT_DIRECTORY = r"C:\Users\Voldemort\PycharmProjects\AlmayadeenScraping\data_articles"
+
+# Number of articles upserted at a time
+BATCH_SIZE = 1000
+
+# The near-duplicate signature of an article, removed when its text changes so detect_near_duplicates computes it again
+NEAR_DUPLICATE_FIELDS = ('minhash', 'minhash_bands')
+
+# The collection of the loader processes (one connection per process)
+collection = None
+
+
+def fix_keywords(article):
+    """
+    Turns the comma-separated 'keywords' string of an article into a list of cleaned keywords.
+
+    :param article: The article dictionary, updated in place.
+    """
+    # Check if the 'keywords' field is present and is a string
+    if 'keywords' in article and isinstance(article['keywords'], str):
+        # Split the comma-separated string into individual keywords and remove any extra spaces around each keyword
+        article['keywords'] = [keyword.strip() for keyword in article['keywords'].split(',')]
+
+
+def open_json_lines(filepath):
+    """
+    Opens a JSON Lines file (.jsonl, .jsonl.gz or .jsonl.zst) as a text stream.
+
+    :param filepath: The path of the file.
+    :return: The text stream, read one article per line.
+    """
+    if filepath.endswith('.gz'):
+        return gzip.open(filepath, 'rt', encoding='utf-8')
+    if filepath.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("Reading .zst files requires the 'zstandard' package (pip install zstandard).")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(filepath, 'rb')), encoding='utf-8')
+    return open(filepath, 'r', encoding='utf-8')
+
+
+def iter_json_array(file, chunk_size=1 << 20):
+    """
+    Streams the elements of a JSON array file one at a time, without loading the whole file.
+
+    :param file: The text file holding the array.
+    :param chunk_size: The number of characters read at a time.
+    :return: An iterator over the elements of the array.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    in_array = False
+    while True:
+        # Skip the whitespace and the commas between the elements
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position == len(buffer):
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise ValueError("The JSON array is not closed.")
+            buffer, position = chunk, 0
+            continue
+
+        if not in_array:
+            if buffer[position] != '[':
+                raise ValueError("The file does not contain a list of documents.")
+            in_array = True
+            position += 1
+            continue
+        if buffer[position] == ']':
+            return
+
+        try:
+            element, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # The element continues in the next chunk
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield element
+
+
+def iter_articles(filepath):
+    """
+    Streams the articles of a month file.
+
+    :param filepath: The path of a .json, .jsonl, .jsonl.gz or .jsonl.zst file.
+    :return: An iterator over the article dictionaries.
+    """
+    if filepath.endswith('.json'):
+        with open(filepath, 'r', encoding='utf-8') as file:
+            yield from iter_json_array(file)
+        return
+    with open_json_lines(filepath) as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def init_loader(mongo_uri, database, collection_name):
+    """
+    Connects a loader process to MongoDB.
+    """
+    global collection
+    collection = pymongo.MongoClient(mongo_uri)[database][collection_name]
+
+
+def upsert_batch(batch):
+    """
+    Upserts a batch of articles with one unordered bulk write, keyed on postId (or on the URL without a postId). An
+    article whose fields did not change keeps its modified_at, so reloading a file does not make the next Parquet
+    export rewrite its months.
+
+    :return: The number of articles inserted and updated.
+    """
+    result = collection.bulk_write([MongoArticleSink.upsert_operation(article, NEAR_DUPLICATE_FIELDS)
+                                    for article in batch], ordered=False)
+    return result.upserted_count, result.modified_count
+
+
+def load_file(filepath, batch_size):
+    """
+    Streams a month file into the collection (runs in a loader process).
+
+    :param filepath: The path of the file.
+    :param batch_size: The number of articles upserted at a time.
+    :return: The statistics of the file, with the error message if it could not be loaded.
+    """
+    stats = {'file': filepath, 'articles': 0, 'inserted': 0, 'updated': 0, 'error': None}
+    started_at = time.monotonic()
+    try:
+        batch = []
+        for article in iter_articles(filepath):
+            fix_keywords(article)
+            MongoArticleSink.add_date_fields(article)
+            article['text_hash'] = MongoArticleSink.text_hash(article.get('full_text'))
+            batch.append(article)
+            if len(batch) >= batch_size:
+                inserted, updated = upsert_batch(batch)
+                stats['inserted'] += inserted
+                stats['updated'] += updated
+                stats['articles'] += len(batch)
+                batch = []
+        if batch:
+            inserted, updated = upsert_batch(batch)
+            stats['inserted'] += inserted
+            stats['updated'] += updated
+            stats['articles'] += len(batch)
+    except (OSError, ValueError, ImportError, pymongo.errors.PyMongoError) as e:
+        stats['error'] = str(e)
+    stats['seconds'] = time.monotonic() - started_at
+    return stats
+
+
+def find_article_files(directory):
+    """
+    Lists the month files of a directory (the unfinished .part files and any other file are skipped).
+
+    :param directory: The directory of the month files.
+    :return: The sorted list of file paths.
+    """
+    return sorted(os.path.join(directory, filename) for filename in os.listdir(directory)
+                  if filename.endswith(('.json', '.jsonl', '.jsonl.gz', '.jsonl.zst')))
+
+
+def file_signature(filepath):
+    """
+    Returns what identifies the content of a file cheaply: its size and modification time.
+    """
+    status = os.stat(filepath)
+    return {'size': status.st_size, 'mtime_ns': status.st_mtime_ns}
+
+
+def load_directory(directory, mongo_uri="mongodb://localhost:27017/", database="Almayadeen",
+                   collection_name="articles", workers=None, batch_size=BATCH_SIZE, force=False, near_duplicates=True):
+    """
+    Loads the new and changed month files of a directory in parallel.
+
+    :param directory: The directory of the month files.
+    :param mongo_uri: The MongoDB connection string.
+    :param database: The name of the database.
+    :param collection_name: The name of the articles collection.
+    :param workers: The number of loader processes (the number of CPU cores by default).
+    :param batch_size: The number of articles upserted at a time.
+    :param force: True to load every file again, even the ones already loaded.
+    :param near_duplicates: True to mark the near-duplicate articles once the files are loaded.
+    :return: The total number of articles loaded.
+    """
+    client = pymongo.MongoClient(mongo_uri)
+    manifest = client[database]['loaded_files']
+    articles_collection = client[database][collection_name]
+    # Without the postId and url indexes every upsert would scan the whole collection
+    ensure_indexes(articles_collection)
+
+    # A file whose size and modification time did not change since it was loaded is skipped
+    pending = []
+    for filepath in find_article_files(directory):
+        loaded = manifest.find_one({'_id': os.path.basename(filepath)})
+        if not force and loaded is not None and loaded['signature'] == file_signature(filepath):
+            continue
+        pending.append(filepath)
+    print(f'{len(pending)} files to load from {directory}')
+
+    total_articles = 0
+    started_at = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                             mp_context=multiprocessing.get_context('spawn'), initializer=init_loader,
+                             initargs=(mongo_uri, database, collection_name)) as pool:
+        # Large files first, so one of them does not end the run alone
+        futures = [pool.submit(load_file, filepath, batch_size)
+                   for filepath in sorted(pending, key=os.path.getsize, reverse=True)]
+        for future in as_completed(futures):
+            stats = future.result()
+            filename = os.path.basename(stats['file'])
+            if stats['error']:
+                print(f'Error loading {filename}: {stats["error"]}')
+                continue
+            manifest.replace_one({'_id': filename},
+                                 {'_id': filename, 'signature': file_signature(stats['file']),
+                                  'articles': stats['articles'], 'loaded_at': time.time()}, upsert=True)
+            total_articles += stats['articles']
+            rate = stats['articles'] / stats['seconds'] if stats['seconds'] else 0.0
+            print(f'Loaded {stats["articles"]} articles from {filename} ({stats["inserted"]} inserted, '
+                  f'{stats["updated"]} updated) at {rate:.0f} docs/sec')
+
+    elapsed = time.monotonic() - started_at
+    if total_articles and elapsed > 0:
+        print(f'Loaded {total_articles} articles in {elapsed:.1f}s ({total_articles / elapsed:.0f} docs/sec)')
+
+    if near_duplicates and total_articles:
+        # The new articles, and the ones whose text changed, have no signature yet
+        processed, duplicates = detect_near_duplicates(articles_collection, batch_size)
+        print(f'Marked {duplicates} near-duplicates among {processed} new and changed articles')
+    client.close()
+    return total_articles
+
+
+def main(argv=None):
+    """
+    Runs the loader from the command line.
+
+    :param argv: The command line arguments (those of the process by default).
+    """
+    parser = argparse.ArgumentParser(description="Load the monthly article files into MongoDB.")
+    parser.add_argument('--directory', default=DEFAULT_DIRECTORY, help="Directory of the monthly article files.")
+    parser.add_argument('--mongo-uri', default="mongodb://localhost:27017/", help="MongoDB connection string.")
+    parser.add_argument('--database', default="Almayadeen", help="MongoDB database of the articles.")
+    parser.add_argument('--collection', default="articles", help="MongoDB collection of the articles.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of files loaded in parallel (the number of CPU cores by default).")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Number of articles upserted at a time.")
+    parser.add_argument('--force', action='store_true', help="Load every file again, even the ones already loaded.")
+    parser.add_argument('--no-near-duplicates', action='store_true',
+                        help="Do not mark the near-duplicate articles after loading.")
+    args = parser.parse_args(argv)
+    load_directory(args.directory, args.mongo_uri, args.database, args.collection, args.workers, args.batch_size,
+                   args.force, not args.no_near_duplicates)
+
+
+if __name__ == "__main__":
+    main()
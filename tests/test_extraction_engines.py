@@ -0,0 +1,38 @@
+import os  # To locate the scraper modules and the saved pages
+import sys  # To import the scraper modules
+
+REPOSITORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(REPOSITORY, 'Data_Collection', 'Python_Scripts'))
+from ArticleScraperClass import ArticleScraper  # The extraction engines under test
+
+# Article pages in the markup of the site (first line: the article URL, then the HTML), with class attributes,
+# inline markup, comments, scripts, styles and nested blocks both engines must handle the same way
+PAGES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'article_pages')
+
+
+def saved_pages():
+    for file_name in sorted(os.listdir(PAGES_DIRECTORY)):
+        with open(os.path.join(PAGES_DIRECTORY, file_name), 'rb') as file:
+            article_url, _, html = file.read().partition(b'\n')
+        yield article_url.decode('utf-8'), html
+
+
+def test_engines_return_the_same_articles():
+    lxml_scraper = ArticleScraper(engine='lxml')
+    bs4_scraper = ArticleScraper(engine='bs4')
+    pages = list(saved_pages())
+    assert pages
+    for article_url, html in pages:
+        lxml_article = lxml_scraper.parse_article(article_url, html)
+        assert lxml_article == bs4_scraper.parse_article(article_url, html), article_url
+        assert lxml_article.postId and lxml_article.title and lxml_article.full_text
+
+
+def test_skipped_text_and_decoy_classes():
+    for article_url, html in saved_pages():
+        full_text = ArticleScraper(engine='lxml').parse_article(article_url, html).full_text
+        # Scripts, styles, templates and comments inside the paragraphs are not text
+        assert 'لا يظهر' not in full_text and 'color:red' not in full_text and 'نموذج' not in full_text
+        # Only the direct paragraphs of the first p-content block, and the exact lg_para classes, are taken
+        assert 'ليس جزءاً من المقال' not in full_text
+        assert 'اقرأ أيضاً' not in full_text and 'لا تؤخذ' not in full_text
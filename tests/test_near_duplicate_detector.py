@@ -0,0 +1,49 @@
+import json  # To read the scraped articles
+import os  # To locate the scraper modules and the articles
+import sys  # To import the scraper modules
+
+REPOSITORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(REPOSITORY, 'Data_Collection', 'Python_Scripts'))
+from NearDuplicateDetectorClass import NearDuplicateDetector  # The detector under test
+
+ARTICLES_FILE = os.path.join(REPOSITORY, 'Data_Collection', 'data_articles', 'articles_2024_01.json')
+
+
+class EmptyCollection:
+    """
+    Stands for an articles collection without stored articles.
+    """
+
+    def create_index(self, keys):
+        pass
+
+    def find(self, query, projection):
+        return []
+
+
+def corpus_text():
+    with open(ARTICLES_FILE, encoding='utf-8') as file:
+        articles = json.load(file)
+    return max((article['full_text'] for article in articles), key=len)
+
+
+def test_normalize_keeps_the_arabic_letters():
+    assert NearDuplicateDetector.normalize('مرحبا بالعالم أَهلاً') == ['مرحبا', 'بالعالم', 'اهلا']
+
+    text = corpus_text()
+    words = NearDuplicateDetector.normalize(text)
+    # Only the diacritics and the tatweel are removed, never whole words
+    assert len(words) >= 0.9 * len(text.split())
+
+
+def test_lightly_edited_copies_are_duplicates():
+    text = corpus_text()
+    words = text.split()
+    # A republished version: a new first sentence, a word changed and the last sentence dropped
+    edited = ' '.join(['تحديث:'] + words[:40] + ['الأخير'] + words[41:-10])
+
+    detector = NearDuplicateDetector(EmptyCollection())
+    documents = [{'postId': '1', 'full_text': text}, {'postId': '2', 'full_text': edited}]
+    assert detector.assign(documents) == 1
+    assert documents[0]['duplicate_of'] is None
+    assert documents[1]['duplicate_of'] == '1'